@@ -0,0 +1,200 @@
+"""Disk-backed, content-addressed cache for Gemini analysis results.
+
+Entries live in a SQLite database so every Streamlit worker process (and
+batch runs) share them across restarts. Keys are SHA-256 digests of the
+resume bytes, normalized job description, prompt and model name. Old
+entries are dropped by TTL, and the least recently used ones are evicted
+once the cache exceeds its entry or size budget.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+CACHE_DIR = os.getenv("ATS_CACHE_DIR", ".ats_cache")
+DEFAULT_PATH = os.path.join(CACHE_DIR, "analysis.sqlite3")
+DEFAULT_MAX_ENTRIES = int(os.getenv("ATS_CACHE_MAX_ENTRIES", "10000"))
+DEFAULT_MAX_BYTES = int(float(os.getenv("ATS_CACHE_MAX_MB", "256")) * 1024 * 1024)
+DEFAULT_TTL_SECONDS = int(float(os.getenv("ATS_CACHE_TTL_HOURS", "168")) * 3600)
+
+
+def normalize_text(text):
+    """Collapse whitespace so cosmetic edits to the JD still hit the cache"""
+    return " ".join((text or "").split())
+
+
+def make_key(resume_digest, input_text, prompt, model_name, variant=""):
+    """Build the cache key for one resume / JD / prompt / model combination"""
+    h = hashlib.sha256()
+    for field in (resume_digest, normalize_text(input_text), normalize_text(prompt), model_name, variant):
+        h.update(field.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class AnalysisCache:
+    """SQLite-backed LRU cache with TTL, safe to share between threads and processes"""
+
+    def __init__(self, path=DEFAULT_PATH, max_entries=DEFAULT_MAX_ENTRIES,
+                 max_bytes=DEFAULT_MAX_BYTES, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_created_at ON entries (created_at)")
+            conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            # Running entry count and size, kept by triggers so every write path (and process) updates them
+            for name, total in (("entries", "COUNT(*)"), ("bytes", "COALESCE(SUM(size), 0)")):
+                conn.execute(f"INSERT OR IGNORE INTO counters (name, value) SELECT '{name}', {total} FROM entries")
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS entries_added AFTER INSERT ON entries BEGIN"
+                " UPDATE counters SET value = value + 1 WHERE name = 'entries';"
+                " UPDATE counters SET value = value + NEW.size WHERE name = 'bytes'; END"
+            )
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS entries_removed AFTER DELETE ON entries BEGIN"
+                " UPDATE counters SET value = value - 1 WHERE name = 'entries';"
+                " UPDATE counters SET value = value - OLD.size WHERE name = 'bytes'; END"
+            )
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS entries_resized AFTER UPDATE OF size ON entries BEGIN"
+                " UPDATE counters SET value = value + NEW.size - OLD.size WHERE name = 'bytes'; END"
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _conn(self):
+        # sqlite3 connections cannot be shared between threads, and Streamlit
+        # runs each session in its own thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _bump(self, conn, name):
+        conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,)
+        )
+
+    def peek(self, key):
+        """Return the cached value or None without counting a lookup or refreshing its LRU position.
+
+        For existence checks and probing several candidate keys; the request
+        they belong to is counted once with record_lookup().
+        """
+        conn = self._conn()
+        row = conn.execute("SELECT value, created_at FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is not None and self.ttl_seconds and time.time() - row[1] > self.ttl_seconds:
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            return None
+        return None if row is None else row[0]
+
+    def record_lookup(self, hit, key=None):
+        """Count one request's lookup; a hit on ``key`` also refreshes its LRU position"""
+        conn = self._conn()
+        if hit and key is not None:
+            conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+        self._bump(conn, "hits" if hit else "misses")
+
+    def get(self, key):
+        """Return the cached value or None, counting the lookup and refreshing its LRU position"""
+        value = self.peek(key)
+        self.record_lookup(value is not None, key)
+        return value
+
+    def set(self, key, value):
+        """Store a value and evict expired / least recently used entries"""
+        conn = self._conn()
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # An upsert rather than INSERT OR REPLACE, whose implicit delete would skip the size triggers
+            conn.execute(
+                "INSERT INTO entries (key, value, size, created_at, last_access) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, size = excluded.size,"
+                " created_at = excluded.created_at, last_access = excluded.last_access",
+                (key, value, size, now, now)
+            )
+            self._evict(conn, now)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _totals(conn):
+        """(entry count, total size in bytes) from the running counters"""
+        totals = dict(conn.execute("SELECT name, value FROM counters WHERE name IN ('entries', 'bytes')").fetchall())
+        return totals.get("entries", 0), totals.get("bytes", 0)
+
+    def _evict(self, conn, now):
+        if self.ttl_seconds:
+            conn.execute("DELETE FROM entries WHERE created_at < ?", (now - self.ttl_seconds,))
+        count, total = self._totals(conn)
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        # Walk the LRU index only as far as the budgets need, then drop that prefix in one statement
+        evicted = 0
+        rows = conn.execute("SELECT size FROM entries ORDER BY last_access")
+        for (size,) in rows:
+            if count - evicted <= self.max_entries and total <= self.max_bytes:
+                break
+            evicted += 1
+            total -= size
+        rows.close()
+        conn.execute(
+            "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY last_access LIMIT ?)", (evicted,)
+        )
+        conn.execute(
+            "INSERT INTO counters (name, value) VALUES ('evictions', ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (evicted,)
+        )
+
+    def clear(self):
+        conn = self._conn()
+        conn.execute("DELETE FROM entries")
+        # The running totals are already back at zero through the triggers
+        conn.execute("DELETE FROM counters WHERE name NOT IN ('entries', 'bytes')")
+
+    def stats(self):
+        """Hit/miss counters and current size, shared across all processes"""
+        conn = self._conn()
+        counters = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+        count, total = counters.get("entries", 0), counters.get("bytes", 0)
+        hits, misses = counters.get("hits", 0), counters.get("misses", 0)
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+            "evictions": counters.get("evictions", 0),
+            "entries": count,
+            "size_mb": round(total / (1024 * 1024), 2),
+            "max_entries": self.max_entries,
+            "max_mb": round(self.max_bytes / (1024 * 1024), 2),
+            "ttl_hours": round(self.ttl_seconds / 3600, 1),
+        }
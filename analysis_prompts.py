@@ -0,0 +1,104 @@
+"""Analysis types and prompts shared by the Streamlit app and batch tools"""
+from structured_output import DetailedAnalysis
+
+ANALYSIS_OPTIONS = [
+    {
+        "icon": "🚀",
+        "title": "Quick Scan", 
+        "description": "Fast 30-second overview",
+        "color": "linear-gradient(135deg, #667eea 0%, #764ba2 100%)",
+        "features": ["Basic match assessment", "Key strengths/weaknesses", "Quick recommendations", "Instant results"],
+        "prompt": """
+        QUICK SCAN - Provide concise evaluation (under 250 words):
+        
+        🎯 **Overall Match**: [Good/Fair/Poor fit]
+        
+        ✅ **Top 3 Strengths**:
+        - [Most relevant qualification]
+        - [Key experience match]
+        - [Main skill alignment]
+        
+        ⚠️ **Top 3 Weaknesses**:
+        - [Major gap]
+        - [Missing requirement]
+        - [Area for improvement]
+        
+        💡 **Quick Recommendations**: [2-3 actionable tips]
+        
+        Be direct, concise, and actionable.
+        """,
+        # Resume sections sent in text mode (see resume_sections); None sends everything
+        "sections": ("summary", "experience", "skills", "education", "certifications"),
+        "button_type": "secondary"
+    },
+    {
+        "icon": "📊", 
+        "title": "Detailed Analysis",
+        "description": "Comprehensive ATS evaluation", 
+        "color": "linear-gradient(135deg, #f093fb 0%, #f5576c 100%)",
+        "features": ["ATS compatibility score", "Match percentage", "Missing keywords", "Detailed insights", "Structured report"],
+        "prompt": """
+        DETAILED ANALYSIS - Provide structured evaluation with metrics:
+        
+        Please respond in this EXACT JSON format:
+        {
+            "match_percentage": 85,
+            "ats_score": 78,
+            "overall_assessment": "Brief summary of fit",
+            "missing_keywords": ["Python", "Machine Learning", "AWS", "SQL", "Agile"],
+            "strengths": ["Strong educational background", "Relevant project experience", "Technical skills match"],
+            "weaknesses": ["Missing certification", "Limited leadership experience", "Gap in specific technology"],
+            "recommendations": ["Add missing keywords strategically", "Quantify achievements", "Highlight relevant projects"]
+        }
+        
+        If JSON is not possible, use clear headings and structure.
+        """,
+        # Gemini is asked for JSON matching this schema instead of free text
+        "response_schema": DetailedAnalysis,
+        "sections": ("summary", "experience", "projects", "skills", "education", "certifications", "other"),
+        "button_type": "primary"
+    },
+    {
+        "icon": "💎",
+        "title": "Improvement Pro", 
+        "description": "Expert optimization guide",
+        "color": "linear-gradient(135deg, #4facfe 0%, #00f2fe 100%)",
+        "features": ["ATS optimization", "Content enhancement", "Professional tips", "Best practices", "Competitive edge"],
+        "prompt": """
+        IMPROVEMENT PRO - Provide expert resume optimization:
+        
+        🎯 **Executive Summary**: Overall assessment and potential
+        
+        🔍 **ATS Optimization**:
+        • Keyword analysis and placement
+        • Formatting improvements for ATS
+        • Section optimization tips
+        
+        💡 **Content Enhancement**:
+        • Achievement quantification
+        • Action verb suggestions
+        • Impact statement improvements
+        
+        📊 **Professional Recommendations**:
+        • Skill highlighting strategy
+        • Experience reframing
+        • Competitive positioning
+        
+        🚀 **Quick Wins**: Immediate improvements (3-5 items)
+        📈 **Long-term Strategy**: Career development suggestions
+        
+        Provide specific, actionable advice.
+        """,
+        # Formatting advice needs the whole resume, contact block included
+        "sections": None,
+        "button_type": "secondary"
+    }
+]
+
+
+def get_analysis_option(title):
+    """Look up an analysis option by its card title"""
+    for option in ANALYSIS_OPTIONS:
+        if option["title"] == title:
+            return option
+    raise KeyError(f"Unknown analysis type: {title}")
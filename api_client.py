@@ -0,0 +1,142 @@
+"""Small client for the analysis API served by api_server.py.
+
+Used by the Streamlit app when ATS_API_URL is set, so analyses run in the
+API's worker pool instead of the user's script thread. Only the standard
+library is needed.
+"""
+import base64
+import json
+import os
+import time
+import urllib.error
+import urllib.request
+
+DEFAULT_API_URL = os.getenv("ATS_API_URL")
+# Total time to keep retrying a submission the server rejected as queue-full
+MAX_BACKPRESSURE_WAIT_SECONDS = 120
+
+
+class ApiError(RuntimeError):
+    """A failed API request or analysis job"""
+
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class ApiClient:
+    """Submit analysis jobs and follow them to completion"""
+
+    def __init__(self, base_url=DEFAULT_API_URL, timeout=30):
+        if not base_url:
+            raise ValueError("An API URL is required (set ATS_API_URL)")
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def _request(self, method, path, payload=None, headers=None):
+        data = json.dumps(payload).encode("utf-8") if payload is not None else None
+        request = urllib.request.Request(
+            self.base_url + path, data=data, method=method,
+            headers={"Content-Type": "application/json", **(headers or {})}
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read() or b"{}")
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read() or b"{}").get("error") or e.reason
+            except ValueError:
+                message = e.reason
+            retry_after = e.headers.get("Retry-After")
+            raise ApiError(message, e.code, float(retry_after) if retry_after else None)
+        except urllib.error.URLError as e:
+            raise ApiError(f"Analysis API unreachable at {self.base_url}: {e.reason}")
+
+    def submit(self, resume_bytes, jd_text, analysis_type, extraction=None, raster=None, idempotency_key=None,
+               reuse_near_duplicates=True):
+        """Queue a job and return it, waiting out queue-full (429) responses"""
+        payload = {
+            "job_description": jd_text,
+            "analysis_type": analysis_type,
+            "resume_base64": base64.b64encode(resume_bytes).decode("ascii"),
+            "reuse_near_duplicates": reuse_near_duplicates,
+        }
+        if extraction is not None:
+            payload["extraction"] = extraction
+        if raster is not None:
+            payload["raster"] = raster
+        headers = {"Idempotency-Key": idempotency_key} if idempotency_key else None
+        deadline = time.monotonic() + MAX_BACKPRESSURE_WAIT_SECONDS
+        while True:
+            try:
+                return self._request("POST", "/v1/jobs", payload, headers)["job"]
+            except ApiError as e:
+                if e.status != 429 or time.monotonic() + (e.retry_after or 5) > deadline:
+                    raise
+                time.sleep(e.retry_after or 5)
+
+    def get(self, job_id):
+        return self._request("GET", f"/v1/jobs/{job_id}")["job"]
+
+    def events(self, job_id):
+        """Yield (event, data) from the job's server-sent event stream"""
+        request = urllib.request.Request(f"{self.base_url}/v1/jobs/{job_id}/events",
+                                         headers={"Accept": "text/event-stream"})
+        try:
+            response = urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.URLError as e:
+            raise ApiError(f"Could not follow job {job_id}: {getattr(e, 'reason', e)}")
+        with response:
+            event, data = None, []
+            for raw in response:
+                line = raw.decode("utf-8").rstrip("\r\n")
+                if line.startswith("event:"):
+                    event = line[6:].strip()
+                elif line.startswith("data:"):
+                    data.append(line[5:].strip())
+                elif not line and event is not None:
+                    yield event, json.loads("\n".join(data) or "{}")
+                    event, data = None, []
+
+    def wait(self, job_id, poll_seconds=1.0):
+        """Poll until the job finishes (for callers that do not stream)"""
+        while True:
+            job = self.get(job_id)
+            if job["status"] in ("done", "failed"):
+                return job
+            time.sleep(poll_seconds)
+
+    def run_analysis(self, resume_bytes, jd_text, analysis_type, extraction=None, raster=None,
+                     idempotency_key=None, on_chunk=None, reuse_near_duplicates=True):
+        """Submit and follow a job, returning (response, timing) like ats_engine.fetch_analysis"""
+        start = time.perf_counter()
+        job = self.submit(resume_bytes, jd_text, analysis_type, extraction, raster, idempotency_key,
+                          reuse_near_duplicates)
+        ttft = None
+        if job["status"] not in ("done", "failed"):
+            if on_chunk is None:
+                job = self.wait(job["id"])
+            else:
+                for event, data in self.events(job["id"]):
+                    if event == "chunk":
+                        if ttft is None:
+                            ttft = time.perf_counter() - start
+                        on_chunk(data["text"])
+                    elif event in ("done", "error"):
+                        job = data["job"]
+                        break
+                else:
+                    # Stream closed early: fall back to polling
+                    job = self.wait(job["id"])
+        if job["status"] != "done":
+            raise ApiError(job.get("error") or f"Job {job['id']} did not finish")
+        total = time.perf_counter() - start
+        timing = dict(job.get("timing") or {})
+        timing.update({
+            "cached": bool(timing.get("cached")),
+            "ttft_seconds": ttft if ttft is not None else total,
+            "total_seconds": total,
+            "job_id": job["id"],
+        })
+        return job["response"], timing
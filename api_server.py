@@ -0,0 +1,431 @@
+"""Asynchronous HTTP API for resume analysis, independent of the Streamlit UI.
+
+Jobs go into the durable ``job_queue.JobQueue`` and are run by a pool of
+asyncio workers using the same prompts, caches and parsing as the app.
+
+Endpoints:
+    POST /v1/jobs               queue an analysis (JSON body, optional Idempotency-Key header)
+    GET  /v1/jobs/<id>          job status, and the response + structured data once done
+    GET  /v1/jobs/<id>/events   server-sent events: "chunk" while running, then "done" or "error"
+    GET  /healthz               queue depth and worker count
+    GET  /metrics               Prometheus metrics
+
+The POST body is ``{"job_description": ..., "analysis_type": "Quick Scan",
+"resume_base64": ..., "extraction": "text", "raster": {...},
+"reuse_near_duplicates": true}``. A full queue answers 429 with Retry-After.
+
+Usage:
+    python api_server.py --port 8080 --workers 4 --max-queued 100
+"""
+import argparse
+import asyncio
+import base64
+import binascii
+import json
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import urlsplit
+
+from dotenv import load_dotenv
+
+from analysis_cache import AnalysisCache
+from analysis_prompts import get_analysis_option
+from artifact_cache import ArtifactCache
+from ats_engine import (
+    EXTRACTION_MODES,
+    EXTRACTION_TEXT,
+    analysis_sections,
+    extract_structured_data,
+    extraction_variant,
+    fetch_analysis,
+    find_cached_analysis,
+    raster_settings,
+)
+from instrumentation import METRICS, finish_trace, stage, start_trace
+from job_queue import (
+    DEFAULT_MAX_QUEUED,
+    DONE,
+    FINISHED,
+    IdempotencyConflictError,
+    JobQueue,
+    QueueFullError,
+)
+from llm_backends import BACKENDS, DEFAULT_BACKEND, configure_backend
+from near_duplicates import SignatureIndex
+from results_dataset import ResultsDataset, result_row
+
+DEFAULT_PORT = int(os.getenv("ATS_API_PORT", "8080"))
+DEFAULT_WORKERS = int(os.getenv("ATS_API_WORKERS", "4"))
+MAX_BODY_BYTES = 15 * 1024 * 1024
+# Idle workers re-check the queue at least this often
+IDLE_POLL_SECONDS = 1.0
+SSE_KEEPALIVE_SECONDS = 15.0
+PURGE_INTERVAL_SECONDS = 3600
+
+JOB_PATH = re.compile(r"^/v1/jobs/(?P<job_id>[0-9a-f]{32})(?P<events>/events)?$")
+
+
+class HttpError(Exception):
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+def public_job(job):
+    """Job fields returned to clients (never the inputs)"""
+    return {key: value for key, value in job.items() if key not in ("jd_text", "resume_bytes")}
+
+
+def parse_submission(body):
+    """Validate a POST /v1/jobs body into (resume_bytes, jd_text, analysis_type, options)"""
+    try:
+        payload = json.loads(body or b"{}")
+    except ValueError:
+        raise HttpError(400, "Body must be JSON")
+    if not isinstance(payload, dict):
+        raise HttpError(400, "Body must be a JSON object")
+    jd_text = payload.get("job_description")
+    if not isinstance(jd_text, str) or not jd_text.strip():
+        raise HttpError(400, "job_description is required")
+    analysis_type = payload.get("analysis_type", "Detailed Analysis")
+    try:
+        get_analysis_option(analysis_type)
+    except KeyError as e:
+        raise HttpError(400, str(e.args[0]))
+    try:
+        resume_bytes = base64.b64decode(payload.get("resume_base64") or "", validate=True)
+    except (binascii.Error, ValueError, TypeError):
+        raise HttpError(400, "resume_base64 is not valid base64")
+    if not resume_bytes.startswith(b"%PDF"):
+        raise HttpError(400, "resume_base64 must contain a PDF")
+    extraction = payload.get("extraction", EXTRACTION_TEXT)
+    if extraction not in EXTRACTION_MODES:
+        raise HttpError(400, f"extraction must be one of {', '.join(EXTRACTION_MODES)}")
+    options = {"extraction": extraction, "reuse_near_duplicates": bool(payload.get("reuse_near_duplicates", True))}
+    if payload.get("raster") is not None:
+        raster = payload["raster"]
+        if not isinstance(raster, dict):
+            raise HttpError(400, "raster must be an object")
+        options["raster"] = raster_settings(
+            raster.get("dpi"), raster.get("grayscale"), raster.get("jpeg_quality"), raster.get("max_dimension")
+        )
+    return resume_bytes, jd_text, analysis_type, options
+
+
+def run_job(job, cache, artifacts, on_chunk=None, signatures=None, results=None):
+    """Run one claimed job (in a worker thread); returns (response, structured, timing)"""
+    option = get_analysis_option(job["analysis_type"])
+    mode = job["options"].get("extraction", EXTRACTION_TEXT)
+    raster = job["options"].get("raster")
+    variant = extraction_variant(mode, raster)
+    sections = analysis_sections(option, mode)
+
+    def load_bytes():
+        return job["resume_bytes"]
+
+    trace = start_trace(option["title"], source="api", extraction=variant)
+    try:
+        near_duplicates = []
+        resume_text = ""
+        if signatures is not None and job["options"].get("reuse_near_duplicates", True):
+            with stage("near_duplicate_lookup"):
+                resume_text = artifacts.text(job["resume_hash"], load_bytes)
+                # All matches: the closest ones may have no result for this JD while an older one does
+                near_duplicates = signatures.query(resume_text, exclude=job["resume_hash"], limit=None)
+        cached, _ = find_cached_analysis(
+            cache, job["jd_text"], option["prompt"], job["resume_hash"], variant,
+            option.get("response_schema"), near_duplicates, sections
+        )
+        # Cached (or reusable) results need no preprocessing
+        parts = []
+        segmentation = None
+        if cached is None:
+            with stage("preprocess"):
+                parts = artifacts.parts(job["resume_hash"], load_bytes, mode, raster)["parts"]
+                if sections:
+                    segmentation = artifacts.sections(job["resume_hash"], load_bytes)
+        response, timing = fetch_analysis(
+            cache, job["jd_text"], parts, option["prompt"], job["resume_hash"], variant=variant,
+            on_chunk=on_chunk, response_schema=option.get("response_schema"), near_duplicates=near_duplicates,
+            analysis_type=option["title"], sections=sections, segmentation=segmentation
+        )
+        if not response:
+            raise RuntimeError("Gemini returned an empty response")
+        # Free-text analyses have nothing to parse and would only count as parse failures
+        structured = None
+        if option.get("response_schema") is not None:
+            with stage("json_parse"):
+                structured = extract_structured_data(response)
+    except Exception as e:
+        finish_trace(trace, e)
+        raise
+    if signatures is not None and "near_duplicate_of" not in timing:
+        signatures.add(job["resume_hash"], resume_text or artifacts.text(job["resume_hash"], load_bytes))
+    timing["queue_seconds"] = round(job["started_at"] - job["created_at"], 3)
+    timing["trace"] = finish_trace(trace)
+    if results is not None:
+        results.append(result_row(
+            option["title"], structured, timing, resume_hash=job["resume_hash"], input_text=job["jd_text"],
+            source="api"
+        ))
+    return response, structured, timing
+
+
+class JobEvents:
+    """In-process fan-out of live job events to SSE subscribers (event loop thread only)"""
+
+    def __init__(self):
+        self._chunks = {}
+        self._subscribers = {}
+
+    def publish(self, job_id, event, data):
+        if event == "chunk":
+            self._chunks.setdefault(job_id, []).append(data["text"])
+        else:
+            self._chunks.pop(job_id, None)
+        for subscriber in self._subscribers.get(job_id, ()):
+            subscriber.put_nowait((event, data))
+
+    def subscribe(self, job_id):
+        """Returns (event queue, text streamed so far)"""
+        subscriber = asyncio.Queue()
+        self._subscribers.setdefault(job_id, set()).add(subscriber)
+        return subscriber, "".join(self._chunks.get(job_id, ()))
+
+    def unsubscribe(self, job_id, subscriber):
+        subscribers = self._subscribers.get(job_id)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._subscribers[job_id]
+
+
+class AnalysisServer:
+    """HTTP front end plus a pool of asyncio workers draining the job queue"""
+
+    def __init__(self, queue=None, workers=DEFAULT_WORKERS):
+        self.queue = queue or JobQueue()
+        self.workers = workers
+        self.cache = AnalysisCache()
+        self.artifacts = ArtifactCache()
+        self.signatures = SignatureIndex()
+        self.results = ResultsDataset()
+        self.events = JobEvents()
+        # Gemini calls and PDF work block, so each worker gets a thread to run them in
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ats-api-worker")
+        # Job queue (SQLite) calls go through asyncio.to_thread so a busy database never stalls the event loop
+        self._wakeup = None
+        self._tasks = []
+
+    async def start(self, host="127.0.0.1", port=DEFAULT_PORT):
+        """Requeue interrupted jobs, start the workers and listen; returns the asyncio server"""
+        self._wakeup = asyncio.Event()
+        requeued = await asyncio.to_thread(self.queue.recover)
+        if requeued:
+            print(f"♻️ Requeued {requeued} interrupted jobs", flush=True)
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.ensure_future(self._purge_loop()))
+        return await asyncio.start_server(self._handle_connection, host, port)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._executor.shutdown(wait=False)
+        await asyncio.to_thread(self.results.flush)
+
+    # === Workers ===
+
+    async def _worker(self):
+        while True:
+            self._wakeup.clear()
+            job = await asyncio.to_thread(self.queue.claim)
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), IDLE_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._process(job)
+
+    async def _process(self, job):
+        loop = asyncio.get_running_loop()
+        job_id = job["id"]
+
+        def on_chunk(chunk):
+            loop.call_soon_threadsafe(self.events.publish, job_id, "chunk", {"text": chunk})
+
+        try:
+            response, structured, timing = await loop.run_in_executor(
+                self._executor, run_job, job, self.cache, self.artifacts, on_chunk, self.signatures, self.results
+            )
+        except Exception as e:
+            await asyncio.to_thread(self.queue.fail, job_id, str(e))
+            METRICS.inc("ats_api_jobs_total", {"status": "failed"})
+            self.events.publish(job_id, "error", {"error": str(e)})
+        else:
+            await asyncio.to_thread(self.queue.complete, job_id, response, structured, timing)
+            METRICS.inc("ats_api_jobs_total", {"status": DONE})
+            self.events.publish(job_id, "done", {})
+
+    async def _purge_loop(self):
+        while True:
+            await asyncio.to_thread(self.queue.purge)
+            await asyncio.sleep(PURGE_INTERVAL_SECONDS)
+
+    # === HTTP ===
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            if not request_line:
+                return
+            method, target, _ = request_line.decode("latin-1").split(" ", 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get("content-length") or 0)
+            if length > MAX_BODY_BYTES:
+                raise HttpError(413, f"Body larger than {MAX_BODY_BYTES // (1024 * 1024)} MB")
+            body = await reader.readexactly(length) if length else b""
+            await self._dispatch(method, urlsplit(target).path, headers, body, writer)
+        except HttpError as e:
+            await self._send_json(writer, e.status, {"error": str(e)}, e.headers)
+        except (ValueError, asyncio.IncompleteReadError):
+            await self._send_json(writer, 400, {"error": "Malformed request"})
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method, path, headers, body, writer):
+        if path == "/v1/jobs":
+            if method != "POST":
+                raise HttpError(405, "Use POST to submit a job")
+            await self._submit(headers, body, writer)
+            return
+        match = JOB_PATH.match(path)
+        if match is not None:
+            if method != "GET":
+                raise HttpError(405, "Use GET to read a job")
+            if match.group("events"):
+                await self._stream_events(writer, match.group("job_id"))
+            else:
+                job = await asyncio.to_thread(self.queue.get, match.group("job_id"))
+                if job is None:
+                    raise HttpError(404, "Unknown job")
+                await self._send_json(writer, 200, {"job": public_job(job)})
+            return
+        if path == "/healthz":
+            depth = await asyncio.to_thread(self.queue.depth)
+            await self._send_json(writer, 200, {"status": "ok", "workers": self.workers, "queue": depth,
+                                                "max_queued": self.queue.max_queued})
+            return
+        if path == "/metrics":
+            await self._send(writer, 200, METRICS.render().encode("utf-8"), "text/plain; version=0.0.4")
+            return
+        raise HttpError(404, "Not found")
+
+    async def _submit(self, headers, body, writer):
+        resume_bytes, jd_text, analysis_type, options = parse_submission(body)
+        try:
+            job, created = await asyncio.to_thread(
+                self.queue.submit, resume_bytes, jd_text, analysis_type, options,
+                idempotency_key=headers.get("idempotency-key")
+            )
+        except QueueFullError as e:
+            METRICS.inc("ats_api_rejected_total", {"reason": "queue_full"})
+            raise HttpError(429, str(e), {"Retry-After": str(e.retry_after)})
+        except IdempotencyConflictError as e:
+            raise HttpError(409, str(e))
+        if created:
+            METRICS.inc("ats_api_jobs_total", {"status": "queued"})
+            self._wakeup.set()
+        await self._send_json(writer, 202 if created else 200, {"job": public_job(job)},
+                              {"Location": f"/v1/jobs/{job['id']}"})
+
+    async def _stream_events(self, writer, job_id):
+        # Subscribe before reading the job so a finish in between is not missed
+        subscriber, backlog = self.events.subscribe(job_id)
+        try:
+            job = await asyncio.to_thread(self.queue.get, job_id)
+            if job is None:
+                raise HttpError(404, "Unknown job")
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+                b"Connection: close\r\n\r\n"
+            )
+            if backlog and job["status"] not in FINISHED:
+                await self._send_event(writer, "chunk", {"text": backlog})
+            while job["status"] not in FINISHED:
+                try:
+                    event, data = await asyncio.wait_for(subscriber.get(), SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    writer.write(b": keepalive\n\n")
+                    await writer.drain()
+                    job = await asyncio.to_thread(self.queue.get, job_id)
+                    continue
+                if event == "chunk":
+                    await self._send_event(writer, "chunk", data)
+                else:
+                    job = await asyncio.to_thread(self.queue.get, job_id)
+            await self._send_event(writer, "done" if job["status"] == DONE else "error", {"job": public_job(job)})
+        finally:
+            self.events.unsubscribe(job_id, subscriber)
+
+    async def _send_event(self, writer, event, data):
+        writer.write(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8"))
+        await writer.drain()
+
+    async def _send_json(self, writer, status, payload, headers=None):
+        await self._send(writer, status, json.dumps(payload).encode("utf-8"), "application/json", headers)
+
+    async def _send(self, writer, status, body, content_type, headers=None):
+        lines = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}", f"Content-Type: {content_type}",
+                 f"Content-Length: {len(body)}", "Connection: close"]
+        lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+
+async def serve(host, port, workers, max_queued):
+    server = AnalysisServer(JobQueue(max_queued=max_queued), workers)
+    listener = await server.start(host, port)
+    print(f"🚀 ATS API listening on http://{host}:{port} ({workers} workers, queue limit {max_queued})", flush=True)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        await server.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Asynchronous HTTP API for resume analysis")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Jobs analyzed concurrently")
+    parser.add_argument("--max-queued", type=int, default=DEFAULT_MAX_QUEUED,
+                        help="Unfinished jobs accepted before new submissions get HTTP 429")
+    parser.add_argument("--backend", choices=BACKENDS, default=DEFAULT_BACKEND,
+                        help="LLM backend: gemini, stub (offline), record or replay")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    configure_backend(args.backend)
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.max_queued))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
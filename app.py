@@ -8,72 +8,215 @@ os.environ['GRPC_VERBOSITY'] = 'ERROR'
 os.environ['GLOG_minloglevel'] = '2'
 
 
-import base64
 import streamlit as st
 import os
-import io
-import fitz  # PyMuPDF
-import google.generativeai as genai
+import hashlib
+import html
 import json
-import pandas as pd
+import queue
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import time
 
+from analysis_cache import AnalysisCache, make_key, normalize_text
+from analysis_prompts import ANALYSIS_OPTIONS, get_analysis_option
+from api_client import DEFAULT_API_URL, ApiClient
+from artifact_cache import ArtifactCache
+from ats_engine import (
+    EXTRACTION_IMAGE,
+    EXTRACTION_TEXT,
+    DEFAULT_RASTER,
+    analysis_sections,
+    extract_structured_data,
+    extraction_variant,
+    fetch_analysis,
+    find_cached_analysis,
+    parts_payload_bytes,
+    raster_settings,
+    resume_hash,
+)
+from history_store import HistoryStore
+from instrumentation import (
+    current_trace,
+    finish_trace,
+    stage,
+    start_metrics_server,
+    start_trace,
+)
+from jd_context import context_stats, get_jd_profile, score_with_profile
+from llm_backends import configure_backend
+from near_duplicates import SignatureIndex, diff_lines
+from prefetch import PREFETCH_QUICK_SCAN, Prefetcher
+from rate_limit import flow_stats
+from request_planner import MODEL_STATS
+from results_dataset import ResultsDataset, result_row
+from resume_sections import scoring_text
+from structured_output import PARSE_STATS, IncrementalJSONParser
+
 # Load API key from Streamlit secrets or .env
 GOOGLE_API_KEY = st.secrets.get("GOOGLE_API_KEY", os.getenv("GOOGLE_API_KEY"))
 
-# Configure Gemini with API key
-genai.configure(api_key=GOOGLE_API_KEY)
+@st.cache_resource(show_spinner=False)
+def get_llm_backend():
+    """One long-lived LLM backend (ATS_LLM_BACKEND) shared by all sessions and reruns"""
+    return configure_backend(api_key=GOOGLE_API_KEY)
+
+
+# Prometheus /metrics endpoint (only when ATS_METRICS_PORT is set)
+start_metrics_server()
 
-# Force API version to v1 globally
-genai._default_version = "v1"
+# Pseudo analysis type for running every analysis at once
+RUN_ALL = "All Analyses"
 
 # === Enhanced Function Definitions ===
 
-@st.cache_data(show_spinner=False)
-def get_gemini_response(input_text, pdf_content, prompt, max_retries=3):
-    """Enhanced Gemini response with error handling and retries"""
-    for attempt in range(max_retries):
-        try:
-            model = genai.GenerativeModel("models/gemini-flash-latest")
-            response = model.generate_content([
-                {"text": input_text},
-                pdf_content[0],
-                {"text": prompt}
-            ])
-            return response.text
-        except Exception as e:
-            if attempt == max_retries - 1:
-                st.error(f"❌ API Error: {str(e)}")
-                return None
-            time.sleep(2)  # Wait before retry
-
-@st.cache_data(show_spinner=False)
-def input_pdf_setup(uploaded_file):
-    """Enhanced PDF processing with multiple pages support"""
+@st.cache_resource(show_spinner=False)
+def get_analysis_cache():
+    """Disk-backed analysis cache shared by all sessions and worker processes"""
+    return AnalysisCache()
+
+@st.cache_resource(show_spinner=False)
+def get_api_client():
+    """Analysis API client when ATS_API_URL is set; otherwise analyses run in-process"""
+    return ApiClient() if DEFAULT_API_URL else None
+
+def fetch_analysis_via_api(api_job, analysis_type, input_text, on_chunk=None):
+    """Run one analysis as an API job; returns (response, timing) like fetch_analysis"""
+    # Deterministic key, so reruns and double clicks attach to the same job
+    idempotency_key = make_key(api_job["resume_digest"], input_text, analysis_type, "api", api_job["variant"])
+    return api_job["client"].run_analysis(
+        api_job["load_bytes"](), input_text, analysis_type, extraction=api_job["mode"], raster=api_job["raster"],
+        idempotency_key=idempotency_key, on_chunk=on_chunk, reuse_near_duplicates=api_job["reuse_near_duplicates"]
+    )
+
+def get_gemini_response(input_text, pdf_content, prompt, resume_digest, variant="", max_retries=3,
+                        placeholder=None, response_schema=None, dashboard_placeholder=None,
+                        analysis_type=None, api_job=None, near_duplicates=(), sections=None, segmentation=None):
+    """Enhanced Gemini response with persistent caching, streaming, error handling and retries
+
+    When a placeholder is given the response is streamed into it chunk by
+    chunk, and a dashboard placeholder is filled in as JSON fields arrive.
+    Timings are stored in st.session_state.last_response_timing. Only the
+    ``sections`` of the resume's ``segmentation`` are sent when given. With
+    an ``api_job`` the analysis runs on the analysis API instead.
+    """
+    on_chunk = None
+    if placeholder is not None:
+        chunks = []
+        feed_dashboard = live_dashboard_feeder(dashboard_placeholder) if dashboard_placeholder is not None else None
+
+        def on_chunk(chunk):
+            chunks.append(chunk)
+            placeholder.markdown("".join(chunks) + " ▌")
+            if feed_dashboard is not None:
+                feed_dashboard(chunk)
+    try:
+        if api_job is not None:
+            response, timing = fetch_analysis_via_api(api_job, analysis_type, input_text, on_chunk)
+        else:
+            response, timing = fetch_analysis(
+                get_analysis_cache(), input_text, pdf_content, prompt, resume_digest,
+                variant=variant, max_retries=max_retries, on_chunk=on_chunk, response_schema=response_schema,
+                near_duplicates=near_duplicates, analysis_type=analysis_type, sections=sections,
+                segmentation=segmentation
+            )
+    except Exception as e:
+        if placeholder is not None:
+            placeholder.empty()
+        if current_trace() is not None:
+            current_trace().error = str(e)
+        st.error(f"❌ API Error: {str(e)}")
+        return None
+    st.session_state.last_response_timing = timing
+    if placeholder is not None and response:
+        placeholder.markdown(response)
+    if timing.get("trimmed"):
+        st.caption(f"✂️ The {' and '.join(part.replace('_', ' ') for part in timing['trimmed'])} "
+                   f"was shortened to fit the input token budget")
+    if timing.get("sections"):
+        st.caption(f"📑 Sent resume sections: {', '.join(timing['sections'])}")
+    return response
+
+def _analysis_worker(option, input_text, pdf_content, resume_digest, variant, cache, events, stream, api_job=None,
+                     near_duplicates=(), sections=None, segmentation=None):
+    """Thread worker for run_all_analyses; reports progress through the event queue"""
+    title = option["title"]
+    # Worker threads start with an empty context, so each analysis gets its own trace
+    trace = start_trace(title, extraction=variant, run_all=True)
+    on_chunk = (lambda chunk: events.put((title, "chunk", chunk))) if stream else None
+    try:
+        if api_job is not None:
+            response, timing = fetch_analysis_via_api(api_job, title, input_text, on_chunk)
+        else:
+            response, timing = fetch_analysis(
+                cache, input_text, pdf_content, option["prompt"], resume_digest, variant=variant,
+                on_chunk=on_chunk, response_schema=option.get("response_schema"), near_duplicates=near_duplicates,
+                analysis_type=title, sections=sections, segmentation=segmentation
+            )
+        timing["trace"] = finish_trace(trace)
+        events.put((title, "done", (response, timing)))
+    except Exception as e:
+        finish_trace(trace, e)
+        events.put((title, "error", str(e)))
+
+def run_all_analyses(input_text, pdf_content, resume_digest, variant, placeholders, on_complete, stream=True,
+                     on_chunk=None, api_job=None, near_duplicates=(), sections=None, segmentation=None):
+    """Run every analysis type concurrently on the same preprocessed resume.
+
+    Worker threads only talk to Gemini and the cache; this (script) thread
+    drains their events, streaming chunks into each tab's placeholder and
+    calling on_chunk(title, chunk) / on_complete(title, response, timing) as
+    chunks arrive and analyses finish. ``sections`` maps each title to the
+    resume sections it sends.
+    """
+    sections = sections or {}
+    cache = get_analysis_cache()
+    events = queue.Queue()
+    chunks = {option["title"]: [] for option in ANALYSIS_OPTIONS}
+    timings = {}
+    with ThreadPoolExecutor(max_workers=len(ANALYSIS_OPTIONS)) as executor:
+        for option in ANALYSIS_OPTIONS:
+            executor.submit(
+                _analysis_worker, option, input_text, pdf_content, resume_digest, variant, cache, events, stream,
+                api_job, near_duplicates, sections.get(option["title"]), segmentation
+            )
+        pending = len(ANALYSIS_OPTIONS)
+        while pending:
+            title, kind, payload = events.get()
+            if kind == "chunk":
+                chunks[title].append(payload)
+                placeholders[title].markdown("".join(chunks[title]) + " ▌")
+                if on_chunk is not None:
+                    on_chunk(title, payload)
+                continue
+            pending -= 1
+            if kind == "done":
+                response, timings[title] = payload
+                placeholders[title].markdown(response)
+                on_complete(title, response, timings[title])
+            else:
+                placeholders[title].empty()
+                st.error(f"❌ {title} failed: {payload}")
+    st.session_state.last_response_timing = timings
+
+@st.cache_resource(show_spinner=False)
+def get_artifact_cache():
+    """Bounded cache of preprocessed PDFs shared by all sessions, keyed by content hash"""
+    return ArtifactCache()
+
+def upload_reader(uploaded_file):
+    """Deferred read of the upload, only called when the artifact cache misses"""
+    def read():
+        with stage("upload_read"):
+            return uploaded_file.getvalue()
+    return read
+
+def input_pdf_setup(uploaded_file, resume_digest, mode=EXTRACTION_TEXT, raster=None):
+    """Enhanced PDF processing: text layer first, images only for scanned pages"""
     if uploaded_file is not None:
         try:
-            pdf_bytes = uploaded_file.read()
-            doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-            
-            # Process first 3 pages maximum to avoid token limits
-            pdf_parts = []
-            max_pages = min(3, len(doc))
-            
-            for page_num in range(max_pages):
-                page = doc.load_page(page_num)
-                pix = page.get_pixmap()
-                
-                img_byte_arr = io.BytesIO(pix.tobytes("jpeg"))
-                img_bytes = img_byte_arr.getvalue()
-                
-                pdf_parts.append({
-                    "mime_type": "image/jpeg",
-                    "data": base64.b64encode(img_bytes).decode()
-                })
-            
-            doc.close()
-            return pdf_parts
+            return get_artifact_cache().parts(resume_digest, upload_reader(uploaded_file), mode, raster)["parts"]
         except Exception as e:
             st.error(f"❌ Error processing PDF: {str(e)}")
             return None
@@ -81,18 +224,111 @@ def input_pdf_setup(uploaded_file):
         st.error("❌ No file uploaded")
         return None
 
-def extract_structured_data(response_text):
-    """Extract structured data from AI response"""
+def get_resume_text(resume_digest, uploaded_file):
+    """Cached text layer of the resume, keyed by content hash"""
+    return get_artifact_cache().text(resume_digest, upload_reader(uploaded_file))
+
+@st.cache_resource(show_spinner=False)
+def get_prefetcher():
+    """Capped background pool that preprocesses uploads before an analysis is requested"""
+    return Prefetcher(get_artifact_cache(), get_analysis_cache())
+
+def schedule_prefetch(uploaded_file, input_text, mode, raster, quick_scan=False):
+    """Start speculative work for the upload on screen and cancel work for ones that are gone.
+
+    Runs on every rerun; work that is already queued, running or done is not
+    submitted again. With the analysis API the workers preprocess instead.
+    """
+    prefetcher = get_prefetcher()
+    # Tasks are shared across sessions; each session only withdraws its own claim
+    owner = st.session_state.setdefault("prefetch_owner", uuid.uuid4().hex)
+    keys = []
+    if uploaded_file is not None and get_api_client() is None:
+        # The digest is computed once per file; the bytes are only read if a task misses the artifact cache
+        resume_digest = upload_digest(uploaded_file)
+        load_bytes = upload_reader(uploaded_file)
+        keys.append(prefetcher.preprocess(resume_digest, load_bytes, mode, raster, owner))
+        if quick_scan and input_text.strip():
+            get_llm_backend()
+            keys.append(prefetcher.quick_scan(resume_digest, load_bytes, input_text, mode, raster, owner))
+    keys = [key for key in keys if key is not None]
+    # A new upload, job description or extraction setting makes earlier speculative work moot
+    prefetcher.cancel(set(st.session_state.get("prefetch_keys", ())) - set(keys), owner)
+    st.session_state.prefetch_keys = keys
+
+def get_resume_sections(resume_digest, uploaded_file):
+    """Cached section segmentation of the resume, keyed by content hash"""
     try:
-        # Try to parse JSON if present
-        if "{" in response_text and "}" in response_text:
-            start = response_text.find("{")
-            end = response_text.rfind("}") + 1
-            json_str = response_text[start:end]
-            return json.loads(json_str)
-    except:
-        pass
-    return None
+        return get_artifact_cache().sections(resume_digest, upload_reader(uploaded_file))
+    except Exception:
+        # Whole pages are sent when the layout cannot be segmented
+        return None
+
+@st.cache_resource(show_spinner=False)
+def get_signature_index():
+    """MinHash/LSH index of analyzed resumes, for reusing results of near-duplicates"""
+    return SignatureIndex()
+
+def near_duplicate_notice(timing, resume_text):
+    """What to show when a result was reused from a near-duplicate resume (None otherwise)"""
+    duplicate = (timing or {}).get("near_duplicate_of")
+    if duplicate is None:
+        return None
+    earlier_text = get_signature_index().text(duplicate)
+    return {
+        "similarity": timing["similarity"],
+        "diff": diff_lines(earlier_text, resume_text) if earlier_text is not None else [],
+    }
+
+def render_near_duplicate_notice(notice):
+    st.info(
+        f"♻️ Reused the analysis of an earlier, {notice['similarity']:.0%} similar version of this resume "
+        "for the same job description. Turn off **Reuse Near-Duplicate Results** in the sidebar to analyze this version."
+    )
+    if notice["diff"]:
+        with st.expander("🔀 What changed since the earlier version", expanded=False):
+            st.code("\n".join(notice["diff"]), language="diff")
+
+def render_keyword_prescore(prescore):
+    """Instant local keyword match shown while Gemini is still working"""
+    st.markdown("#### ⚡ Instant Keyword Pre-Score")
+    st.caption("Local keyword overlap with the job description — the AI analysis below refines these numbers.")
+    col_pre1, col_pre2, col_pre3 = st.columns(3)
+    with col_pre1:
+        st.markdown(f"""
+        <div class="metric-card">
+            <h4 style='color: white; margin: 0;'>🔑 Keyword Match</h4>
+            <h2 style='color: white; margin: 0.5rem 0;'>{calculate_score_visual(prescore['match_percentage'])}</h2>
+        </div>
+        """, unsafe_allow_html=True)
+    with col_pre2:
+        st.markdown(f"""
+        <div class="metric-card">
+            <h4 style='color: white; margin: 0;'>✅ Keywords Found</h4>
+            <h2 style='color: white; margin: 0.5rem 0;'>{len(prescore['matched_keywords'])} / {prescore['keyword_count']}</h2>
+        </div>
+        """, unsafe_allow_html=True)
+    with col_pre3:
+        st.markdown(f"""
+        <div class="metric-card">
+            <h4 style='color: white; margin: 0;'>⚠️ Missing Keywords</h4>
+            <h2 style='color: white; margin: 0.5rem 0;'>{prescore['keyword_count'] - len(prescore['matched_keywords'])}</h2>
+        </div>
+        """, unsafe_allow_html=True)
+    fit = []
+    if prescore.get('meets_years') is not None:
+        fit.append(f"{'✅' if prescore['meets_years'] else '⚠️'} Experience: ~{prescore['years_found']} years "
+                   f"(JD asks for {prescore['required_years']}+)")
+    if prescore.get('meets_education') is not None:
+        found = prescore['education_found'] or "not found"
+        fit.append(f"{'✅' if prescore['meets_education'] else '⚠️'} Education: {found} "
+                   f"(JD asks for {prescore['education_required']})")
+    if fit:
+        st.caption(" · ".join(fit))
+    if prescore['missing_keywords']:
+        # Keywords come from the pasted JD, so they are escaped before rendering as HTML
+        keywords_html = " ".join([f"<span style='background: #ffa94d; color: white; padding: 0.3rem 0.6rem; border-radius: 20px; margin: 0.2rem; display: inline-block;'>{html.escape(kw)}</span>" for kw in prescore['missing_keywords']])
+        st.markdown(keywords_html, unsafe_allow_html=True)
 
 def calculate_score_visual(score):
     """Create visual score representation"""
@@ -103,9 +339,252 @@ def calculate_score_visual(score):
     progress = "█" * int(score / 10) + "░" * (10 - int(score / 10))
     return f"{color} {score}% {progress}"
 
+def render_metrics_dashboard(structured_data):
+    """Metrics cards and detail sections for a structured Detailed Analysis"""
+    st.markdown("#### 📊 Metrics Dashboard")
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.markdown(f"""
+        <div class="metric-card">
+            <h4 style='color: white; margin: 0;'>🎯 Overall Match</h4>
+            <h2 style='color: white; margin: 0.5rem 0;'>{calculate_score_visual(structured_data.get('match_percentage'))}</h2>
+        </div>
+        """, unsafe_allow_html=True)
+    
+    with col2:
+        st.markdown(f"""
+        <div class="metric-card">
+            <h4 style='color: white; margin: 0;'>🤖 ATS Score</h4>
+            <h2 style='color: white; margin: 0.5rem 0;'>{calculate_score_visual(structured_data.get('ats_score'))}</h2>
+        </div>
+        """, unsafe_allow_html=True)
+    
+    with col3:
+        missing_count = len(structured_data.get('missing_keywords', []))
+        st.markdown(f"""
+        <div class="metric-card">
+            <h4 style='color: white; margin: 0;'>⚠️ Missing Keywords</h4>
+            <h2 style='color: white; margin: 0.5rem 0;'>{missing_count}</h2>
+        </div>
+        """, unsafe_allow_html=True)
+    
+    with col4:
+        strengths_count = len(structured_data.get('strengths', []))
+        st.markdown(f"""
+        <div class="metric-card">
+            <h4 style='color: white; margin: 0;'>✅ Strengths</h4>
+            <h2 style='color: white; margin: 0.5rem 0;'>{strengths_count}</h2>
+        </div>
+        """, unsafe_allow_html=True)
+    
+    # Detailed Sections
+    if 'missing_keywords' in structured_data and structured_data['missing_keywords']:
+        with st.expander("🔍 Missing Keywords Analysis", expanded=True):
+            st.write("**Keywords to add to your resume:**")
+            # Model output is untrusted, so keywords are escaped before rendering as HTML
+            keywords_html = " ".join([f"<span style='background: #ff6b6b; color: white; padding: 0.3rem 0.6rem; border-radius: 20px; margin: 0.2rem; display: inline-block;'>{html.escape(str(kw))}</span>" for kw in structured_data['missing_keywords'][:10]])
+            st.markdown(keywords_html, unsafe_allow_html=True)
+    
+    if 'strengths' in structured_data and structured_data['strengths']:
+        with st.expander("✅ Key Strengths", expanded=True):
+            for strength in structured_data['strengths']:
+                st.markdown(f"🎯 {strength}")
+    
+    if 'recommendations' in structured_data and structured_data['recommendations']:
+        with st.expander("💡 Actionable Recommendations", expanded=True):
+            for i, rec in enumerate(structured_data['recommendations'], 1):
+                st.markdown(f"{i}. **{rec}**")
+
+def render_download_section(response, analysis_type):
+    """Download button for the full report"""
+    st.markdown("---")
+    col_dl1, col_dl2 = st.columns([3, 1])
+    with col_dl1:
+        st.markdown("#### 💾 Save Results")
+    with col_dl2:
+        st.download_button(
+            label="📥 Download Full Report",
+            data=response,
+            file_name=f"resume_analysis_{analysis_type.replace(' ', '_').lower()}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt",
+            mime="text/plain",
+            use_container_width=True,
+            key=f"download_{analysis_type.replace(' ', '_').lower()}"
+        )
+
+def payload_summary(pdf_content, raster):
+    """Small description of the request payload, kept instead of the parts themselves"""
+    return {
+        "text_parts": sum(1 for part in pdf_content if "text" in part),
+        "image_parts": sum(1 for part in pdf_content if "data" in part),
+        "bytes": parts_payload_bytes(pdf_content),
+        "raster": raster,
+    }
+
+def render_debug_stats(payload, trace=None):
+    """Payload, per-stage timing, tokens, cache and rate limiter details for Debug Mode"""
+    with st.expander("🐛 Cache, Timing & Rate Limit Statistics", expanded=False):
+        st.json({
+            "request_trace": trace,
+            "payload": payload,
+            "response_timing": st.session_state.get("last_response_timing"),
+            "cache": get_analysis_cache().stats(),
+            "artifacts": get_artifact_cache().stats(),
+            "prefetch": get_prefetcher().stats(),
+            "prompt_contexts": context_stats(),
+            "model_routing": MODEL_STATS.snapshot(),
+            "gemini_flow": flow_stats(),
+            "json_parsing": PARSE_STATS,
+        })
+
+@st.cache_resource(show_spinner=False)
+def get_history_store():
+    """Persistent analysis history shared by all sessions"""
+    return HistoryStore()
+
+@st.cache_resource(show_spinner=False)
+def get_results_dataset():
+    """Columnar results dataset behind the Analytics page"""
+    return ResultsDataset()
+
+def save_to_history(analysis_type, response, resume_digest, input_text, resume_name, timing=None):
+    """Record the full response in the history store, and its scores and timings in the results dataset"""
+    structured = extract_structured_data(response) if analysis_type == "Detailed Analysis" else None
+    get_history_store().add(
+        analysis_type, response,
+        resume_hash=resume_digest,
+        input_text=input_text,
+        resume_name=resume_name,
+        structured=structured,
+        timing=timing
+    )
+    # Analyses run as API jobs are recorded by the API server
+    if "job_id" not in (timing or {}):
+        get_results_dataset().append(result_row(
+            analysis_type, structured, timing, resume_hash=resume_digest, input_text=input_text,
+            resume_name=resume_name
+        ))
+
+def live_dashboard_feeder(dashboard_placeholder):
+    """Chunk callback that re-renders the dashboard whenever a JSON field completes"""
+    parser = IncrementalJSONParser()
+    
+    def feed(chunk):
+        if parser.feed(chunk):
+            with dashboard_placeholder.container():
+                render_metrics_dashboard(parser.fields)
+    return feed
+
+def render_analysis_result(analysis_type, response, dashboard_placeholder):
+    """Dashboard (for Detailed Analysis) and download button for a finished response"""
+    if analysis_type == "Detailed Analysis":
+        with stage("json_parse"):
+            structured_data = extract_structured_data(response)
+        
+        with stage("render"):
+            if structured_data and 'match_percentage' in structured_data:
+                with dashboard_placeholder.container():
+                    render_metrics_dashboard(structured_data)
+            else:
+                dashboard_placeholder.empty()
+    
+    with stage("render"):
+        render_download_section(response, analysis_type)
+
+# Completed runs kept per session; reruns with the same key only re-render
+MAX_COMPLETED_RUNS = 8
+
+def upload_digest(uploaded_file):
+    """Content hash of an upload, computed once per file instead of on every rerun"""
+    digests = st.session_state.setdefault("upload_digests", {})
+    file_key = getattr(uploaded_file, "file_id", None) or (uploaded_file.name, uploaded_file.size)
+    if file_key not in digests:
+        digests[file_key] = resume_hash(uploaded_file.getvalue())
+    return digests[file_key]
+
+def analysis_run_key(resume_digest, analysis_type, prompt, input_text, variant):
+    """Identity of a run: same resume, job description, prompt and extraction settings"""
+    parts = [resume_digest, analysis_type, prompt or "", normalize_text(input_text), variant]
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+def store_completed_run(run_key, result):
+    runs = st.session_state.setdefault("completed_runs", {})
+    runs[run_key] = result
+    while len(runs) > MAX_COMPLETED_RUNS:
+        runs.pop(next(iter(runs)))
+
+def render_completed_run(current_type, completed, enable_debug):
+    """Re-render a finished run from session state without touching the PDF or Gemini"""
+    st.markdown(f"### ✅ Completed: {current_type}")
+    if completed["prescore"]:
+        render_keyword_prescore(completed["prescore"])
+    st.markdown("---")
+    if current_type == RUN_ALL:
+        st.markdown("### 📋 All Analyses Results")
+        titles = [option['title'] for option in ANALYSIS_OPTIONS if option['title'] in completed["responses"]]
+        tabs = st.tabs([f"{get_analysis_option(title)['icon']} {title}" for title in titles])
+        for tab, title in zip(tabs, titles):
+            with tab:
+                dashboard_placeholder = st.empty()
+                if completed.get("notices", {}).get(title):
+                    render_near_duplicate_notice(completed["notices"][title])
+                with st.expander("📝 Detailed Analysis Report", expanded=True):
+                    st.markdown("#### Complete Analysis")
+                    st.markdown(completed["responses"][title])
+                render_analysis_result(title, completed["responses"][title], dashboard_placeholder)
+    else:
+        st.markdown(f"### 📋 {current_type} Results")
+        dashboard_placeholder = st.empty()
+        response = completed["responses"][current_type]
+        if completed.get("notices", {}).get(current_type):
+            render_near_duplicate_notice(completed["notices"][current_type])
+        with st.expander("📝 Detailed Analysis Report", expanded=True):
+            st.markdown("#### Complete Analysis")
+            st.markdown(response)
+        render_analysis_result(current_type, response, dashboard_placeholder)
+    if enable_debug:
+        render_debug_stats(completed["payload"], completed["trace"])
+
+HISTORY_PAGE_SIZE = 10
+
+@st.fragment
+def render_history_panel():
+    """Analysis history; searching and paging rerun only this fragment"""
+    history_store = get_history_store()
+    if not history_store.has_entries():
+        return
+    st.markdown("---")
+    st.markdown("### 📚 Analysis History")
+    st.markdown("<p style='color: #666;'>Search and browse past resume analyses</p>", unsafe_allow_html=True)
+    
+    col_hist1, col_hist2 = st.columns([3, 1])
+    with col_hist1:
+        history_search = st.text_input("🔎 Search history", placeholder="e.g. kubernetes leadership", key="history_search")
+    with col_hist2:
+        history_type = st.selectbox("Type", ["All"] + [option['title'] for option in ANALYSIS_OPTIONS], key="history_type")
+    history_type = None if history_type == "All" else history_type
+    
+    history_total = history_store.count(history_search, history_type)
+    history_pages = max(1, -(-history_total // HISTORY_PAGE_SIZE))
+    history_page = st.number_input(
+        f"Page (of {history_pages}, {history_total} analyses)",
+        min_value=1, max_value=history_pages, value=1, step=1, key="history_page"
+    )
+    
+    for entry in history_store.page(history_page, HISTORY_PAGE_SIZE, history_search, history_type):
+        timestamp = datetime.fromtimestamp(entry['created_at']).strftime("%Y-%m-%d %H:%M:%S")
+        with st.expander(f"**#{entry['id']}** - {timestamp} ({entry['analysis_type']}) {entry['resume_name'] or ''}", expanded=False):
+            st.markdown(f"**Type:** {entry['analysis_type']}")
+            st.markdown(f"**Time:** {timestamp}")
+            if entry['match_percentage'] is not None:
+                st.markdown(f"**Match:** {calculate_score_visual(entry['match_percentage'])}")
+            if entry['response_length'] > len(entry['preview']) and st.toggle("Show full report", key=f"history_full_{entry['id']}"):
+                st.write(history_store.get(entry['id'])['response'])
+            else:
+                st.markdown("**Summary:**")
+                st.write(entry['preview'] + ("..." if entry['response_length'] > len(entry['preview']) else ""))
+
 # === Session State Initialization ===
-if 'analysis_history' not in st.session_state:
-    st.session_state.analysis_history = []
 if 'current_response' not in st.session_state:
     st.session_state.current_response = None
 if 'current_analysis_type' not in st.session_state:
@@ -227,6 +706,37 @@ with st.sidebar:
     st.markdown("### 📊 Analysis Settings")
     save_results = st.toggle("💾 Save to History", value=True, help="Store analysis results in history")
     enable_debug = st.toggle("🐛 Debug Mode", value=False, help="Show detailed processing information")
+    text_first = st.toggle(
+        "📝 Text-first Extraction",
+        value=True,
+        help="Send the resume's text layer and only rasterize scanned pages (faster, no page limit for text)"
+    )
+    extraction_mode = EXTRACTION_TEXT if text_first else EXTRACTION_IMAGE
+    stream_responses = st.toggle(
+        "⚡ Stream Responses",
+        value=True,
+        help="Show the report as it is being written instead of waiting for the full response"
+    )
+    prefetch_quick_scan = st.toggle(
+        "🔮 Prefetch Quick Scan",
+        value=PREFETCH_QUICK_SCAN,
+        help="Run a Quick Scan in the background once a resume and job description are in, using spare Gemini capacity only"
+    )
+    reuse_near_duplicates = st.toggle(
+        "♻️ Reuse Near-Duplicate Results",
+        value=True,
+        help="Reuse the analysis of a lightly edited earlier version of the same resume for the same job description"
+    )
+    
+    with st.expander("🖼️ Page Rendering", expanded=False):
+        st.caption("Applies to scanned pages (or every page when text-first extraction is off). Higher values improve OCR but increase payload size and latency.")
+        raster = raster_settings(
+            dpi=st.slider("DPI", 50, 200, DEFAULT_RASTER["dpi"], step=10),
+            grayscale=st.toggle("Grayscale", value=DEFAULT_RASTER["grayscale"]),
+            jpeg_quality=st.slider("JPEG Quality", 40, 95, DEFAULT_RASTER["jpeg_quality"], step=5),
+            max_dimension=st.select_slider("Max Dimension (px)", options=[800, 1200, 1600, 2000, 3000], value=DEFAULT_RASTER["max_dimension"]),
+        )
+    extraction_key = extraction_variant(extraction_mode, raster)
     
     st.markdown("---")
     
@@ -282,6 +792,8 @@ with col1:
             help="Supported: PDF files up to 10MB",
             label_visibility="collapsed"
         )
+        # Preprocessing starts now, while the job description is pasted and an analysis chosen
+        schedule_prefetch(uploaded_file, input_text, extraction_mode, raster, prefetch_quick_scan)
         
         if uploaded_file is not None:
             # File details card
@@ -309,92 +821,7 @@ with col2:
     st.markdown("<p style='color: #666; margin-bottom: 1.5rem;'>Select the depth of analysis based on your needs</p>", unsafe_allow_html=True)
     
     # Analysis Options Configuration
-    analysis_options = [
-        {
-            "icon": "🚀",
-            "title": "Quick Scan", 
-            "description": "Fast 30-second overview",
-            "color": "linear-gradient(135deg, #667eea 0%, #764ba2 100%)",
-            "features": ["Basic match assessment", "Key strengths/weaknesses", "Quick recommendations", "Instant results"],
-            "prompt": """
-            QUICK SCAN - Provide concise evaluation (under 250 words):
-            
-            🎯 **Overall Match**: [Good/Fair/Poor fit]
-            
-            ✅ **Top 3 Strengths**:
-            - [Most relevant qualification]
-            - [Key experience match]
-            - [Main skill alignment]
-            
-            ⚠️ **Top 3 Weaknesses**:
-            - [Major gap]
-            - [Missing requirement]
-            - [Area for improvement]
-            
-            💡 **Quick Recommendations**: [2-3 actionable tips]
-            
-            Be direct, concise, and actionable.
-            """,
-            "button_type": "secondary"
-        },
-        {
-            "icon": "📊", 
-            "title": "Detailed Analysis",
-            "description": "Comprehensive ATS evaluation", 
-            "color": "linear-gradient(135deg, #f093fb 0%, #f5576c 100%)",
-            "features": ["ATS compatibility score", "Match percentage", "Missing keywords", "Detailed insights", "Structured report"],
-            "prompt": """
-            DETAILED ANALYSIS - Provide structured evaluation with metrics:
-            
-            Please respond in this EXACT JSON format:
-            {
-                "match_percentage": 85,
-                "ats_score": 78,
-                "overall_assessment": "Brief summary of fit",
-                "missing_keywords": ["Python", "Machine Learning", "AWS", "SQL", "Agile"],
-                "strengths": ["Strong educational background", "Relevant project experience", "Technical skills match"],
-                "weaknesses": ["Missing certification", "Limited leadership experience", "Gap in specific technology"],
-                "recommendations": ["Add missing keywords strategically", "Quantify achievements", "Highlight relevant projects"]
-            }
-            
-            If JSON is not possible, use clear headings and structure.
-            """,
-            "button_type": "primary"
-        },
-        {
-            "icon": "💎",
-            "title": "Improvement Pro", 
-            "description": "Expert optimization guide",
-            "color": "linear-gradient(135deg, #4facfe 0%, #00f2fe 100%)",
-            "features": ["ATS optimization", "Content enhancement", "Professional tips", "Best practices", "Competitive edge"],
-            "prompt": """
-            IMPROVEMENT PRO - Provide expert resume optimization:
-            
-            🎯 **Executive Summary**: Overall assessment and potential
-            
-            🔍 **ATS Optimization**:
-            • Keyword analysis and placement
-            • Formatting improvements for ATS
-            • Section optimization tips
-            
-            💡 **Content Enhancement**:
-            • Achievement quantification
-            • Action verb suggestions
-            • Impact statement improvements
-            
-            📊 **Professional Recommendations**:
-            • Skill highlighting strategy
-            • Experience reframing
-            • Competitive positioning
-            
-            🚀 **Quick Wins**: Immediate improvements (3-5 items)
-            📈 **Long-term Strategy**: Career development suggestions
-            
-            Provide specific, actionable advice.
-            """,
-            "button_type": "secondary"
-        }
-    ]
+    analysis_options = ANALYSIS_OPTIONS
 
     # Create analysis cards
     cols = st.columns(3)
@@ -430,133 +857,241 @@ with col2:
             ):
                 st.session_state.current_analysis_type = option['title']
                 st.session_state.selected_prompt = option['prompt']
+                st.session_state.selected_schema = option.get('response_schema')
                 st.rerun()
+    
+    # Run all three analyses on one preprocessed resume
+    if st.button(
+        "⚡ Run All Analyses",
+        use_container_width=True,
+        type="primary" if st.session_state.get('current_analysis_type') == RUN_ALL else "secondary",
+        key="btn_run_all",
+        help="Runs Quick Scan, Detailed Analysis and Improvement Pro concurrently"
+    ):
+        st.session_state.current_analysis_type = RUN_ALL
+        st.session_state.selected_prompt = None
+        st.session_state.selected_schema = None
+        st.rerun()
 
 # Analysis Execution Section
 if uploaded_file is not None and st.session_state.get('current_analysis_type'):
     st.markdown("---")
     
-    # Show current analysis info
     current_type = st.session_state.current_analysis_type
-    st.markdown(f"### 🔍 Running: {current_type}")
+    resume_digest = upload_digest(uploaded_file)
+    run_key = analysis_run_key(
+        resume_digest, current_type, st.session_state.get("selected_prompt"), input_text,
+        extraction_key + (":reuse" if reuse_near_duplicates else "")
+    )
+    completed = st.session_state.setdefault("completed_runs", {}).get(run_key)
     
-    with st.spinner(f"**Analyzing your resume with {current_type}...** This may take 15-30 seconds."):
-        pdf_content = input_pdf_setup(uploaded_file)
+    if completed is not None:
+        # Finished earlier: reruns (widget clicks, history browsing) only re-render
+        render_completed_run(current_type, completed, enable_debug)
+    else:
+        # Show current analysis info
+        st.markdown(f"### 🔍 Running: {current_type}")
+        api_client = get_api_client()
+        if api_client is None:
+            get_llm_backend()
         
-        if pdf_content:
-            response = get_gemini_response(
-                input_text, 
-                pdf_content, 
-                st.session_state.selected_prompt
-            )
+        # One trace per run; worker threads in Run All record their own
+        request_trace = start_trace(current_type, extraction=extraction_key)
+        try:
+            # Local pre-score renders before the Gemini call starts
+            prescore = None
+            resume_text = ""
+            segmentation = None
+            run_options = ANALYSIS_OPTIONS if current_type == RUN_ALL else [get_analysis_option(current_type)]
+            sections = {option["title"]: analysis_sections(option, extraction_mode) for option in run_options}
+            if current_type in ("Detailed Analysis", RUN_ALL) and input_text.strip():
+                with stage("keyword_prescore"):
+                    resume_text = get_resume_text(resume_digest, uploaded_file)
+                    segmentation = get_resume_sections(resume_digest, uploaded_file)
+                    # Contact details, references and hobbies are left out of the keyword match
+                    prescore = score_with_profile(
+                        get_jd_profile(input_text), scoring_text(segmentation, resume_text)
+                    ) if resume_text.strip() else None
+                if prescore is not None:
+                    render_keyword_prescore(prescore)
+        
+            # Earlier, lightly edited versions of this resume whose results can be reused
+            near_duplicates = []
+            reusable = False
+            if reuse_near_duplicates and api_client is None and input_text.strip():
+                with stage("near_duplicate_lookup"):
+                    resume_text = resume_text or get_resume_text(resume_digest, uploaded_file)
+                    # All matches: the closest ones may have no result for this JD while an older one does
+                    near_duplicates = get_signature_index().query(resume_text, exclude=resume_digest, limit=None)
+                    # When every result can be reused the PDF never needs rasterizing
+                    reusable = bool(near_duplicates) and all(
+                        find_cached_analysis(
+                            get_analysis_cache(), input_text, option["prompt"], resume_digest, extraction_key,
+                            option.get("response_schema"), near_duplicates, sections[option["title"]]
+                        )[0] is not None
+                        for option in run_options
+                    )
+        
+            # Rasterize/encode stages are only recorded when the preprocessing cache misses
+            api_job = None
+            if reusable:
+                pdf_content = []
+            elif api_client is None:
+                with st.spinner("**Preparing your resume...**"), stage("preprocess"):
+                    pdf_content = input_pdf_setup(uploaded_file, resume_digest, extraction_mode, raster)
+                    if segmentation is None and any(sections.values()):
+                        segmentation = get_resume_sections(resume_digest, uploaded_file)
+            else:
+                # API workers preprocess the resume themselves; the app only uploads it
+                pdf_content = []
+                api_job = {
+                    "client": api_client,
+                    "load_bytes": upload_reader(uploaded_file),
+                    "resume_digest": resume_digest,
+                    "mode": extraction_mode,
+                    "raster": raster,
+                    "variant": extraction_key + (":reuse" if reuse_near_duplicates else ""),
+                    "reuse_near_duplicates": reuse_near_duplicates,
+                }
+            ready = bool(pdf_content) or api_job is not None or reusable
+        
+            responses = {}
+            notices = {}
+            if ready and current_type == RUN_ALL:
+                st.markdown("---")
+                st.markdown("### 📋 All Analyses Results")
+                tabs = st.tabs([f"{option['icon']} {option['title']}" for option in ANALYSIS_OPTIONS])
+                placeholders = {}
+                dashboards = {}
+                result_containers = {}
+                for tab, option in zip(tabs, ANALYSIS_OPTIONS):
+                    with tab:
+                        dashboards[option['title']] = st.empty()
+                        with st.expander("📝 Detailed Analysis Report", expanded=True):
+                            st.markdown("#### Complete Analysis")
+                            placeholders[option['title']] = st.empty()
+                            placeholders[option['title']].markdown(f"⏳ *Running {option['title']}...*")
+                        result_containers[option['title']] = st.container()
             
-            if response:
-                st.session_state.current_response = response
-                
-                # Save to history
-                if save_results:
-                    history_entry = {
-                        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                        "analysis_type": current_type,
-                        "response": response[:500] + "..." if len(response) > 500 else response
-                    }
-                    st.session_state.analysis_history.append(history_entry)
-                
-                # Display Results
+                def on_complete(title, response, timing):
+                    if not response:
+                        return
+                    responses[title] = response
+                    notices[title] = near_duplicate_notice(timing, resume_text)
+                    if save_results:
+                        save_to_history(title, response, resume_digest, input_text, uploaded_file.name, timing)
+                    with result_containers[title]:
+                        if notices[title]:
+                            render_near_duplicate_notice(notices[title])
+                        render_analysis_result(title, response, dashboards[title])
+            
+                # Dashboards fill in from the streamed JSON before the analysis completes
+                live_dashboards = {
+                    option['title']: live_dashboard_feeder(dashboards[option['title']])
+                    for option in ANALYSIS_OPTIONS if option.get('response_schema') is not None
+                }
+            
+                def on_chunk(title, chunk):
+                    if title in live_dashboards:
+                        live_dashboards[title](chunk)
+            
+                run_all_analyses(
+                    input_text, pdf_content, resume_digest, extraction_key, placeholders, on_complete,
+                    stream=stream_responses, on_chunk=on_chunk, api_job=api_job, near_duplicates=near_duplicates,
+                    sections=sections, segmentation=segmentation
+                )
+                succeeded = len(responses) == len(ANALYSIS_OPTIONS)
+        
+            elif ready:
+                # Results layout is created up front so the report can stream into it
                 st.markdown("---")
                 st.markdown(f"### 📋 {current_type} Results")
-                
-                # Enhanced Results Display
-                if current_type == "Detailed Analysis":
-                    structured_data = extract_structured_data(response)
-                    
-                    if structured_data and 'match_percentage' in structured_data:
-                        # Metrics Dashboard
-                        st.markdown("#### 📊 Metrics Dashboard")
-                        col1, col2, col3, col4 = st.columns(4)
-                        
-                        with col1:
-                            st.markdown(f"""
-                            <div class="metric-card">
-                                <h4 style='color: white; margin: 0;'>🎯 Overall Match</h4>
-                                <h2 style='color: white; margin: 0.5rem 0;'>{calculate_score_visual(structured_data['match_percentage'])}</h2>
-                            </div>
-                            """, unsafe_allow_html=True)
-                        
-                        with col2:
-                            st.markdown(f"""
-                            <div class="metric-card">
-                                <h4 style='color: white; margin: 0;'>🤖 ATS Score</h4>
-                                <h2 style='color: white; margin: 0.5rem 0;'>{calculate_score_visual(structured_data.get('ats_score'))}</h2>
-                            </div>
-                            """, unsafe_allow_html=True)
-                        
-                        with col3:
-                            missing_count = len(structured_data.get('missing_keywords', []))
-                            st.markdown(f"""
-                            <div class="metric-card">
-                                <h4 style='color: white; margin: 0;'>⚠️ Missing Keywords</h4>
-                                <h2 style='color: white; margin: 0.5rem 0;'>{missing_count}</h2>
-                            </div>
-                            """, unsafe_allow_html=True)
-                        
-                        with col4:
-                            strengths_count = len(structured_data.get('strengths', []))
-                            st.markdown(f"""
-                            <div class="metric-card">
-                                <h4 style='color: white; margin: 0;'>✅ Strengths</h4>
-                                <h2 style='color: white; margin: 0.5rem 0;'>{strengths_count}</h2>
-                            </div>
-                            """, unsafe_allow_html=True)
-                        
-                        # Detailed Sections
-                        if 'missing_keywords' in structured_data and structured_data['missing_keywords']:
-                            with st.expander("🔍 Missing Keywords Analysis", expanded=True):
-                                st.write("**Keywords to add to your resume:**")
-                                keywords_html = " ".join([f"<span style='background: #ff6b6b; color: white; padding: 0.3rem 0.6rem; border-radius: 20px; margin: 0.2rem; display: inline-block;'>{kw}</span>" for kw in structured_data['missing_keywords'][:10]])
-                                st.markdown(keywords_html, unsafe_allow_html=True)
-                        
-                        if 'strengths' in structured_data and structured_data['strengths']:
-                            with st.expander("✅ Key Strengths", expanded=True):
-                                for strength in structured_data['strengths']:
-                                    st.markdown(f"🎯 {strength}")
-                        
-                        if 'recommendations' in structured_data and structured_data['recommendations']:
-                            with st.expander("💡 Actionable Recommendations", expanded=True):
-                                for i, rec in enumerate(structured_data['recommendations'], 1):
-                                    st.markdown(f"{i}. **{rec}**")
-                
-                # Full Response Display
+                dashboard_placeholder = st.empty()
                 with st.expander("📝 Detailed Analysis Report", expanded=True):
                     st.markdown("#### Complete Analysis")
-                    st.write(response)
-                
-                # Download Section
-                st.markdown("---")
-                col_dl1, col_dl2 = st.columns([3, 1])
-                with col_dl1:
-                    st.markdown("#### 💾 Save Results")
-                with col_dl2:
-                    st.download_button(
-                        label="📥 Download Full Report",
-                        data=response,
-                        file_name=f"resume_analysis_{current_type.replace(' ', '_').lower()}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt",
-                        mime="text/plain",
-                        use_container_width=True
+                    report_placeholder = st.empty()
+            
+                if stream_responses:
+                    report_placeholder.markdown(f"⏳ *Analyzing your resume with {current_type}... the report will appear here as it is written.*")
+                    response = get_gemini_response(
+                        input_text,
+                        pdf_content,
+                        st.session_state.selected_prompt,
+                        resume_digest,
+                        variant=extraction_key,
+                        placeholder=report_placeholder,
+                        response_schema=st.session_state.get("selected_schema"),
+                        dashboard_placeholder=dashboard_placeholder,
+                        analysis_type=current_type,
+                        api_job=api_job,
+                        near_duplicates=near_duplicates,
+                        sections=sections[current_type],
+                        segmentation=segmentation
                     )
+                else:
+                    with st.spinner(f"**Analyzing your resume with {current_type}...** This may take 15-30 seconds."):
+                        response = get_gemini_response(
+                            input_text,
+                            pdf_content,
+                            st.session_state.selected_prompt,
+                            resume_digest,
+                            variant=extraction_key,
+                            response_schema=st.session_state.get("selected_schema"),
+                            analysis_type=current_type,
+                            api_job=api_job,
+                            near_duplicates=near_duplicates,
+                            sections=sections[current_type],
+                            segmentation=segmentation
+                        )
+            
+                if response:
+                    responses[current_type] = response
+                    st.session_state.current_response = response
+                    report_placeholder.markdown(response)
+                
+                    # Save to history
+                    if save_results:
+                        with stage("history_save"):
+                            save_to_history(
+                                current_type, response, resume_digest, input_text, uploaded_file.name,
+                                st.session_state.get("last_response_timing")
+                            )
+                
+                    notices[current_type] = near_duplicate_notice(st.session_state.get("last_response_timing"), resume_text)
+                    if notices[current_type]:
+                        render_near_duplicate_notice(notices[current_type])
+                
+                    # Enhanced Results Display
+                    render_analysis_result(current_type, response, dashboard_placeholder)
+                succeeded = bool(response)
+        
+            else:
+                succeeded = False
+        
+        except BaseException as e:
+            # Stop/Rerun interrupts the script here; finish the trace so it cannot leak into the next run
+            finish_trace(request_trace, e if isinstance(e, Exception) else "interrupted")
+            raise
+        trace_record = finish_trace(request_trace, None if ready else "preprocessing failed")
+        if ready:
+            payload = payload_summary(pdf_content, raster) if api_job is None else {"api": api_client.base_url}
+            if enable_debug:
+                render_debug_stats(payload, trace_record)
+            # Failed runs are not stored, so the next rerun retries them
+            if succeeded:
+                store_completed_run(run_key, {
+                    "prescore": prescore,
+                    "responses": responses,
+                    "notices": notices,
+                    "payload": payload,
+                    "trace": trace_record,
+                })
+                # Freshly analyzed resumes become reuse candidates for their later near-duplicates
+                if api_client is None and not any(notices.values()):
+                    get_signature_index().add(resume_digest, resume_text or get_resume_text(resume_digest, uploaded_file))
 
 # Analysis History
-if st.session_state.analysis_history:
-    st.markdown("---")
-    st.markdown("### 📚 Analysis History")
-    st.markdown("<p style='color: #666;'>Your recent resume analyses</p>", unsafe_allow_html=True)
-    
-    for i, entry in enumerate(reversed(st.session_state.analysis_history[-5:]), 1):
-        with st.expander(f"**Analysis {i}** - {entry['timestamp']} ({entry['analysis_type']})", expanded=False):
-            st.markdown(f"**Type:** {entry['analysis_type']}")
-            st.markdown(f"**Time:** {entry['timestamp']}")
-            st.markdown("**Summary:**")
-            st.write(entry['response'])
+render_history_panel()
 
 # Footer
 st.markdown("---")
@@ -0,0 +1,250 @@
+"""Bounded cache of preprocessed resume artifacts, shared by all sessions.
+
+Artifacts (Gemini parts with page images, the text layer and page
+metadata) are keyed by the SHA-256 of the PDF bytes plus the extraction
+variant, so the same resume uploaded by two recruiters is preprocessed
+once. Entries live in memory under a byte budget with LRU eviction;
+evicted entries optionally spill to a SQLite file (with its own budget)
+and are promoted back to memory on the next hit. The spill file holds
+JSON (page images as base64), never pickles, since the cache directory
+may be shared.
+"""
+import base64
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from analysis_cache import CACHE_DIR
+from ats_engine import (
+    EXTRACTION_TEXT,
+    extract_resume_text,
+    extraction_variant,
+    parts_payload_bytes,
+    pdf_bytes_to_parts,
+)
+from rate_limit import SingleFlight
+from resume_sections import SEGMENTER_VERSION, segment_resume
+
+DEFAULT_SPILL_PATH = os.getenv("ATS_ARTIFACT_PATH", os.path.join(CACHE_DIR, "artifacts.sqlite3"))
+DEFAULT_MEMORY_BYTES = int(float(os.getenv("ATS_ARTIFACT_MEMORY_MB", "256")) * 1024 * 1024)
+# 0 disables spilling to disk
+DEFAULT_DISK_BYTES = int(float(os.getenv("ATS_ARTIFACT_DISK_MB", "1024")) * 1024 * 1024)
+# Rough per-part overhead of the Python objects around the payload bytes
+PART_OVERHEAD_BYTES = 200
+# Marks a base64-encoded bytes value in the spill file
+BYTES_TAG = "__bytes__"
+
+
+def artifact_size(value):
+    """Approximate memory held by a cached artifact"""
+    if isinstance(value, str):
+        return len(value.encode("utf-8")) + PART_OVERHEAD_BYTES
+    if "sections" in value:
+        sections = value["sections"]
+        return sum(len(section["text"].encode("utf-8")) for section in sections) \
+            + PART_OVERHEAD_BYTES * (len(sections) + 1)
+    return parts_payload_bytes(value["parts"]) + PART_OVERHEAD_BYTES * (len(value["parts"]) + 1)
+
+
+def _json_default(value):
+    if isinstance(value, (bytes, bytearray)):
+        return {BYTES_TAG: base64.b64encode(value).decode("ascii")}
+    raise TypeError(f"Cannot spill a {type(value).__name__} artifact")
+
+
+def _json_object(obj):
+    return base64.b64decode(obj[BYTES_TAG]) if len(obj) == 1 and BYTES_TAG in obj else obj
+
+
+def encode_artifact(value):
+    """Spill-file form of an artifact: JSON with bytes as base64"""
+    return json.dumps(value, default=_json_default, separators=(",", ":")).encode("utf-8")
+
+
+def decode_artifact(blob):
+    return json.loads(blob, object_hook=_json_object)
+
+
+class ArtifactCache:
+    """In-memory LRU with a byte budget and an optional SQLite spill tier"""
+
+    def __init__(self, memory_bytes=DEFAULT_MEMORY_BYTES, spill_path=DEFAULT_SPILL_PATH,
+                 disk_bytes=DEFAULT_DISK_BYTES):
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes if spill_path else 0
+        self.spill_path = spill_path if self.disk_bytes else None
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._flights = SingleFlight()
+        self._local = threading.local()
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "spills": 0}
+        if self.spill_path:
+            if os.path.dirname(self.spill_path):
+                os.makedirs(os.path.dirname(self.spill_path), exist_ok=True)
+            self._conn().execute(
+                "CREATE TABLE IF NOT EXISTS artifacts ("
+                " key TEXT PRIMARY KEY,"
+                " value BLOB NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            self._conn().execute("CREATE INDEX IF NOT EXISTS artifacts_last_access ON artifacts (last_access)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.spill_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def get(self, key):
+        """Cached artifact or None, checking memory first and then the spill file"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return entry[0]
+        if self.spill_path:
+            conn = self._conn()
+            row = conn.execute("SELECT value FROM artifacts WHERE key = ?", (key,)).fetchone()
+            value = None
+            if row is not None:
+                try:
+                    value = decode_artifact(row[0])
+                except ValueError:
+                    # Unreadable (e.g. written by an older version): rebuild it
+                    conn.execute("DELETE FROM artifacts WHERE key = ?", (key,))
+            if value is not None:
+                conn.execute("UPDATE artifacts SET last_access = ? WHERE key = ?", (time.time(), key))
+                self._count("disk_hits")
+                # Already on disk, so evicting it again only needs to confirm the row is still there
+                self._store(key, value, on_disk=True)
+                return value
+        self._count("misses")
+        return None
+
+    def put(self, key, value):
+        self._store(key, value, on_disk=False)
+
+    def _store(self, key, value, on_disk):
+        size = artifact_size(value)
+        if size > self.memory_bytes:
+            self._spill([(key, value, size, on_disk)])
+            return
+        evicted = []
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= previous[1]
+            self._entries[key] = (value, size, on_disk)
+            self._size += size
+            while self._size > self.memory_bytes and len(self._entries) > 1:
+                old_key, (old_value, old_size, old_on_disk) = self._entries.popitem(last=False)
+                self._size -= old_size
+                self.counters["evictions"] += 1
+                evicted.append((old_key, old_value, old_size, old_on_disk))
+        self._spill(evicted)
+
+    def _spill(self, items):
+        """Write evicted artifacts to the SQLite tier, trimming it to its budget.
+
+        Artifacts loaded from disk are only rewritten when the tier (in any
+        process) has trimmed them since.
+        """
+        if not self.spill_path or not items:
+            return
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            written = 0
+            for key, value, size, on_disk in items:
+                if on_disk and conn.execute(
+                    "UPDATE artifacts SET last_access = ? WHERE key = ?", (now, key)
+                ).rowcount:
+                    continue
+                conn.execute(
+                    "INSERT OR REPLACE INTO artifacts (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                    (key, encode_artifact(value), size, now)
+                )
+                written += 1
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts").fetchone()[0]
+            if total > self.disk_bytes:
+                for old_key, old_size in conn.execute(
+                    "SELECT key, size FROM artifacts ORDER BY last_access"
+                ).fetchall():
+                    if total <= self.disk_bytes:
+                        break
+                    conn.execute("DELETE FROM artifacts WHERE key = ?", (old_key,))
+                    total -= old_size
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._count("spills", written)
+
+    def get_or_create(self, key, create):
+        """Return the cached artifact, running create() once even under concurrent misses"""
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        def build():
+            value = create()
+            self.put(key, value)
+            return value
+        return self._flights.do(key, build)
+
+    def parts(self, resume_digest, load_bytes, mode=EXTRACTION_TEXT, raster=None, parallel=True):
+        """Gemini parts plus page metadata for one resume and extraction variant.
+
+        ``load_bytes`` is only called on a miss, so hits never copy the upload.
+        ``parallel=False`` keeps page rendering off the shared process pool.
+        """
+        def create():
+            parts = pdf_bytes_to_parts(load_bytes(), mode=mode, raster=raster, parallel=parallel)
+            return {
+                "parts": parts,
+                "metadata": {
+                    "text_parts": sum(1 for part in parts if "text" in part),
+                    "image_parts": sum(1 for part in parts if "data" in part),
+                    "payload_bytes": parts_payload_bytes(parts),
+                    "created_at": time.time(),
+                },
+            }
+        return self.get_or_create(f"{resume_digest}:parts:{extraction_variant(mode, raster)}", create)
+
+    def text(self, resume_digest, load_bytes):
+        """Text layer of a resume (independent of rasterization settings)"""
+        return self.get_or_create(f"{resume_digest}:text", lambda: extract_resume_text(load_bytes()))
+
+    def sections(self, resume_digest, load_bytes):
+        """Section segmentation of every page of a resume (see resume_sections)"""
+        return self.get_or_create(f"{resume_digest}:sections:v{SEGMENTER_VERSION}", lambda: segment_resume(load_bytes()))
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                **self.counters,
+                "entries": len(self._entries),
+                "memory_mb": round(self._size / (1024 * 1024), 2),
+                "memory_budget_mb": round(self.memory_bytes / (1024 * 1024), 2),
+            }
+        if self.spill_path:
+            count, total = self._conn().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM artifacts"
+            ).fetchone()
+            stats.update({"disk_entries": count, "disk_mb": round(total / (1024 * 1024), 2),
+                          "disk_budget_mb": round(self.disk_bytes / (1024 * 1024), 2)})
+        return stats
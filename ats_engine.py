@@ -0,0 +1,551 @@
+"""Core resume analysis pipeline shared by the Streamlit app and batch tools.
+
+Nothing in here imports Streamlit, so it can be used from scripts, worker
+processes and services. Errors are raised to the caller, which decides how
+to surface them (``st.error`` in the app, a result row in batch runs).
+"""
+import hashlib
+import os
+import re
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+from analysis_cache import make_key
+from instrumentation import add_stage_time, record_cache, record_plan, record_usage, stage
+from jd_context import get_prompt_context, invalidate_context, record_context_use
+from llm_backends import MODEL_NAME, get_backend
+from rate_limit import (
+    GEMINI_BREAKER,
+    GEMINI_FLIGHTS,
+    GEMINI_LIMITER,
+    backoff_delay,
+    call_with_retries,
+    call_with_retries_async,
+    estimate_tokens,
+    is_retryable,
+    record_upstream_failure,
+    retry_after,
+    upstream_answered,
+)
+from request_planner import MODEL_STATS, plan_request, plan_summary
+from resume_sections import select_sections, sections_variant
+from structured_output import parse_structured_response, schema_variant
+
+# Bounds rendering work per resume; request_planner enforces the token budget
+MAX_PAGES = 3
+
+# How Gemini errors refer to an explicit context cache ("cachedContents/...", "CachedContent not found")
+CACHED_CONTENT_PATTERN = re.compile(r"cached.?content", re.IGNORECASE)
+
+# Follows the resume parts, since the job description and prompt come first
+RESUME_SUFFIX = "Evaluate the resume above against the job description and instructions given before it."
+
+# Resume extraction modes: send the text layer (rasterizing only scanned
+# pages) or rasterize every page as before
+EXTRACTION_TEXT = "text"
+EXTRACTION_IMAGE = "image"
+EXTRACTION_MODES = (EXTRACTION_TEXT, EXTRACTION_IMAGE)
+# Pages with fewer alphanumeric characters than this are treated as scanned
+MIN_PAGE_TEXT_CHARS = 40
+# Send text-mode analyses only the resume sections their option lists
+SECTION_FILTER = os.getenv("ATS_SECTION_FILTER", "1") != "0"
+
+# Page rasterization defaults. Higher DPI / quality improves OCR of scanned
+# resumes at the cost of payload size; max_dimension caps the longest side.
+DEFAULT_RASTER = {
+    "dpi": 96,
+    "grayscale": False,
+    "jpeg_quality": 85,
+    "max_dimension": 1600,
+}
+# Documents with at least this many pages to rasterize are rendered in parallel
+PARALLEL_PAGE_THRESHOLD = 4
+PAGE_RENDER_WORKERS = 4
+
+
+def resume_hash(pdf_bytes):
+    """Content hash identifying a resume independent of its file name"""
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+
+def iter_resume_sources(path):
+    """Yield (name, pdf_bytes) for every PDF in a directory or zip archive"""
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and info.filename.lower().endswith(".pdf"):
+                    yield info.filename, archive.read(info)
+    elif os.path.isdir(path):
+        for root, _, files in os.walk(path):
+            for name in sorted(files):
+                if name.lower().endswith(".pdf"):
+                    full_path = os.path.join(root, name)
+                    with open(full_path, "rb") as f:
+                        yield os.path.relpath(full_path, path), f.read()
+    else:
+        raise ValueError(f"Not a directory or zip archive: {path}")
+
+
+def read_resume_source(path, name):
+    """Read one resume yielded by iter_resume_sources(path) back by name"""
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            return archive.read(name)
+    with open(os.path.join(path, name), "rb") as f:
+        return f.read()
+
+
+def raster_settings(dpi=None, grayscale=None, jpeg_quality=None, max_dimension=None):
+    """Rasterization settings with defaults filled in"""
+    settings = dict(DEFAULT_RASTER)
+    for key, value in (("dpi", dpi), ("grayscale", grayscale), ("jpeg_quality", jpeg_quality),
+                       ("max_dimension", max_dimension)):
+        if value is not None:
+            settings[key] = value
+    return settings
+
+
+def extraction_variant(mode, raster=None):
+    """Cache-key suffix describing how a resume was turned into parts"""
+    if mode == EXTRACTION_TEXT and raster is None:
+        return mode
+    raster = raster or DEFAULT_RASTER
+    return (f"{mode}:{raster['dpi']}dpi:{'gray' if raster['grayscale'] else 'rgb'}"
+            f":q{raster['jpeg_quality']}:{raster['max_dimension']}px")
+
+
+def _render_page_image(page, raster=None):
+    """Rasterize a single page into a raw-bytes JPEG Gemini part"""
+    import fitz  # PyMuPDF is imported on first use so the app paints before loading it
+    raster = raster or DEFAULT_RASTER
+    zoom = raster["dpi"] / 72
+    longest = max(page.rect.width, page.rect.height) * zoom
+    if raster["max_dimension"] and longest > raster["max_dimension"]:
+        zoom *= raster["max_dimension"] / longest
+    with stage("rasterize"):
+        pix = page.get_pixmap(
+            matrix=fitz.Matrix(zoom, zoom),
+            colorspace=fitz.csGRAY if raster["grayscale"] else fitz.csRGB,
+            alpha=False
+        )
+    # Raw bytes avoid the base64 copy and its 33% size overhead
+    with stage("encode"):
+        data = pix.tobytes("jpeg", jpg_quality=raster["jpeg_quality"])
+    return {"mime_type": "image/jpeg", "data": data}
+
+
+def _render_pages_worker(pdf_bytes, page_nums, raster):
+    """Process-pool worker: open the PDF once and render a group of pages"""
+    import fitz
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    try:
+        return [_render_page_image(doc.load_page(page_num), raster) for page_num in page_nums]
+    finally:
+        doc.close()
+
+
+_page_pool = None
+
+
+def _get_page_pool():
+    global _page_pool
+    if _page_pool is None:
+        _page_pool = ProcessPoolExecutor(max_workers=min(PAGE_RENDER_WORKERS, os.cpu_count() or 1))
+    return _page_pool
+
+
+def _render_pages(doc, pdf_bytes, page_nums, raster, parallel):
+    """Render pages in order, fanning out to the page pool for long documents"""
+    if not parallel or len(page_nums) < PARALLEL_PAGE_THRESHOLD:
+        return [_render_page_image(doc.load_page(page_num), raster) for page_num in page_nums]
+    # Worker processes have no trace, so time the whole fan-out here
+    start = time.perf_counter()
+    pool = _get_page_pool()
+    groups = [page_nums[i::PAGE_RENDER_WORKERS] for i in range(PAGE_RENDER_WORKERS)]
+    futures = [pool.submit(_render_pages_worker, pdf_bytes, group, raster) for group in groups if group]
+    rendered = {}
+    for group, future in zip([g for g in groups if g], futures):
+        rendered.update(zip(group, future.result()))
+    add_stage_time("rasterize_parallel", time.perf_counter() - start)
+    return [rendered[page_num] for page_num in page_nums]
+
+
+def parts_payload_bytes(pdf_parts):
+    """Approximate request payload size of resume parts"""
+    return sum(len(part["data"]) if "data" in part else len(part["text"].encode("utf-8")) for part in pdf_parts)
+
+
+def extract_page_text(page):
+    """Extract the text layer of a page in reading order"""
+    blocks = page.get_text("blocks", sort=True)
+    # Block tuples are (x0, y0, x1, y1, text, block_no, block_type); type 0 is text
+    return "\n".join(block[4].strip() for block in blocks if block[6] == 0 and block[4].strip())
+
+
+def is_scanned_text(text):
+    """A page without a usable text layer has to be sent as an image"""
+    return sum(ch.isalnum() for ch in text) < MIN_PAGE_TEXT_CHARS
+
+
+def extract_resume_text(pdf_bytes):
+    """Text layer of every page joined together (empty for fully scanned resumes)"""
+    import fitz
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    try:
+        return "\n\n".join(extract_page_text(page) for page in doc)
+    finally:
+        doc.close()
+
+
+def pdf_bytes_to_parts(pdf_bytes, mode=EXTRACTION_TEXT, max_pages=MAX_PAGES, raster=None, parallel=True):
+    """Convert a PDF into Gemini parts.
+
+    In "text" mode every page's text layer is sent as a text part and only
+    scanned pages are rasterized (at most ``max_pages`` images). In "image"
+    mode the first ``max_pages`` pages are rasterized, as before. ``raster``
+    comes from raster_settings(); long documents are rendered in a process
+    pool unless ``parallel`` is False (e.g. when already inside a worker).
+    """
+    import fitz
+
+    if mode not in EXTRACTION_MODES:
+        raise ValueError(f"Unknown extraction mode: {mode}")
+
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    try:
+        if mode == EXTRACTION_IMAGE:
+            return _render_pages(doc, pdf_bytes, list(range(min(max_pages, len(doc)))), raster, parallel)
+
+        # Text pages are kept as-is, scanned pages are marked for rendering
+        pdf_parts = []
+        image_pages = []
+        for page_num in range(len(doc)):
+            with stage("text_extraction"):
+                text = extract_page_text(doc.load_page(page_num))
+            if not is_scanned_text(text):
+                pdf_parts.append({"text": f"--- Resume page {page_num + 1} ---\n{text}"})
+            elif len(image_pages) < max_pages:
+                pdf_parts.append(page_num)
+                image_pages.append(page_num)
+        images = dict(zip(image_pages, _render_pages(doc, pdf_bytes, image_pages, raster, parallel)))
+        return [images[part] if isinstance(part, int) else part for part in pdf_parts]
+    finally:
+        doc.close()
+
+
+def build_contents(input_text, pdf_content, prompt):
+    """Assemble the request contents: job description and prompt, then the resume.
+
+    The JD + prompt prefix is identical for every resume screened against a
+    job, which lets Gemini reuse it from its (implicit or explicit) cache.
+    """
+    return [
+        {"text": input_text},
+        {"text": prompt},
+        *pdf_content,
+        {"text": RESUME_SUFFIX}
+    ]
+
+
+def request_contents(input_text, pdf_content, prompt, context=None):
+    """Contents to send and the context to send them with.
+
+    When the JD + prompt prefix is cached remotely only the resume is sent;
+    otherwise the full contents go out and the context is dropped.
+    """
+    if context is not None and context.handle:
+        return [*pdf_content, {"text": RESUME_SUFFIX}], context
+    return build_contents(input_text, pdf_content, prompt), None
+
+
+def _context_rejected(context, error):
+    """Whether a cached prefix was refused (expired, deleted), so the full request should be sent.
+
+    Only errors that name the cached content count; blocked responses and
+    other bad requests keep the context for the next resume.
+    """
+    if context is None:
+        return False
+    from google.api_core import exceptions as google_exceptions
+    if not isinstance(error, (google_exceptions.NotFound, google_exceptions.InvalidArgument,
+                              google_exceptions.PermissionDenied)):
+        return False
+    if CACHED_CONTENT_PATTERN.search(str(error)) is None:
+        return False
+    invalidate_context(context)
+    return True
+
+
+def plan_allows_context(plan):
+    """Whether a planned request can use the shared JD + prompt prefix.
+
+    The prefix holds the full JD and is cached for the default model only,
+    so requests with a trimmed JD or routed to another model send it all.
+    """
+    return plan["model"] == MODEL_NAME and "job_description" not in plan["trimmed"]
+
+
+def _refund_estimate(estimated, response, model=None, request_tokens=None):
+    """Record real token usage and return over-estimated tokens to the limiter.
+
+    ``request_tokens`` is the estimate for the full request, which is what
+    Gemini counts even when part of it came from a cached prefix; it is
+    compared with the actual count to calibrate the request planner.
+    """
+    request_tokens = request_tokens or estimated
+    record_usage(response, estimated=request_tokens)
+    usage = getattr(response, "usage_metadata", None)
+    actual = getattr(usage, "prompt_token_count", 0) or 0
+    if actual and actual < estimated:
+        GEMINI_LIMITER.refund(estimated - actual)
+    MODEL_STATS.observe_tokens(model or MODEL_NAME, request_tokens, actual)
+
+
+def generate_analysis(input_text, pdf_content, prompt, max_retries=3, request_key=None, response_schema=None,
+                      context=None, model=None):
+    """Call Gemini with rate limiting and backoff, raising the last error if all attempts fail.
+
+    Concurrent calls with the same ``request_key`` (the analysis cache key)
+    share one upstream request. ``context`` is the job's shared
+    ``jd_context.PromptContext``; ``model`` overrides the backend's default.
+    """
+    request_tokens = estimate_tokens(build_contents(input_text, pdf_content, prompt))
+    contents, context = request_contents(input_text, pdf_content, prompt, context)
+    tokens = estimate_tokens(contents)
+
+    def attempt():
+        nonlocal contents, context
+        try:
+            response = get_backend().generate(contents, response_schema, context=context, model=model)
+        except Exception as e:
+            if not _context_rejected(context, e):
+                raise
+            contents, context = build_contents(input_text, pdf_content, prompt), None
+            response = get_backend().generate(contents, response_schema, model=model)
+        record_context_use(context)
+        _refund_estimate(tokens, response, model, request_tokens)
+        return response.text
+
+    def call():
+        return call_with_retries(attempt, tokens, max_retries)
+
+    if request_key is None:
+        return call()
+    return GEMINI_FLIGHTS.do(request_key, call)
+
+
+def stream_analysis(input_text, pdf_content, prompt, max_retries=3, request_key=None, response_schema=None,
+                    context=None, model=None):
+    """Yield response text chunks as Gemini generates them.
+
+    Retries only happen before the first chunk is yielded, so callers never
+    see duplicated text. If an identical request is already streaming, the
+    finished text is yielded as a single chunk instead of calling Gemini.
+    """
+    request_tokens = estimate_tokens(build_contents(input_text, pdf_content, prompt))
+    contents, context = request_contents(input_text, pdf_content, prompt, context)
+    tokens = estimate_tokens(contents)
+    leader = True
+    if request_key is not None:
+        leader, call = GEMINI_FLIGHTS.begin(request_key)
+        if not leader:
+            yield GEMINI_FLIGHTS.wait(call)
+            return
+
+    chunks = []
+    error = None
+    probe = None
+    attempt = 0
+    try:
+        while True:
+            probe = GEMINI_BREAKER.before_call()
+            add_stage_time("gemini_queue", GEMINI_LIMITER.acquire(tokens))
+            try:
+                response = get_backend().stream(contents, response_schema, context=context, model=model)
+                for chunk in response:
+                    if chunk.text:
+                        chunks.append(chunk.text)
+                        yield chunk.text
+            except Exception as e:
+                if not is_retryable(e):
+                    if upstream_answered(e):
+                        # The API answered, so upstream is healthy even if the request was bad
+                        GEMINI_BREAKER.record_success()
+                    else:
+                        GEMINI_BREAKER.release_probe(probe)
+                    if chunks or not _context_rejected(context, e):
+                        raise
+                    # Resending without the rejected prefix does not use up an attempt (it happens once)
+                    contents, context = build_contents(input_text, pdf_content, prompt), None
+                    continue
+                record_upstream_failure(e)
+                if chunks or attempt >= max_retries - 1:
+                    raise
+                delay = backoff_delay(attempt, retry_after(e))
+                add_stage_time("gemini_backoff", delay)
+                time.sleep(delay)
+                attempt += 1
+            else:
+                GEMINI_BREAKER.record_success()
+                record_context_use(context)
+                _refund_estimate(tokens, response, model, request_tokens)
+                return
+    except BaseException as e:
+        error = e if isinstance(e, Exception) else RuntimeError("Streaming request was cancelled")
+        raise
+    finally:
+        # A probe closed mid-stream (e.g. by a Streamlit rerun) records no outcome
+        GEMINI_BREAKER.release_probe(probe)
+        if request_key is not None and leader:
+            GEMINI_FLIGHTS.finish(request_key, result="".join(chunks) if error is None else None, error=error)
+
+
+async def generate_analysis_async(input_text, pdf_content, prompt, max_retries=3, request_key=None,
+                                  response_schema=None, context=None, model=None):
+    """Async variant of generate_analysis for concurrent batch runs"""
+    request_tokens = estimate_tokens(build_contents(input_text, pdf_content, prompt))
+    contents, context = request_contents(input_text, pdf_content, prompt, context)
+    tokens = estimate_tokens(contents)
+
+    async def attempt():
+        nonlocal contents, context
+        try:
+            response = await get_backend().generate_async(contents, response_schema, context=context, model=model)
+        except Exception as e:
+            if not _context_rejected(context, e):
+                raise
+            contents, context = build_contents(input_text, pdf_content, prompt), None
+            response = await get_backend().generate_async(contents, response_schema, model=model)
+        record_context_use(context)
+        _refund_estimate(tokens, response, model, request_tokens)
+        return response.text
+
+    async def call():
+        return await call_with_retries_async(attempt, tokens, max_retries)
+
+    if request_key is None:
+        return await call()
+    return await GEMINI_FLIGHTS.do_async(request_key, call)
+
+
+def analysis_sections(option, mode=EXTRACTION_TEXT):
+    """Resume sections an analysis option sends, or None for the whole resume.
+
+    Only text extraction is segmented; page images always carry every section.
+    """
+    if mode != EXTRACTION_TEXT or not SECTION_FILTER:
+        return None
+    return option.get("sections")
+
+
+def analysis_key_variant(variant, response_schema=None, sections=None):
+    """Cache-key variant covering the extraction settings, response schema and sent sections"""
+    return schema_variant(sections_variant(variant, sections), response_schema)
+
+
+def find_cached_analysis(cache, input_text, prompt, resume_digest, variant="", response_schema=None,
+                         near_duplicates=(), sections=None):
+    """Cached response for this resume, else for the most similar near-duplicate.
+
+    ``near_duplicates`` is [(resume_hash, similarity)] from
+    ``near_duplicates.SignatureIndex.query``, most similar first; pass every
+    match (``limit=None``) so the closest one with a cached result wins.
+    Returns (response, match), where match is None for an exact hit and
+    (None, None) on a miss. Keys are only peeked at, so existence checks
+    do not skew the hit rate; ``fetch_analysis`` counts each request once.
+    """
+    model_id = get_backend().model_id
+    key_variant = analysis_key_variant(variant, response_schema, sections)
+    cached = cache.peek(make_key(resume_digest, input_text, prompt, model_id, key_variant))
+    if cached is not None:
+        return cached, None
+    for duplicate in near_duplicates:
+        cached = cache.peek(make_key(duplicate[0], input_text, prompt, model_id, key_variant))
+        if cached is not None:
+            return cached, duplicate
+    return None, None
+
+
+def fetch_analysis(cache, input_text, pdf_content, prompt, resume_digest, variant="", max_retries=3,
+                   on_chunk=None, response_schema=None, near_duplicates=(), analysis_type=None, sections=None,
+                   segmentation=None, count_lookup=True, context_cache=False):
+    """Cache-first Gemini call, streaming chunks to on_chunk when given.
+
+    Used by the app's worker threads and the API server's job workers.
+    The result of a near-duplicate resume (same JD and prompt) is reused
+    when this one has none. On a miss only the ``sections`` of the
+    resume's ``segmentation`` are sent (see ``analysis_sections``), then
+    the request is fitted to the token budget and routed to a model by
+    ``request_planner.plan_request``; the cache key stays that of the
+    untrimmed request, so results are shared whichever model answered.
+    Returns (response, timing) and raises on API errors. Speculative calls
+    pass ``count_lookup=False`` to stay out of the cache hit rate. Only
+    callers that pass ``context_cache=True`` create paid remote caches of
+    the JD + prompt prefix.
+    """
+    start = time.perf_counter()
+    key_variant = analysis_key_variant(variant, response_schema, sections)
+    cache_key = make_key(resume_digest, input_text, prompt, get_backend().model_id, key_variant)
+    cached, duplicate = find_cached_analysis(
+        cache, input_text, prompt, resume_digest, variant, response_schema, near_duplicates, sections
+    )
+    record_cache(cached is not None)
+    if count_lookup:
+        cache.record_lookup(cached is not None, cache_key if duplicate is None else None)
+    if cached is not None:
+        elapsed = time.perf_counter() - start
+        add_stage_time("cache_lookup", elapsed)
+        timing = {"cached": True, "ttft_seconds": elapsed, "total_seconds": elapsed}
+        if duplicate is not None:
+            timing.update({"near_duplicate_of": duplicate[0], "similarity": round(duplicate[1], 3)})
+        return cached, timing
+    ttft = None
+    sent_parts = select_sections(pdf_content, segmentation, sections)
+    # None when the whole resume is sent (no sections listed, or no usable segmentation)
+    sent_sections = list(sections) if sent_parts is not pdf_content else None
+    with stage("plan"):
+        plan = plan_request(input_text, sent_parts, prompt, analysis_type)
+    record_plan(plan_summary(plan))
+    model = plan["model"]
+    input_text, pdf_content = plan["input_text"], plan["pdf_content"]
+    # Shared across sessions, so every resume screened against this JD reuses the prefix
+    context = None
+    if plan_allows_context(plan):
+        context = get_prompt_context(input_text, prompt, response_schema, remote=context_cache)
+    if on_chunk is None:
+        response = generate_analysis(
+            input_text, pdf_content, prompt, max_retries=max_retries, request_key=cache_key,
+            response_schema=response_schema, context=context, model=model
+        )
+    else:
+        chunks = []
+        for chunk in stream_analysis(
+            input_text, pdf_content, prompt, max_retries=max_retries, request_key=cache_key,
+            response_schema=response_schema, context=context, model=model
+        ):
+            if ttft is None:
+                ttft = time.perf_counter() - start
+            chunks.append(chunk)
+            on_chunk(chunk)
+        response = "".join(chunks)
+    total = time.perf_counter() - start
+    add_stage_time("gemini_ttft", ttft if ttft is not None else total)
+    add_stage_time("gemini_total", total)
+    MODEL_STATS.observe_latency(model, plan["predicted_tokens"], total)
+    if response:
+        cache.set(cache_key, response)
+    return response, {
+        "cached": False,
+        "ttft_seconds": ttft if ttft is not None else total,
+        "total_seconds": total,
+        "model": model,
+        "estimated_tokens": plan["estimated_tokens"],
+        "trimmed": plan["trimmed"],
+        "sections": sent_sections,
+    }
+
+
+def extract_structured_data(response_text):
+    """Extract validated structured data from an AI response, repairing malformed JSON"""
+    return parse_structured_response(response_text)
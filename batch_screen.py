@@ -0,0 +1,356 @@
+"""Headless batch screening: score a folder or zip of resumes against one job description.
+
+Usage:
+    python batch_screen.py resumes/ --jd job.txt --out results.jsonl
+    python batch_screen.py resumes.zip --jd job.txt --analysis "Quick Scan" --out results.csv
+    python batch_screen.py --index resume_index --top-k 50 --jd job.txt
+
+PDF preprocessing runs in a process pool, Gemini calls run with bounded
+asyncio concurrency, and each result is written as soon as it finishes.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+from analysis_cache import AnalysisCache, make_key
+from analysis_prompts import ANALYSIS_OPTIONS, get_analysis_option
+from ats_engine import (
+    EXTRACTION_MODES,
+    EXTRACTION_TEXT,
+    DEFAULT_RASTER,
+    analysis_key_variant,
+    analysis_sections,
+    extract_resume_text,
+    extract_structured_data,
+    extraction_variant,
+    generate_analysis_async,
+    iter_resume_sources,
+    pdf_bytes_to_parts,
+    plan_allows_context,
+    raster_settings,
+    resume_hash,
+)
+from instrumentation import (
+    METRICS_FILE,
+    add_stage_time,
+    finish_trace,
+    flush_metrics_file,
+    record_cache,
+    record_plan,
+    stage,
+    start_trace,
+)
+from jd_context import context_stats, get_jd_profile, get_prompt_context, score_with_profile
+from llm_backends import BACKENDS, DEFAULT_BACKEND, configure_backend, get_backend
+from rate_limit import flow_stats
+from request_planner import MODEL_STATS, plan_request, plan_summary
+from results_dataset import ResultsDataset, result_row
+from resume_sections import scoring_text, segment_resume, select_sections
+from structured_output import PARSE_STATS
+
+DEFAULT_CONCURRENCY = 8
+RESULT_FIELDS = [
+    "file", "analysis_type", "status", "keyword_score", "meets_years", "meets_education", "match_percentage",
+    "ats_score", "missing_keywords", "strengths", "cached", "model", "trimmed", "preprocess_seconds", "llm_seconds", "error",
+    "response",
+]
+
+
+def _timed_preprocess(pdf_bytes, mode=EXTRACTION_TEXT, raster=None):
+    """Process-pool worker: convert a PDF to parts, text and sections and report how long it took"""
+    start = time.perf_counter()
+    # Already running in a worker process, so pages are rendered serially
+    parts = pdf_bytes_to_parts(pdf_bytes, mode=mode, raster=raster, parallel=False)
+    text = extract_resume_text(pdf_bytes)
+    segmentation = segment_resume(pdf_bytes)
+    return parts, text, segmentation, time.perf_counter() - start
+
+
+class ResultWriter:
+    """Append results to a JSONL or CSV file, flushing after every row"""
+
+    def __init__(self, path):
+        self.path = path
+        self.is_csv = path.lower().endswith(".csv")
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        self._csv = None
+        if self.is_csv:
+            self._csv = csv.DictWriter(self._file, fieldnames=RESULT_FIELDS, extrasaction="ignore")
+            self._csv.writeheader()
+
+    def write(self, result):
+        if self.is_csv:
+            row = dict(result)
+            row["missing_keywords"] = "; ".join(result.get("missing_keywords") or [])
+            row["strengths"] = "; ".join(result.get("strengths") or [])
+            self._csv.writerow(row)
+        else:
+            self._file.write(json.dumps(result, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+async def _analyze_one(name, parts, preprocess_seconds, jd_text, option, semaphore,
+                       cache=None, cache_key=None, context=None):
+    result = {
+        "file": name,
+        "analysis_type": option["title"],
+        "status": "ok",
+        "preprocess_seconds": round(preprocess_seconds, 3),
+    }
+    # Each task runs in its own context, so traces never mix between resumes
+    trace = start_trace(option["title"], file=name, source="batch")
+    trace.add("preprocess", preprocess_seconds)
+    start = time.perf_counter()
+    try:
+        # SQLite and spool-file calls go through asyncio.to_thread so they never stall other resumes
+        response = await asyncio.to_thread(cache.get, cache_key) if cache is not None else None
+        result["cached"] = response is not None
+        record_cache(result["cached"])
+        if response is None:
+            with stage("plan"):
+                plan = plan_request(jd_text, parts, option["prompt"], option["title"])
+            record_plan(plan_summary(plan))
+            result["model"] = plan["model"]
+            result["trimmed"] = ", ".join(plan["trimmed"])
+            if not plan_allows_context(plan):
+                context = None
+            async with semaphore:
+                llm_start = time.perf_counter()
+                response = await generate_analysis_async(
+                    plan["input_text"], plan["pdf_content"], option["prompt"], request_key=cache_key,
+                    response_schema=option.get("response_schema"), context=context, model=plan["model"]
+                )
+                llm_seconds = time.perf_counter() - llm_start
+                add_stage_time("gemini_total", llm_seconds)
+                MODEL_STATS.observe_latency(plan["model"], plan["predicted_tokens"], llm_seconds)
+            if cache is not None and response:
+                await asyncio.to_thread(cache.set, cache_key, response)
+        result["response"] = response
+        # Free-text analyses have nothing to parse and would only count as parse failures
+        structured = {}
+        if option.get("response_schema") is not None:
+            with stage("json_parse"):
+                structured = extract_structured_data(response) or {}
+        result["match_percentage"] = structured.get("match_percentage")
+        result["ats_score"] = structured.get("ats_score")
+        result["missing_keywords"] = structured.get("missing_keywords")
+        result["strengths"] = structured.get("strengths")
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = str(e)
+    result["llm_seconds"] = round(time.perf_counter() - start, 3)
+    finish_trace(trace, result.get("error"))
+    return result
+
+
+async def screen_resumes(sources, jd_text, analysis_types=("Detailed Analysis",),
+                         concurrency=DEFAULT_CONCURRENCY, workers=None, on_result=None,
+                         extraction_mode=EXTRACTION_TEXT, cache=None, min_keyword_score=None,
+                         raster=None, context_cache=False, results_dataset=None):
+    """Screen resumes against a job description, calling on_result as each finishes.
+
+    ``sources`` is an iterable of (name, pdf_bytes). Pass an AnalysisCache to
+    reuse results from earlier runs. Resumes whose local keyword score is
+    below ``min_keyword_score`` are reported as "filtered" without calling
+    Gemini. The JD profile and each prompt's JD + prompt prefix are built
+    once; ``context_cache`` allows caching that prefix on the Gemini side.
+    Successful analyses are also appended to ``results_dataset`` when given.
+    Returns summary stats.
+    """
+    options = [get_analysis_option(title) for title in analysis_types]
+    semaphore = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+    profile = get_jd_profile(jd_text)
+    # Creating a remote context is a network call, so keep it off the event loop
+    contexts = {
+        option["title"]: await loop.run_in_executor(
+            None, get_prompt_context, jd_text, option["prompt"], option.get("response_schema"), context_cache
+        )
+        for option in options
+    }
+    variant = extraction_variant(extraction_mode, raster)
+    stats = {"resumes": 0, "results": 0, "errors": 0, "filtered": 0}
+    started = time.perf_counter()
+
+    async def process(name, pdf_bytes, executor):
+        try:
+            parts, resume_text, segmentation, preprocess_seconds = await loop.run_in_executor(
+                executor, _timed_preprocess, pdf_bytes, extraction_mode, raster
+            )
+        except Exception as e:
+            results = [{"file": name, "analysis_type": option["title"], "status": "error",
+                        "error": f"PDF processing failed: {e}"} for option in options]
+        else:
+            # Scanned resumes have no text layer, so they are never filtered out
+            prescore = score_with_profile(profile, scoring_text(segmentation, resume_text)) if resume_text.strip() else {}
+            keyword_score = prescore.get("match_percentage")
+            if min_keyword_score is not None and keyword_score is not None and keyword_score < min_keyword_score:
+                results = [{"file": name, "analysis_type": option["title"], "status": "filtered",
+                            "keyword_score": keyword_score,
+                            "missing_keywords": prescore["missing_keywords"]} for option in options]
+            else:
+                digest = resume_hash(pdf_bytes)
+                sections = {option["title"]: analysis_sections(option, extraction_mode) for option in options}
+                results = await asyncio.gather(*[
+                    _analyze_one(
+                        name, select_sections(parts, segmentation, sections[option["title"]]), preprocess_seconds,
+                        jd_text, option, semaphore, cache,
+                        make_key(digest, jd_text, option["prompt"], get_backend().model_id,
+                                 analysis_key_variant(variant, option.get("response_schema"), sections[option["title"]])),
+                        contexts[option["title"]]
+                    )
+                    for option in options
+                ])
+                for result in results:
+                    result["keyword_score"] = keyword_score
+                    result["meets_years"] = prescore.get("meets_years")
+                    result["meets_education"] = prescore.get("meets_education")
+                    if results_dataset is not None and result["status"] == "ok":
+                        await asyncio.to_thread(results_dataset.append, result_row(
+                            result["analysis_type"], result,
+                            {"cached": result["cached"], "total_seconds": result["llm_seconds"],
+                             "model": result.get("model")},
+                            resume_hash=digest, input_text=jd_text, source="batch", resume_name=name,
+                            keyword_score=keyword_score
+                        ))
+        stats["resumes"] += 1
+        for result in results:
+            stats["results"] += 1
+            if result["status"] == "error":
+                stats["errors"] += 1
+            elif result["status"] == "filtered":
+                stats["filtered"] += 1
+            if on_result is not None:
+                on_result(result)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Keep a bounded window of resumes in flight so large folders are not
+        # all read into memory up front.
+        pending = set()
+        for name, pdf_bytes in sources:
+            pending.add(asyncio.ensure_future(process(name, pdf_bytes, executor)))
+            if len(pending) >= concurrency * 2:
+                _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        if pending:
+            await asyncio.gather(*pending)
+
+    elapsed = time.perf_counter() - started
+    stats["elapsed_seconds"] = round(elapsed, 2)
+    stats["resumes_per_minute"] = round(stats["resumes"] / elapsed * 60, 2) if elapsed else 0.0
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a folder or zip of PDF resumes against a job description")
+    parser.add_argument("resumes", nargs="?", help="Directory or .zip archive containing PDF resumes")
+    parser.add_argument("--jd", required=True, help="Path to a text file with the job description")
+    parser.add_argument("--index", help="Screen the top-k candidates from a resume index instead of a folder")
+    parser.add_argument("--top-k", type=int, default=50, help="Shortlist size when using --index")
+    parser.add_argument(
+        "--analysis", action="append", choices=[option["title"] for option in ANALYSIS_OPTIONS],
+        help="Analysis type to run (repeatable, default: Detailed Analysis)"
+    )
+    parser.add_argument("--out", default=f"screening_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl",
+                        help="Output file (.jsonl or .csv)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="Maximum concurrent Gemini requests")
+    parser.add_argument("--workers", type=int, default=None, help="PDF preprocessing processes")
+    parser.add_argument("--extraction", choices=EXTRACTION_MODES, default=EXTRACTION_TEXT,
+                        help="Send the text layer (default) or rasterized page images")
+    parser.add_argument("--dpi", type=int, default=DEFAULT_RASTER["dpi"], help="Rasterization DPI")
+    parser.add_argument("--grayscale", action="store_true", help="Render page images in grayscale")
+    parser.add_argument("--jpeg-quality", type=int, default=DEFAULT_RASTER["jpeg_quality"],
+                        help="JPEG quality for page images")
+    parser.add_argument("--max-dimension", type=int, default=DEFAULT_RASTER["max_dimension"],
+                        help="Cap on the longest side of page images in pixels")
+    parser.add_argument("--no-cache", action="store_true", help="Always call Gemini, ignoring cached results")
+    parser.add_argument("--min-keyword-score", type=int, default=None,
+                        help="Skip Gemini for resumes whose local keyword match is below this percentage")
+    parser.add_argument("--backend", choices=BACKENDS, default=DEFAULT_BACKEND,
+                        help="LLM backend: gemini, stub (offline), record or replay")
+    parser.add_argument("--no-context-cache", action="store_true",
+                        help="Send the full job description + prompt with every request instead of caching it on Gemini")
+    parser.add_argument("--no-dataset", action="store_true",
+                        help="Do not append results to the analytics dataset (ATS_RESULTS_PATH)")
+    args = parser.parse_args(argv)
+    if not args.resumes and not args.index:
+        parser.error("either a resumes directory/zip or --index is required")
+
+    load_dotenv()
+    configure_backend(args.backend)
+
+    with open(args.jd, encoding="utf-8") as f:
+        jd_text = f.read()
+
+    if args.index:
+        from resume_index import ResumeIndex
+
+        index = ResumeIndex(args.index)
+        hits = index.query(jd_text, k=args.top_k)
+        print(f"🔍 Shortlisted {len(hits)} of {len(index)} indexed resumes", flush=True)
+        sources = index.iter_sources(hits)
+    else:
+        sources = iter_resume_sources(args.resumes)
+
+    writer = ResultWriter(args.out)
+    results_dataset = None if args.no_dataset else ResultsDataset()
+
+    def on_result(result):
+        writer.write(result)
+        status = {"ok": "✅", "filtered": "⏭️"}.get(result["status"], "❌")
+        print(f"{status} {result['file']} ({result['analysis_type']})", flush=True)
+
+    try:
+        stats = asyncio.run(screen_resumes(
+            sources,
+            jd_text,
+            analysis_types=args.analysis or ["Detailed Analysis"],
+            concurrency=args.concurrency,
+            workers=args.workers,
+            on_result=on_result,
+            extraction_mode=args.extraction,
+            cache=None if args.no_cache else AnalysisCache(),
+            min_keyword_score=args.min_keyword_score,
+            raster=raster_settings(args.dpi, args.grayscale, args.jpeg_quality, args.max_dimension),
+            context_cache=not args.no_context_cache,
+            results_dataset=results_dataset,
+        ))
+    finally:
+        writer.close()
+        if results_dataset is not None:
+            results_dataset.flush()
+
+    print(
+        f"\n📊 Screened {stats['resumes']} resumes ({stats['results']} analyses, "
+        f"{stats['errors']} errors, {stats['filtered']} filtered) in {stats['elapsed_seconds']}s — "
+        f"{stats['resumes_per_minute']} resumes/minute"
+    )
+    limiter = flow_stats()["limiter"]
+    print(f"⏳ Rate limiter: {limiter['waited']} of {limiter['acquired']} requests waited "
+          f"(avg {limiter['avg_wait_seconds']}s, max {limiter['max_wait_seconds']}s)")
+    print(f"🧩 JSON parsing: {PARSE_STATS['parsed']} parsed, {PARSE_STATS['repaired']} repaired, "
+          f"{PARSE_STATS['failed']} failed")
+    contexts = context_stats()
+    print(f"🗂️ Prompt prefix cache: {contexts['remote_requests']} requests reused a cached prefix "
+          f"(~{contexts['prefix_tokens_saved']} input tokens saved, {contexts['remote_failed']} caches unavailable)")
+    ratios = MODEL_STATS.snapshot()["token_ratio"]
+    if ratios:
+        print("🎯 Input tokens actual/estimated: " + ", ".join(f"{model} {ratio}" for model, ratio in ratios.items()))
+    print(f"💾 Results written to {args.out}")
+    flush_metrics_file()
+    print(f"📈 Metrics written to {METRICS_FILE}")
+    return 0 if stats["errors"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,296 @@
+"""Reproducible pipeline benchmark on a synthetic resume corpus, fully offline.
+
+Generates seeded resumes (1-10 pages, text and scanned variants), then
+times preprocessing, the Gemini call (against the local stub server with
+configurable latency and error injection) and structured parsing.
+Reports p50/p95/p99 latency, throughput, peak RSS and payload bytes as
+JSON so two runs can be compared.
+
+Usage:
+    python benchmark.py --out bench.json
+    python benchmark.py --pages 1 5 10 --samples 20 --latency 0.5 --error-rate 0.05
+    python benchmark.py --out bench_new.json --compare bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# Benchmarks measure the pipeline, not our own quota; set before rate_limit is imported
+os.environ.setdefault("ATS_GEMINI_RPM", "1000000")
+os.environ.setdefault("ATS_GEMINI_TPM", "1000000000")
+
+import fitz  # PyMuPDF
+import numpy as np
+
+from analysis_prompts import get_analysis_option
+from ats_engine import (
+    EXTRACTION_MODES,
+    EXTRACTION_TEXT,
+    extract_structured_data,
+    generate_analysis,
+    parts_payload_bytes,
+    pdf_bytes_to_parts,
+    raster_settings,
+    stream_analysis,
+)
+from gemini_stub_server import StubSettings, start_stub_server
+from llm_backends import BACKEND_GEMINI, BACKEND_STUB, BACKENDS, StubBackend, configure_backend, set_backend
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_PAGES = (1, 2, 3, 5, 10)
+VARIANTS = ("text", "scanned")
+REGRESSION_THRESHOLD = 0.10
+
+SKILLS = [
+    "Python", "Go", "Kubernetes", "Terraform", "PostgreSQL", "Kafka", "React", "TypeScript",
+    "AWS", "GCP", "Docker", "gRPC", "Redis", "Airflow", "Spark", "CI/CD", "Prometheus", "Linux",
+]
+VERBS = ["Built", "Led", "Designed", "Migrated", "Scaled", "Automated", "Reduced", "Shipped"]
+OBJECTS = [
+    "a payments platform", "the data ingestion pipeline", "internal developer tooling",
+    "a recommendation service", "the observability stack", "multi-region deployments",
+]
+BENCH_JD = (
+    "Senior Backend Engineer. We are looking for an engineer with 5+ years of Python or Go, "
+    "experience running Kubernetes and Terraform on AWS or GCP, strong PostgreSQL and Kafka "
+    "skills, and a track record of improving reliability with Prometheus-based monitoring."
+)
+
+
+def synthetic_resume_text(rng, page_num):
+    """One page worth of plausible resume content"""
+    lines = [f"Jane Doe — Page {page_num + 1}", "Senior Software Engineer", ""]
+    lines.append("Skills: " + ", ".join(rng.sample(SKILLS, 8)))
+    lines.append("")
+    for _ in range(3):
+        lines.append(f"Company {rng.randint(1, 99)} — {rng.randint(2012, 2024)} to present")
+        for _ in range(5):
+            lines.append(f"• {rng.choice(VERBS)} {rng.choice(OBJECTS)} using {rng.choice(SKILLS)}, "
+                         f"improving throughput by {rng.randint(10, 80)}%")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def make_resume_pdf(pages, variant, seed):
+    """Build a synthetic resume PDF; scanned variants contain page images only"""
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        page.insert_textbox(page.rect + (50, 50, -50, -50), synthetic_resume_text(rng, page_num), fontsize=10)
+    if variant == "scanned":
+        scanned = fitz.open()
+        for page in doc:
+            png = page.get_pixmap(dpi=150, colorspace=fitz.csGRAY).tobytes("png")
+            scanned.new_page(width=page.rect.width, height=page.rect.height).insert_image(page.rect, stream=png)
+        doc.close()
+        doc = scanned
+    try:
+        return doc.tobytes()
+    finally:
+        doc.close()
+
+
+def build_corpus(page_counts, samples, seed):
+    corpus = []
+    for pages in page_counts:
+        for variant in VARIANTS:
+            for sample in range(samples):
+                corpus.append({
+                    "scenario": f"{variant}-{pages}p",
+                    "pdf_bytes": make_resume_pdf(pages, variant, seed * 100003 + pages * 101 + sample),
+                })
+    return corpus
+
+
+def percentiles(values):
+    if not values:
+        return None
+    values = np.asarray(values, dtype=float) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50": round(p50, 2), "p95": round(p95, 2), "p99": round(p99, 2),
+            "mean": round(float(values.mean()), 2), "max": round(float(values.max()), 2)}
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process plus finished children"""
+    if resource is None:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is KB on Linux and bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_one(item, option, mode, raster, stream):
+    """Preprocess, analyze and parse one resume, returning its timings"""
+    sample = {"scenario": item["scenario"], "error": None, "ttft": None}
+    start = time.perf_counter()
+    parts = pdf_bytes_to_parts(item["pdf_bytes"], mode=mode, raster=raster)
+    sample["preprocess"] = time.perf_counter() - start
+    sample["payload_bytes"] = parts_payload_bytes(parts)
+
+    llm_start = time.perf_counter()
+    try:
+        if stream:
+            chunks = []
+            for chunk in stream_analysis(BENCH_JD, parts, option["prompt"],
+                                         response_schema=option.get("response_schema")):
+                if sample["ttft"] is None:
+                    sample["ttft"] = time.perf_counter() - llm_start
+                chunks.append(chunk)
+            response = "".join(chunks)
+        else:
+            response = generate_analysis(BENCH_JD, parts, option["prompt"],
+                                         response_schema=option.get("response_schema"))
+    except Exception as e:
+        sample["error"] = f"{type(e).__name__}: {e}"
+        sample["analysis"] = time.perf_counter() - llm_start
+        sample["end_to_end"] = time.perf_counter() - start
+        return sample
+    sample["analysis"] = time.perf_counter() - llm_start
+
+    parse_start = time.perf_counter()
+    extract_structured_data(response)
+    sample["parse"] = time.perf_counter() - parse_start
+    sample["end_to_end"] = time.perf_counter() - start
+    return sample
+
+
+def summarize(samples):
+    ok = [s for s in samples if s["error"] is None]
+    payloads = [s["payload_bytes"] for s in samples]
+    return {
+        "count": len(samples),
+        "errors": len(samples) - len(ok),
+        "preprocess_ms": percentiles([s["preprocess"] for s in samples]),
+        "analysis_ms": percentiles([s["analysis"] for s in ok]),
+        "ttft_ms": percentiles([s["ttft"] for s in ok if s["ttft"] is not None]),
+        "parse_ms": percentiles([s["parse"] for s in ok]),
+        "end_to_end_ms": percentiles([s["end_to_end"] for s in ok]),
+        "payload_bytes": {"mean": int(np.mean(payloads)), "max": int(max(payloads))} if payloads else None,
+    }
+
+
+def compare_reports(current, previous, threshold=REGRESSION_THRESHOLD):
+    """Print p50/p95 changes per scenario, flagging regressions beyond the threshold"""
+    print(f"\n📈 Compared with {previous['meta'].get('git_revision') or 'previous run'}:")
+    for name, stats in current["scenarios"].items():
+        old = previous.get("scenarios", {}).get(name)
+        if not old:
+            continue
+        for metric in ("preprocess_ms", "end_to_end_ms"):
+            new_stats, old_stats = stats.get(metric), old.get(metric)
+            if not new_stats or not old_stats:
+                continue
+            for pct in ("p50", "p95"):
+                before, after = old_stats[pct], new_stats[pct]
+                change = (after - before) / before if before else 0.0
+                flag = "⚠️ " if change > threshold else "  "
+                print(f"{flag}{name:>12} {metric:<14} {pct}: {before:9.1f} → {after:9.1f} ms ({change:+.0%})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the resume pipeline against a local Gemini stub")
+    parser.add_argument("--pages", type=int, nargs="+", default=list(DEFAULT_PAGES), help="Page counts to generate")
+    parser.add_argument("--samples", type=int, default=5, help="Resumes per page count and variant")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--analysis", default="Detailed Analysis", help="Analysis type to run")
+    parser.add_argument("--extraction", choices=EXTRACTION_MODES, default=EXTRACTION_TEXT)
+    parser.add_argument("--dpi", type=int, default=None)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--stream", action="store_true", help="Use streaming calls and report TTFT")
+    parser.add_argument("--latency", type=float, default=0.5, help="Stub mean latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Stub HTTP 500 rate")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Stub HTTP 429 rate")
+    parser.add_argument("--endpoint", default=None, help="Use an already running server instead of the built-in stub")
+    parser.add_argument("--backend", choices=BACKENDS, default=BACKEND_GEMINI,
+                        help="gemini (SDK over REST to the stub server) or stub (in-process, no HTTP)")
+    parser.add_argument("--out", default="benchmark_results.json")
+    parser.add_argument("--compare", default=None, help="Earlier benchmark JSON to compare against")
+    args = parser.parse_args(argv)
+
+    option = get_analysis_option(args.analysis)
+    raster = raster_settings(dpi=args.dpi)
+    endpoint = args.endpoint
+    if args.backend == BACKEND_STUB:
+        endpoint = "in-process stub"
+        set_backend(StubBackend(latency=args.latency))
+    else:
+        if endpoint is None:
+            settings = StubSettings(args.latency, args.jitter, error_rate=args.error_rate,
+                                    rate_limit_rate=args.rate_limit_rate, seed=args.seed)
+            _, endpoint = start_stub_server(settings=settings)
+        configure_backend(args.backend, api_key="benchmark", endpoint=endpoint)
+
+    print(f"🧪 Generating {len(args.pages) * len(VARIANTS) * args.samples} synthetic resumes...", flush=True)
+    corpus = build_corpus(args.pages, args.samples, args.seed)
+
+    print(f"⏱️ Running {args.analysis} against {endpoint} (concurrency {args.concurrency})...", flush=True)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        samples = list(executor.map(
+            lambda item: run_one(item, option, args.extraction, raster, args.stream), corpus
+        ))
+    wall = time.perf_counter() - start
+
+    scenarios = {}
+    for sample in samples:
+        scenarios.setdefault(sample["scenario"], []).append(sample)
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "pymupdf": fitz.VersionBind,
+        },
+        "config": {key: value for key, value in vars(args).items() if key not in ("out", "compare")},
+        "overall": {
+            **summarize(samples),
+            "wall_seconds": round(wall, 3),
+            "throughput_per_second": round(len(samples) / wall, 3) if wall else None,
+            "peak_rss_mb": peak_rss_mb(),
+        },
+        "scenarios": {name: summarize(group) for name, group in scenarios.items()},
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    overall = report["overall"]
+    print(f"\n📊 {overall['count']} analyses, {overall['errors']} errors in {overall['wall_seconds']}s "
+          f"({overall['throughput_per_second']}/s), peak RSS {overall['peak_rss_mb']} MB")
+    for name, stats in report["scenarios"].items():
+        e2e = stats["end_to_end_ms"] or {}
+        print(f"   {name:>12}: preprocess p50 {stats['preprocess_ms']['p50']} ms, end-to-end p50 "
+              f"{e2e.get('p50')} / p95 {e2e.get('p95')} / p99 {e2e.get('p99')} ms, "
+              f"payload {stats['payload_bytes']['mean']} B")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare_reports(report, json.load(f))
+    print(f"💾 Results written to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
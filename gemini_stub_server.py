@@ -0,0 +1,208 @@
+"""Local stand-in for the Gemini REST API with latency and error injection.
+
+Serves ``generateContent``, ``streamGenerateContent`` and ``countTokens``
+for any model, so the real SDK (and everything built on it) can run
+offline. Point the app or batch tools at it with
+``ATS_GEMINI_ENDPOINT=http://127.0.0.1:8765``.
+
+Usage:
+    python gemini_stub_server.py --port 8765 --latency 1.5 --error-rate 0.05
+"""
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from llm_backends import fake_response_text
+from rate_limit import CHARS_PER_TOKEN, IMAGE_TOKENS
+
+PATH_PATTERN = re.compile(r"^/[^/]+/models/(?P<model>[^:]+):(?P<method>\w+)")
+DEFAULT_PORT = 8765
+STREAM_CHUNKS = 8
+
+
+def request_tokens(body):
+    """Prompt token count using the same heuristic the limiter charges"""
+    tokens = 0
+    for content in body.get("contents", []):
+        for part in content.get("parts", []):
+            if "text" in part:
+                tokens += len(part["text"]) // CHARS_PER_TOKEN + 1
+            else:
+                tokens += IMAGE_TOKENS
+    return tokens
+
+
+def wants_json(body):
+    config = body.get("generationConfig") or body.get("generation_config") or {}
+    return (config.get("responseMimeType") or config.get("response_mime_type")) == "application/json"
+
+
+def response_payload(text, prompt_tokens, finished=True):
+    candidate_tokens = max(1, len(text) // CHARS_PER_TOKEN)
+    payload = {
+        "candidates": [{
+            "content": {"parts": [{"text": text}], "role": "model"},
+            "index": 0,
+        }],
+        "usageMetadata": {
+            "promptTokenCount": prompt_tokens,
+            "candidatesTokenCount": candidate_tokens,
+            "totalTokenCount": prompt_tokens + candidate_tokens,
+        },
+    }
+    if finished:
+        payload["candidates"][0]["finishReason"] = "STOP"
+    return payload
+
+
+class StubSettings:
+    """Latency/error knobs shared by all handler threads"""
+
+    def __init__(self, latency=1.0, jitter=0.2, ttft_fraction=0.3, error_rate=0.0, rate_limit_rate=0.0,
+                 seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.ttft_fraction = ttft_fraction
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+    def draw(self):
+        """Pick (latency, injected_status) for one request"""
+        with self._lock:
+            self.requests += 1
+            roll = self._random.random()
+            latency = max(0.0, self._random.gauss(self.latency, self.latency * self.jitter))
+            status = None
+            if roll < self.rate_limit_rate:
+                status = 429
+            elif roll < self.rate_limit_rate + self.error_rate:
+                status = 500
+            if status is not None:
+                self.errors += 1
+            return latency, status
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    settings = StubSettings()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status):
+        message = "Resource has been exhausted (e.g. check quota). Please retry in 1s." if status == 429 else "Internal error"
+        self._send_json(status, {"error": {
+            "code": status,
+            "message": message,
+            "status": "RESOURCE_EXHAUSTED" if status == 429 else "INTERNAL",
+        }})
+
+    def do_POST(self):
+        match = PATH_PATTERN.match(self.path)
+        if match is None:
+            self._send_json(404, {"error": {"code": 404, "message": "Not found", "status": "NOT_FOUND"}})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        method = match.group("method")
+        prompt_tokens = request_tokens(body)
+
+        if method == "countTokens":
+            self._send_json(200, {"totalTokens": prompt_tokens})
+            return
+
+        latency, status = self.settings.draw()
+        if status is not None:
+            # Failures come back quickly, like real quota/server errors
+            time.sleep(latency * self.settings.ttft_fraction)
+            self._send_error(status)
+            return
+
+        text = fake_response_text(json.dumps(body, sort_keys=True), wants_json(body))
+        if method == "generateContent":
+            time.sleep(latency)
+            self._send_json(200, response_payload(text, prompt_tokens))
+        elif method == "streamGenerateContent":
+            self._stream(text, prompt_tokens, latency)
+        else:
+            self._send_json(404, {"error": {"code": 404, "message": f"Unknown method {method}", "status": "NOT_FOUND"}})
+
+    def _stream(self, text, prompt_tokens, latency):
+        """Stream the text in chunks as a JSON array (or SSE when alt=sse)"""
+        sse = "alt=sse" in self.path
+        step = max(1, -(-len(text) // STREAM_CHUNKS))
+        pieces = [text[i:i + step] for i in range(0, len(text), step)]
+        ttft = latency * self.settings.ttft_fraction
+        per_chunk = (latency - ttft) / max(1, len(pieces) - 1)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream" if sse else "application/json")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        time.sleep(ttft)
+        if not sse:
+            self.wfile.write(b"[")
+        for i, piece in enumerate(pieces):
+            if i:
+                time.sleep(per_chunk)
+            payload = json.dumps(response_payload(piece, prompt_tokens, finished=i == len(pieces) - 1))
+            if sse:
+                self.wfile.write(f"data: {payload}\r\n\r\n".encode("utf-8"))
+            else:
+                self.wfile.write(((",\n" if i else "") + payload).encode("utf-8"))
+            self.wfile.flush()
+        if not sse:
+            self.wfile.write(b"]")
+        self.close_connection = True
+
+
+def start_stub_server(port=0, settings=None):
+    """Start the stub on a daemon thread; returns (server, endpoint_url)"""
+    handler = type("ConfiguredStubHandler", (StubHandler,), {"settings": settings or StubSettings()})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="gemini-stub").start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local Gemini API stand-in with latency/error injection")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--latency", type=float, default=1.0, help="Mean response latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Latency standard deviation as a fraction of the mean")
+    parser.add_argument("--ttft-fraction", type=float, default=0.3, help="Share of the latency before the first streamed chunk")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 429")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    settings = StubSettings(args.latency, args.jitter, args.ttft_fraction, args.error_rate, args.rate_limit_rate, args.seed)
+    server, endpoint = start_stub_server(args.port, settings)
+    print(f"🧪 Gemini stub listening on {endpoint} (latency {args.latency}s, "
+          f"errors {args.error_rate:.0%}, 429s {args.rate_limit_rate:.0%})", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
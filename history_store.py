@@ -0,0 +1,155 @@
+"""Persistent analysis history backed by SQLite with full-text search.
+
+Every completed analysis is stored with its full response, parsed
+structured data, resume/JD hashes and timings. Listing is paginated and
+only returns short previews, so the history panel never loads the whole
+table (or full responses) on a Streamlit rerun.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from analysis_cache import CACHE_DIR, normalize_text
+
+DEFAULT_PATH = os.getenv("ATS_HISTORY_PATH", os.path.join(CACHE_DIR, "history.sqlite3"))
+PREVIEW_CHARS = 500
+
+
+def jd_hash(input_text):
+    """Hash of the whitespace-normalized job description"""
+    return hashlib.sha256(normalize_text(input_text).encode("utf-8")).hexdigest()
+
+
+def _fts_query(search):
+    """Quote each search term so user input never breaks FTS5 syntax"""
+    terms = ['"' + term.replace('"', '""') + '"' for term in search.split()]
+    return " ".join(terms)
+
+
+class HistoryStore:
+    """Analysis history with FTS5 search (falls back to LIKE when FTS5 is unavailable)"""
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self._local = threading.local()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS analyses ("
+            " id INTEGER PRIMARY KEY,"
+            " created_at REAL NOT NULL,"
+            " analysis_type TEXT NOT NULL,"
+            " resume_name TEXT,"
+            " resume_hash TEXT,"
+            " jd_hash TEXT,"
+            " response TEXT NOT NULL,"
+            " structured_json TEXT,"
+            " match_percentage INTEGER,"
+            " ats_score INTEGER,"
+            " cached INTEGER,"
+            " ttft_seconds REAL,"
+            " total_seconds REAL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS analyses_type ON analyses (analysis_type, id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS analyses_resume ON analyses (resume_hash, jd_hash)")
+        try:
+            conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS analyses_fts USING fts5("
+                " response, resume_name, content='analyses', content_rowid='id')"
+            )
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS analyses_ai AFTER INSERT ON analyses BEGIN"
+                " INSERT INTO analyses_fts (rowid, response, resume_name) VALUES (new.id, new.response, new.resume_name);"
+                " END"
+            )
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS analyses_ad AFTER DELETE ON analyses BEGIN"
+                " INSERT INTO analyses_fts (analyses_fts, rowid, response, resume_name)"
+                " VALUES ('delete', old.id, old.response, old.resume_name);"
+                " END"
+            )
+            self.fts = True
+        except sqlite3.OperationalError:
+            self.fts = False
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def add(self, analysis_type, response, resume_hash=None, input_text=None, resume_name=None,
+            structured=None, timing=None):
+        """Record a completed analysis and return its id"""
+        timing = timing or {}
+        structured = structured or {}
+        cursor = self._conn().execute(
+            "INSERT INTO analyses (created_at, analysis_type, resume_name, resume_hash, jd_hash, response,"
+            " structured_json, match_percentage, ats_score, cached, ttft_seconds, total_seconds)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                time.time(), analysis_type, resume_name, resume_hash,
+                jd_hash(input_text) if input_text is not None else None,
+                response,
+                json.dumps(structured) if structured else None,
+                structured.get("match_percentage"),
+                structured.get("ats_score"),
+                int(timing["cached"]) if "cached" in timing else None,
+                timing.get("ttft_seconds"),
+                timing.get("total_seconds"),
+            )
+        )
+        return cursor.lastrowid
+
+    def _filters(self, search=None, analysis_type=None):
+        clauses, params = [], []
+        if search and search.strip():
+            if self.fts:
+                clauses.append("id IN (SELECT rowid FROM analyses_fts WHERE analyses_fts MATCH ?)")
+                params.append(_fts_query(search))
+            else:
+                clauses.append("(response LIKE ? OR resume_name LIKE ?)")
+                params.extend([f"%{search.strip()}%"] * 2)
+        if analysis_type:
+            clauses.append("analysis_type = ?")
+            params.append(analysis_type)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def count(self, search=None, analysis_type=None):
+        where, params = self._filters(search, analysis_type)
+        return self._conn().execute(f"SELECT COUNT(*) FROM analyses{where}", params).fetchone()[0]
+
+    def has_entries(self):
+        return self._conn().execute("SELECT 1 FROM analyses LIMIT 1").fetchone() is not None
+
+    def page(self, page=1, per_page=10, search=None, analysis_type=None):
+        """Newest-first page of entries with response previews instead of full text"""
+        where, params = self._filters(search, analysis_type)
+        rows = self._conn().execute(
+            f"SELECT id, created_at, analysis_type, resume_name, match_percentage, ats_score, total_seconds,"
+            f" substr(response, 1, {PREVIEW_CHARS}) AS preview, length(response) AS response_length"
+            f" FROM analyses{where} ORDER BY id DESC LIMIT ? OFFSET ?",
+            params + [per_page, (max(page, 1) - 1) * per_page]
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get(self, entry_id):
+        """Full entry including the complete response and structured data"""
+        row = self._conn().execute("SELECT * FROM analyses WHERE id = ?", (entry_id,)).fetchone()
+        if row is None:
+            return None
+        entry = dict(row)
+        raw = entry.pop("structured_json")
+        entry["structured"] = json.loads(raw) if raw else None
+        return entry
+
+    def delete(self, entry_id):
+        self._conn().execute("DELETE FROM analyses WHERE id = ?", (entry_id,))
@@ -0,0 +1,329 @@
+"""Per-request stage timings, token counts and Prometheus-style metrics.
+
+A ``RequestTrace`` follows one analysis through upload read, text
+extraction, rasterization, encoding, Gemini queueing/TTFT/total, JSON
+parsing and rendering. The active trace lives in a context variable so
+engine code can record into it without threading it through every call.
+Finished traces update process-wide histograms and counters, are logged
+as one JSON line each, and are exported in Prometheus text format to a
+file (rewritten at most every ATS_METRICS_FILE_SECONDS) and (optionally)
+an HTTP endpoint on localhost.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from analysis_cache import CACHE_DIR
+
+METRICS_FILE = os.getenv("ATS_METRICS_FILE", os.path.join(CACHE_DIR, "metrics.prom"))
+REQUEST_LOG = os.getenv("ATS_REQUEST_LOG", os.path.join(CACHE_DIR, "requests.log"))
+METRICS_PORT = int(os.getenv("ATS_METRICS_PORT", "0"))
+# Set to 0.0.0.0 to let a scraper on another host reach the endpoint
+METRICS_HOST = os.getenv("ATS_METRICS_HOST", "127.0.0.1")
+# Traces finishing within this many seconds of the last write share the next one
+METRICS_FILE_SECONDS = float(os.getenv("ATS_METRICS_FILE_SECONDS", "10"))
+
+# Histogram buckets in seconds, from cache hits up to slow Gemini calls
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+logger = logging.getLogger("ats.requests")
+_current_trace = contextvars.ContextVar("ats_current_trace", default=None)
+
+
+class RequestTrace:
+    """Timings, token usage and cache outcome for one analysis request"""
+
+    def __init__(self, analysis_type, **labels):
+        self.request_id = uuid.uuid4().hex[:12]
+        self.analysis_type = analysis_type
+        self.labels = labels
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.tokens = {}
+        self.cache_hit = None
+        self.plan = None
+        self.error = None
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        """Accumulate time spent in a stage (stages can repeat, e.g. per page)"""
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add_tokens(self, **counts):
+        with self._lock:
+            for kind, count in counts.items():
+                if count:
+                    self.tokens[kind] = self.tokens.get(kind, 0) + int(count)
+
+    def to_dict(self):
+        return {
+            "request_id": self.request_id,
+            "analysis_type": self.analysis_type,
+            **self.labels,
+            "cache_hit": self.cache_hit,
+            "plan": self.plan,
+            "error": self.error,
+            "stages": {name: round(seconds, 4) for name, seconds in self.stages.items()},
+            "tokens": dict(self.tokens),
+            "total_seconds": round(time.perf_counter() - self.started, 4),
+        }
+
+
+def start_trace(analysis_type, **labels):
+    """Create a trace and make it current for this thread/context"""
+    trace = RequestTrace(analysis_type, **labels)
+    _current_trace.set(trace)
+    return trace
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def stage(name):
+    """Time a block into the current trace (no-op when there is none)"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    with trace.stage(name):
+        yield
+
+
+def add_stage_time(name, seconds):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(name, seconds)
+
+
+def record_usage(response, estimated=None):
+    """Copy Gemini usage_metadata token counts (and our prompt estimate) into the current trace"""
+    trace = _current_trace.get()
+    usage = getattr(response, "usage_metadata", None)
+    if trace is None or usage is None:
+        return
+    trace.add_tokens(
+        prompt=getattr(usage, "prompt_token_count", 0),
+        candidates=getattr(usage, "candidates_token_count", 0),
+        total=getattr(usage, "total_token_count", 0),
+        estimated=estimated,
+    )
+
+
+def record_plan(plan):
+    """Attach the request planner's model and budget decision to the current trace"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.plan = plan
+
+
+def record_cache(hit):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.cache_hit = hit
+
+
+class MetricsRegistry:
+    """Minimal thread-safe counters and histograms with Prometheus text output"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def inc(self, name, labels=None, amount=1):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, labels=None):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    histogram["buckets"][i] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    def render(self):
+        """Prometheus text exposition format"""
+        def fmt_labels(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{str(v)}"' for k, v in pairs) + "}"
+
+        lines = []
+        with self._lock:
+            for name in sorted({key[0] for key in self._counters}):
+                lines.append(f"# TYPE {name} counter")
+                for (metric, labels), value in sorted(self._counters.items()):
+                    if metric == name:
+                        lines.append(f"{name}{fmt_labels(labels)} {value}")
+            for name in sorted({key[0] for key in self._histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (metric, labels), histogram in sorted(self._histograms.items()):
+                    if metric != name:
+                        continue
+                    for bound, count in zip(BUCKETS, histogram["buckets"]):
+                        lines.append(f"{name}_bucket{fmt_labels(labels, [('le', bound)])} {count}")
+                    lines.append(f"{name}_bucket{fmt_labels(labels, [('le', '+Inf')])} {histogram['count']}")
+                    lines.append(f"{name}_sum{fmt_labels(labels)} {histogram['sum']:.6f}")
+                    lines.append(f"{name}_count{fmt_labels(labels)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry()
+_log_lock = threading.Lock()
+_log_configured = False
+_metrics_file_lock = threading.Lock()
+_metrics_written = None
+_metrics_timer = None
+
+
+def _configure_request_log():
+    global _log_configured
+    with _log_lock:
+        if _log_configured or not REQUEST_LOG:
+            return
+        if os.path.dirname(REQUEST_LOG):
+            os.makedirs(os.path.dirname(REQUEST_LOG), exist_ok=True)
+        handler = logging.FileHandler(REQUEST_LOG, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        _log_configured = True
+
+
+def write_metrics_file(path=METRICS_FILE):
+    """Atomically rewrite the Prometheus text file (per process)"""
+    global _metrics_written
+    if not path:
+        return
+    _metrics_written = time.monotonic()
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(METRICS.render())
+    os.replace(tmp_path, path)
+
+
+def flush_metrics_file():
+    """Write a metrics file update still waiting for its window now"""
+    global _metrics_timer
+    with _metrics_file_lock:
+        if _metrics_timer is None:
+            return
+        _metrics_timer.cancel()
+        _metrics_timer = None
+        try:
+            write_metrics_file()
+        except OSError:
+            logger.warning("could not write metrics file %s", METRICS_FILE)
+
+
+def schedule_metrics_file():
+    """Write the metrics file now, or once the current METRICS_FILE_SECONDS window ends"""
+    global _metrics_timer
+    if not METRICS_FILE:
+        return
+    with _metrics_file_lock:
+        if _metrics_timer is not None:
+            return
+        wait = 0 if _metrics_written is None else _metrics_written + METRICS_FILE_SECONDS - time.monotonic()
+        if wait > 0:
+            _metrics_timer = threading.Timer(wait, flush_metrics_file)
+            _metrics_timer.daemon = True
+            _metrics_timer.start()
+            return
+        try:
+            write_metrics_file()
+        except OSError:
+            logger.warning("could not write metrics file %s", METRICS_FILE)
+
+
+# A short-lived process (e.g. a batch run) still leaves its final metrics behind
+atexit.register(flush_metrics_file)
+
+
+def finish_trace(trace, error=None):
+    """Publish a finished trace to metrics, the JSON request log and (batched) the metrics file"""
+    if error is not None:
+        trace.error = str(error)
+    record = trace.to_dict()
+    labels = {"analysis_type": trace.analysis_type}
+    outcome = "error" if trace.error else ("cache_hit" if trace.cache_hit else "ok")
+    METRICS.inc("ats_requests_total", {**labels, "outcome": outcome})
+    METRICS.observe("ats_request_seconds", record["total_seconds"], labels)
+    for stage_name, seconds in trace.stages.items():
+        METRICS.observe("ats_stage_seconds", seconds, {"stage": stage_name})
+    for kind, count in trace.tokens.items():
+        METRICS.inc("ats_tokens_total", {**labels, "kind": kind}, count)
+    if trace.cache_hit is not None:
+        METRICS.inc("ats_cache_lookups_total", {"result": "hit" if trace.cache_hit else "miss"})
+    if trace.plan is not None:
+        METRICS.inc("ats_model_routes_total", {"tier": trace.plan["tier"], "model": trace.plan["model"]})
+        if trace.plan["trimmed"]:
+            METRICS.inc("ats_budget_trims_total", labels)
+
+    _configure_request_log()
+    logger.info(json.dumps({"ts": time.time(), **record}))
+    schedule_metrics_file()
+    if _current_trace.get() is trace:
+        _current_trace.set(None)
+    return record
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") not in ("", "/metrics"):
+            self.send_error(404)
+            return
+        body = METRICS.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+
+
+def start_metrics_server(port=METRICS_PORT, host=METRICS_HOST):
+    """Serve /metrics on a background thread (once per process; port 0 disables it)"""
+    global _server
+    if not port or _server is not None:
+        return _server
+    try:
+        _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError:
+        # Another worker process already owns the port; it still writes the file
+        return None
+    threading.Thread(target=_server.serve_forever, daemon=True, name="ats-metrics").start()
+    return _server
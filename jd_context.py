@@ -0,0 +1,230 @@
+"""Per-job-description state reused across many resumes.
+
+When one JD is screened against many resumes, two things only need to be
+computed once:
+
+- A ``PromptContext`` for the JD + prompt prefix of every request. Where
+  the backend supports it (Gemini explicit context caching) the prefix is
+  uploaded once and each request only sends the resume; otherwise the
+  prefix still goes first in a stable order, so Gemini's implicit prefix
+  caching can apply, and its token estimate is reused.
+- A JD profile: normalized skills/keywords, required years of experience
+  and education level, used for local scoring.
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from functools import lru_cache
+
+from analysis_cache import normalize_text
+from keyword_scorer import jd_keywords, score_resume
+from llm_backends import get_backend
+from rate_limit import SingleFlight, estimate_tokens
+
+# Explicit caches below the model's minimum size are rejected by Gemini
+CONTEXT_CACHE_MIN_TOKENS = int(os.getenv("ATS_CONTEXT_CACHE_MIN_TOKENS", "1024"))
+CONTEXT_CACHE_TTL_SECONDS = int(os.getenv("ATS_CONTEXT_CACHE_TTL", "3600"))
+MAX_CONTEXTS = 64
+
+# Common spellings mapped to one canonical skill name before keyword extraction
+SKILL_ALIASES = {
+    "k8s": "kubernetes",
+    "golang": "go",
+    "postgres": "postgresql",
+    "js": "javascript",
+    "ts": "typescript",
+    "nodejs": "node.js",
+    "reactjs": "react",
+    "react.js": "react",
+    "vue.js": "vue",
+    "sklearn": "scikit-learn",
+    "ml": "machine learning",
+    "nlp": "natural language processing",
+    "amazon web services": "aws",
+    "google cloud platform": "gcp",
+}
+ALIAS_PATTERN = re.compile(
+    r"(?<![\w.])(" + "|".join(re.escape(alias) for alias in sorted(SKILL_ALIASES, key=len, reverse=True)) + r")(?![\w])",
+    re.IGNORECASE
+)
+
+YEARS_PATTERN = re.compile(
+    r"\b(\d{1,2})\s*\+?\s*(?:(?:-|–|to)\s*\d{1,2}\s*)?\+?\s*(?:years?|yrs?)\b", re.IGNORECASE
+)
+DATE_RANGE_PATTERN = re.compile(
+    r"\b((?:19|20)\d{2})\s*(?:-|–|—|to)\s*((?:19|20)\d{2}|present|current|now)\b", re.IGNORECASE
+)
+EDUCATION_LEVELS = ("associate", "bachelors", "masters", "phd")
+EDUCATION_PATTERNS = {
+    "phd": re.compile(r"\b(?:ph\.?\s?d|doctorate|doctoral)\b", re.IGNORECASE),
+    "masters": re.compile(r"\b(?:master'?s?|msc|m\.sc|mba|m\.eng|meng)\b|\bm\.?s\.?\s+(?:in|degree)\b", re.IGNORECASE),
+    "bachelors": re.compile(
+        r"\b(?:bachelor'?s?|bsc|b\.sc|b\.?tech|b\.eng|beng|undergraduate degree)\b|\bb\.?[sa]\.?\s+(?:in|degree)\b",
+        re.IGNORECASE
+    ),
+    "associate": re.compile(r"\bassociate'?s?\s+degree\b", re.IGNORECASE),
+}
+
+
+def normalize_skills(text):
+    """Rewrite skill aliases (k8s, golang, postgres...) to their canonical names"""
+    return ALIAS_PATTERN.sub(lambda m: SKILL_ALIASES[m.group(1).lower()], text or "")
+
+
+def education_levels(text):
+    return [level for level in EDUCATION_LEVELS if EDUCATION_PATTERNS[level].search(text or "")]
+
+
+def years_mentioned(text):
+    """Largest "N years" figure in the text (the low end of ranges like 3-5 years)"""
+    values = [int(match.group(1)) for match in YEARS_PATTERN.finditer(text or "")]
+    return max(values) if values else None
+
+
+def years_from_dates(text):
+    """Career span implied by date ranges such as 2016 - present"""
+    spans = []
+    for start, end in DATE_RANGE_PATTERN.findall(text or ""):
+        end_year = datetime.now().year if not end[0].isdigit() else int(end)
+        spans.append((int(start), end_year))
+    if not spans:
+        return None
+    span = max(end for _, end in spans) - min(start for start, _ in spans)
+    return span if 0 <= span <= 50 else None
+
+
+@lru_cache(maxsize=256)
+def _build_jd_profile(normalized_jd):
+    levels = education_levels(normalized_jd)
+    keywords = jd_keywords(normalize_skills(normalized_jd))
+    return {
+        "keywords": keywords,
+        "skills": sorted(keywords, key=keywords.get, reverse=True),
+        "required_years": years_mentioned(normalized_jd),
+        # The lowest level a JD mentions is the requirement ("Bachelor's, Master's preferred")
+        "education": levels[0] if levels else None,
+    }
+
+
+def get_jd_profile(jd_text):
+    """Parsed JD profile, computed once per (whitespace-normalized) job description"""
+    return _build_jd_profile(normalize_text(jd_text))
+
+
+def score_with_profile(profile, resume_text, doc_freq=None, n_docs=0):
+    """Keyword pre-score plus years/education fit against a precomputed JD profile"""
+    result = score_resume(None, normalize_skills(resume_text), doc_freq=doc_freq, n_docs=n_docs,
+                          keywords=profile["keywords"])
+    found_years = [y for y in (years_mentioned(resume_text), years_from_dates(resume_text)) if y is not None]
+    levels = education_levels(resume_text)
+    result["required_years"] = profile["required_years"]
+    result["years_found"] = max(found_years) if found_years else None
+    result["meets_years"] = (
+        None if profile["required_years"] is None or result["years_found"] is None
+        else result["years_found"] >= profile["required_years"]
+    )
+    result["education_required"] = profile["education"]
+    result["education_found"] = levels[-1] if levels else None
+    result["meets_education"] = (
+        None if profile["education"] is None
+        else bool(levels) and EDUCATION_LEVELS.index(levels[-1]) >= EDUCATION_LEVELS.index(profile["education"])
+    )
+    return result
+
+
+def context_key(input_text, prompt, response_schema=None):
+    h = hashlib.sha256()
+    for field in (normalize_text(input_text), normalize_text(prompt),
+                  getattr(response_schema, "__name__", "") if response_schema is not None else ""):
+        h.update(field.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class PromptContext:
+    """The JD + prompt prefix shared by every request for one requisition"""
+
+    def __init__(self, input_text, prompt, response_schema=None):
+        self.prefix = [{"text": input_text}, {"text": prompt}]
+        self.prefix_tokens = estimate_tokens(self.prefix)
+        self.key = context_key(input_text, prompt, response_schema)
+        # Backend cache handle (e.g. a Gemini cachedContents name) when the prefix is cached remotely
+        self.handle = None
+        self.expires_at = None
+        self.remote_error = None
+
+    def expired(self):
+        return self.expires_at is not None and time.time() >= self.expires_at
+
+
+CONTEXT_STATS = {"contexts": 0, "remote_created": 0, "remote_failed": 0, "remote_rejected": 0,
+                 "remote_requests": 0, "prefix_tokens_saved": 0}
+_contexts = OrderedDict()
+_contexts_lock = threading.Lock()
+_context_flights = SingleFlight()
+
+
+def _create_context(input_text, prompt, response_schema, remote):
+    context = PromptContext(input_text, prompt, response_schema)
+    CONTEXT_STATS["contexts"] += 1
+    backend = get_backend()
+    if remote and context.prefix_tokens < CONTEXT_CACHE_MIN_TOKENS:
+        context.remote_error = f"prefix is {context.prefix_tokens} tokens, below the {CONTEXT_CACHE_MIN_TOKENS} minimum"
+    elif remote and getattr(backend, "supports_context_cache", False):
+        try:
+            context.handle = backend.create_context_cache(context.prefix, CONTEXT_CACHE_TTL_SECONDS)
+            # Refresh a little before Gemini drops the cache
+            context.expires_at = time.time() + CONTEXT_CACHE_TTL_SECONDS * 0.9
+            CONTEXT_STATS["remote_created"] += 1
+        except Exception as e:
+            # Model or account without explicit caching: fall back to prefix ordering
+            context.remote_error = str(e)
+            CONTEXT_STATS["remote_failed"] += 1
+    elif remote:
+        context.remote_error = f"{backend.name} backend has no context caching"
+    return context
+
+
+def get_prompt_context(input_text, prompt, response_schema=None, remote=True):
+    """Shared PromptContext for a JD + prompt, created once per process (per TTL)"""
+    key = (context_key(input_text, prompt, response_schema), remote)
+    with _contexts_lock:
+        context = _contexts.get(key)
+        if context is not None and not context.expired():
+            _contexts.move_to_end(key)
+            return context
+
+    def create():
+        context = _create_context(input_text, prompt, response_schema, remote)
+        with _contexts_lock:
+            _contexts[key] = context
+            while len(_contexts) > MAX_CONTEXTS:
+                _contexts.popitem(last=False)
+        return context
+    return _context_flights.do(key, create)
+
+
+def invalidate_context(context):
+    """Stop using a remote cache that the backend rejected (expired or deleted)"""
+    context.handle = None
+    context.expires_at = None
+    CONTEXT_STATS["remote_rejected"] += 1
+    # The next get_prompt_context call for this JD + prompt uploads a fresh cache
+    with _contexts_lock:
+        for key in [key for key, value in _contexts.items() if value is context]:
+            del _contexts[key]
+
+
+def record_context_use(context):
+    """Count a request answered from a remotely cached prefix"""
+    if context is not None and context.handle:
+        CONTEXT_STATS["remote_requests"] += 1
+        CONTEXT_STATS["prefix_tokens_saved"] += context.prefix_tokens
+
+
+def context_stats():
+    return dict(CONTEXT_STATS)
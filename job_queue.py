@@ -0,0 +1,263 @@
+"""Durable analysis job queue backed by SQLite.
+
+Jobs survive restarts: anything still marked running when the API server
+starts again is put back in the queue (up to ``max_attempts`` times).
+Submissions carrying an idempotency key return the existing job instead of
+queuing a duplicate (a failed job is queued again), and ``submit`` refuses
+new work once the number of unfinished jobs reaches ``max_queued`` so
+callers can back off.
+
+Resume bytes are stored once per content hash, however many jobs use them.
+One API server process owns a queue file at a time.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from analysis_cache import CACHE_DIR, normalize_text
+from ats_engine import resume_hash
+
+DEFAULT_PATH = os.getenv("ATS_JOB_DB", os.path.join(CACHE_DIR, "jobs.sqlite3"))
+DEFAULT_MAX_QUEUED = int(os.getenv("ATS_API_MAX_QUEUED", "100"))
+DEFAULT_MAX_ATTEMPTS = int(os.getenv("ATS_JOB_MAX_ATTEMPTS", "3"))
+DEFAULT_RETENTION_SECONDS = int(float(os.getenv("ATS_JOB_RETENTION_HOURS", "168")) * 3600)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+FINISHED = (DONE, FAILED)
+
+
+class QueueFullError(RuntimeError):
+    """Raised by submit when the queue is at capacity"""
+
+    def __init__(self, depth, retry_after):
+        super().__init__(f"Job queue is full ({depth} unfinished jobs)")
+        self.depth = depth
+        self.retry_after = retry_after
+
+
+class IdempotencyConflictError(ValueError):
+    """Raised when an idempotency key is reused for a different request"""
+
+
+def request_fingerprint(resume_digest, jd_text, analysis_type, options):
+    h = hashlib.sha256()
+    for field in (resume_digest, normalize_text(jd_text), analysis_type, json.dumps(options, sort_keys=True)):
+        h.update(field.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class JobQueue:
+    """Persistent FIFO of analysis jobs with idempotent submission"""
+
+    def __init__(self, path=DEFAULT_PATH, max_queued=DEFAULT_MAX_QUEUED, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.path = path
+        self.max_queued = max_queued
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " idempotency_key TEXT UNIQUE,"
+            " fingerprint TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " analysis_type TEXT NOT NULL,"
+            " jd_text TEXT NOT NULL,"
+            " resume_hash TEXT NOT NULL,"
+            " options TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " created_at REAL NOT NULL,"
+            " started_at REAL,"
+            " finished_at REAL,"
+            " response TEXT,"
+            " structured_json TEXT,"
+            " timing_json TEXT,"
+            " error TEXT)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS resumes ("
+            " resume_hash TEXT PRIMARY KEY,"
+            " data BLOB NOT NULL)"
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _job(self, row):
+        if row is None:
+            return None
+        return {
+            "id": row["id"],
+            "status": row["status"],
+            "analysis_type": row["analysis_type"],
+            "resume_hash": row["resume_hash"],
+            "options": json.loads(row["options"]),
+            "attempts": row["attempts"],
+            "created_at": row["created_at"],
+            "started_at": row["started_at"],
+            "finished_at": row["finished_at"],
+            "response": row["response"],
+            "structured": json.loads(row["structured_json"]) if row["structured_json"] else None,
+            "timing": json.loads(row["timing_json"]) if row["timing_json"] else None,
+            "error": row["error"],
+        }
+
+    def submit(self, resume_bytes, jd_text, analysis_type, options=None, idempotency_key=None):
+        """Queue a job, returning (job, created).
+
+        Raises QueueFullError when at capacity and IdempotencyConflictError
+        when the key was already used for a different request.
+        """
+        options = options or {}
+        digest = resume_hash(resume_bytes)
+        fingerprint = request_fingerprint(digest, jd_text, analysis_type, options)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = None
+            if idempotency_key:
+                row = conn.execute("SELECT * FROM jobs WHERE idempotency_key = ?", (idempotency_key,)).fetchone()
+                if row is not None and row["fingerprint"] != fingerprint:
+                    conn.execute("COMMIT")
+                    raise IdempotencyConflictError(
+                        f"Idempotency key {idempotency_key!r} was already used for a different request"
+                    )
+                if row is not None and row["status"] != FAILED:
+                    conn.execute("COMMIT")
+                    return self._job(row), False
+            depth = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)
+            ).fetchone()[0]
+            if depth >= self.max_queued:
+                conn.execute("COMMIT")
+                raise QueueFullError(depth, self.retry_after())
+            conn.execute("INSERT OR IGNORE INTO resumes (resume_hash, data) VALUES (?, ?)", (digest, resume_bytes))
+            if row is not None:
+                job_id = row["id"]
+                conn.execute(
+                    "UPDATE jobs SET status = ?, attempts = 0, created_at = ?, started_at = NULL, finished_at = NULL,"
+                    " error = NULL, timing_json = NULL WHERE id = ?",
+                    (QUEUED, time.time(), job_id)
+                )
+            else:
+                job_id = uuid.uuid4().hex
+                conn.execute(
+                    "INSERT INTO jobs (id, idempotency_key, fingerprint, status, analysis_type, jd_text, resume_hash,"
+                    " options, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, idempotency_key or None, fingerprint, QUEUED, analysis_type, jd_text, digest,
+                     json.dumps(options), time.time())
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        return self.get(job_id), True
+
+    def retry_after(self):
+        """Suggested client back-off in seconds: about one recent job duration"""
+        row = self._conn().execute(
+            "SELECT AVG(finished_at - started_at) FROM"
+            " (SELECT finished_at, started_at FROM jobs WHERE status = ? ORDER BY finished_at DESC LIMIT 20)",
+            (DONE,)
+        ).fetchone()
+        return max(1, min(60, round(row[0] or 10.0)))
+
+    def claim(self):
+        """Mark the oldest queued job running and return it (None when the queue is empty)"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, started_at = ?, attempts = attempts + 1 WHERE id = ?",
+                    (RUNNING, time.time(), row["id"])
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get(row["id"], with_inputs=True) if row is not None else None
+
+    def get(self, job_id, with_inputs=False):
+        """Job by id; ``with_inputs`` adds the JD text and resume bytes for workers"""
+        row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        job = self._job(row)
+        if job is not None and with_inputs:
+            job["jd_text"] = row["jd_text"]
+            job["resume_bytes"] = self._conn().execute(
+                "SELECT data FROM resumes WHERE resume_hash = ?", (row["resume_hash"],)
+            ).fetchone()[0]
+        return job
+
+    def complete(self, job_id, response, structured=None, timing=None):
+        self._conn().execute(
+            "UPDATE jobs SET status = ?, finished_at = ?, response = ?, structured_json = ?, timing_json = ?,"
+            " error = NULL WHERE id = ?",
+            (DONE, time.time(), response, json.dumps(structured) if structured else None,
+             json.dumps(timing) if timing else None, job_id)
+        )
+
+    def fail(self, job_id, error, timing=None):
+        self._conn().execute(
+            "UPDATE jobs SET status = ?, finished_at = ?, error = ?, timing_json = ? WHERE id = ?",
+            (FAILED, time.time(), error, json.dumps(timing) if timing else None, job_id)
+        )
+
+    def recover(self):
+        """Requeue jobs interrupted by a crash; fail those out of attempts. Returns the requeued count."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            requeued = conn.execute(
+                "UPDATE jobs SET status = ?, started_at = NULL WHERE status = ? AND attempts < ?",
+                (QUEUED, RUNNING, self.max_attempts)
+            ).rowcount
+            conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, error = ? WHERE status = ?",
+                (FAILED, time.time(), f"Interrupted {self.max_attempts} times, giving up", RUNNING)
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return requeued
+
+    def purge(self, older_than_seconds=DEFAULT_RETENTION_SECONDS):
+        """Delete finished jobs past retention and resumes no job refers to"""
+        conn = self._conn()
+        cutoff = time.time() - older_than_seconds
+        removed = conn.execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?", (*FINISHED, cutoff)
+        ).rowcount
+        conn.execute("DELETE FROM resumes WHERE resume_hash NOT IN (SELECT resume_hash FROM jobs)")
+        return removed
+
+    def depth(self):
+        rows = self._conn().execute(
+            "SELECT status, COUNT(*) FROM jobs WHERE status IN (?, ?) GROUP BY status", (QUEUED, RUNNING)
+        ).fetchall()
+        counts = {QUEUED: 0, RUNNING: 0}
+        counts.update({status: count for status, count in rows})
+        return counts
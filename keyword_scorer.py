@@ -0,0 +1,121 @@
+"""Deterministic local keyword scorer used as an instant pre-score and batch pre-filter.
+
+Tokenizes the job description and resume text, weights JD keywords by
+TF-IDF (using corpus document frequencies when available) and scores the
+resume with BM25 term saturation. Runs in a few milliseconds with NumPy,
+so it can render long before the Gemini response arrives.
+"""
+import re
+from collections import Counter
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#.]*[a-z0-9+#]|[a-z0-9]")
+
+STOPWORDS = frozenset("""
+a about above across after again against all also an and any are as at be because been before being
+below between both but by can could did do does doing down during each etc either few for from further
+had has have having he her here hers him his how i if in into is it its itself just least less like
+may me might more most must my no nor not now of off on once only or other our ours out over own per
+same she should so some such than that the their them then there these they this those through to
+too under until up upon us very via was we were what when where which while who whom why will with
+within without would you your yours
+ability able strong excellent good great work working experience experienced years year plus preferred
+required requirements requirement responsibilities responsible including include includes role
+candidate candidates team teams job position skills skill knowledge understanding using use related
+well new e.g i.e minimum day days looking join help ensure
+""".split())
+# Words around years-of-experience requirements ("3+ yrs of hands-on, proven
+# experience") say how much, not what, so they are never keywords
+EXPERIENCE_STOPWORDS = frozenset("""
+yr yrs yoe exp month months least prior previous relevant proven demonstrated hands track record
+""".split())
+HAS_LETTER = re.compile(r"[a-z]")
+# Other single letters are initials or split-off contractions ("team's" -> "s")
+ONE_LETTER_SKILLS = frozenset({"c", "r"})
+
+# BM25 parameters; the average resume length is used as the length norm
+BM25_K1 = 1.2
+BM25_B = 0.75
+AVG_RESUME_TOKENS = 600
+# Bigrams must repeat in the JD to count as keywords, which filters out
+# incidental word pairs while keeping phrases like "machine learning"
+MIN_BIGRAM_COUNT = 2
+MAX_MISSING_KEYWORDS = 15
+
+
+def tokenize(text):
+    """Lowercase word tokens, keeping tech terms like c++, c#, node.js"""
+    return TOKEN_PATTERN.findall((text or "").lower())
+
+
+def is_keyword(token):
+    """Whether a token can be a keyword: not a stopword, containing a letter (so not "5+" or "2.5")
+    and longer than one letter unless it is a one-letter skill such as C or R"""
+    if len(token) == 1:
+        return token in ONE_LETTER_SKILLS
+    return token not in STOPWORDS and token not in EXPERIENCE_STOPWORDS and HAS_LETTER.search(token) is not None
+
+
+def extract_terms(text):
+    """Unigram and bigram term counts with stopwords removed"""
+    tokens = tokenize(text)
+    unigrams = [t for t in tokens if is_keyword(t)]
+    bigrams = [f"{a} {b}" for a, b in zip(tokens, tokens[1:]) if is_keyword(a) and is_keyword(b)]
+    return Counter(unigrams), Counter(bigrams), len(tokens)
+
+
+def jd_keywords(jd_text):
+    """Keyword -> JD term frequency for a job description"""
+    unigrams, bigrams, _ = extract_terms(jd_text)
+    keywords = dict(unigrams)
+    keywords.update({term: count for term, count in bigrams.items() if count >= MIN_BIGRAM_COUNT})
+    return keywords
+
+
+def score_resume(jd_text, resume_text, doc_freq=None, n_docs=0, keywords=None):
+    """Score a resume against a JD using TF-IDF weighted BM25 keyword overlap.
+
+    ``doc_freq``/``n_docs`` are optional corpus statistics (e.g. from the
+    resume index) used for IDF; without them every keyword gets IDF 1.
+    ``keywords`` can be passed to reuse a precomputed JD keyword dict.
+    Returns a dict with ``match_percentage``, ``missing_keywords`` and details.
+    """
+    if keywords is None:
+        keywords = jd_keywords(jd_text)
+    if not keywords:
+        return {"match_percentage": None, "bm25": 0.0, "matched_keywords": [], "missing_keywords": [],
+                "keyword_count": 0, "resume_tokens": 0}
+
+    import numpy as np
+    resume_unigrams, resume_bigrams, resume_len = extract_terms(resume_text)
+    terms = list(keywords)
+    jd_tf = np.fromiter((keywords[t] for t in terms), dtype=np.float64, count=len(terms))
+    resume_tf = np.fromiter(
+        (resume_bigrams.get(t, 0) if " " in t else resume_unigrams.get(t, 0) for t in terms),
+        dtype=np.float64, count=len(terms)
+    )
+
+    if doc_freq and n_docs:
+        df = np.fromiter((doc_freq.get(t, 0) for t in terms), dtype=np.float64, count=len(terms))
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+    else:
+        idf = np.ones(len(terms))
+
+    weights = (1.0 + np.log(jd_tf)) * idf
+    length_norm = BM25_K1 * (1.0 - BM25_B + BM25_B * max(resume_len, 1) / AVG_RESUME_TOKENS)
+    saturation = resume_tf * (BM25_K1 + 1.0) / (resume_tf + length_norm)
+
+    present = resume_tf > 0
+    match = float(weights[present].sum() / weights.sum()) if weights.sum() else 0.0
+    order = np.argsort(-weights, kind="stable")
+    missing = [terms[i] for i in order if not present[i]]
+    matched = [terms[i] for i in order if present[i]]
+
+    return {
+        "match_percentage": int(round(match * 100)),
+        "bm25": round(float((weights * saturation).sum()), 3),
+        "matched_keywords": matched,
+        "missing_keywords": missing[:MAX_MISSING_KEYWORDS],
+        "keyword_count": len(terms),
+        "resume_tokens": resume_len,
+    }
+
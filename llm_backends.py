@@ -0,0 +1,417 @@
+"""Pluggable LLM backends behind one small interface.
+
+Every backend offers ``generate``, ``stream``, ``generate_async`` and
+``count_tokens`` over the request contents built by
+``ats_engine.build_contents``. Responses expose ``.text`` and
+``.usage_metadata`` like Gemini's, and streams yield chunks with ``.text``.
+Backends that can cache a shared prompt prefix server-side set
+``supports_context_cache`` and offer ``create_context_cache``; calls then
+pass the ``jd_context.PromptContext`` and only the per-resume contents.
+Calls may name another ``model`` than the backend's default, as chosen by
+``request_planner``.
+
+ATS_LLM_BACKEND selects the backend:
+
+- ``gemini`` (default): one long-lived Gemini model client per process
+- ``stub``: deterministic in-process responses, no network (ATS_STUB_LATENCY adds delay)
+- ``record``: Gemini, but every response is stored on disk and replayed for identical requests
+- ``replay``: serve recorded responses only, failing on unrecorded requests (offline CI)
+"""
+import asyncio
+import datetime
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from analysis_cache import CACHE_DIR
+from rate_limit import CHARS_PER_TOKEN, estimate_tokens
+
+MODEL_NAME = "models/gemini-flash-latest"
+
+BACKEND_GEMINI = "gemini"
+BACKEND_STUB = "stub"
+BACKEND_RECORD = "record"
+BACKEND_REPLAY = "replay"
+BACKENDS = (BACKEND_GEMINI, BACKEND_STUB, BACKEND_RECORD, BACKEND_REPLAY)
+
+DEFAULT_BACKEND = os.getenv("ATS_LLM_BACKEND", BACKEND_GEMINI)
+RECORDINGS_PATH = os.getenv("ATS_RECORDINGS_PATH", os.path.join(CACHE_DIR, "recordings.sqlite3"))
+STUB_LATENCY = float(os.getenv("ATS_STUB_LATENCY", "0"))
+STUB_STREAM_CHUNKS = 8
+# Model clients for routed models and Gemini cached contents, kept per backend
+MAX_CACHED_MODELS = 64
+
+
+class ReplayMissError(LookupError):
+    """Raised in replay mode for a request that was never recorded"""
+
+
+def configure_gemini(api_key=None, endpoint=None):
+    """Configure the Gemini client with an API key (defaults to GOOGLE_API_KEY).
+
+    ``endpoint`` (or ATS_GEMINI_ENDPOINT) points the client at another
+    server over REST, e.g. the local stub used for benchmarks.
+    """
+    # The SDK takes about a second to import, so it is only loaded when Gemini is used
+    import google.generativeai as genai
+
+    endpoint = endpoint or os.getenv("ATS_GEMINI_ENDPOINT")
+    if endpoint:
+        genai.configure(
+            api_key=api_key or os.getenv("GOOGLE_API_KEY") or "stub",
+            transport="rest",
+            client_options={"api_endpoint": endpoint}
+        )
+    else:
+        genai.configure(api_key=api_key or os.getenv("GOOGLE_API_KEY"))
+    # Force API version to v1 globally
+    genai._default_version = "v1"
+
+
+def generation_config(response_schema=None):
+    """Request JSON constrained to a schema when the analysis defines one"""
+    if response_schema is None:
+        return None
+    import google.generativeai as genai
+
+    return genai.GenerationConfig(response_mime_type="application/json", response_schema=response_schema)
+
+
+def request_digest(contents, model_id, response_schema=None):
+    """Stable hash of everything that determines a response"""
+    h = hashlib.sha256(model_id.encode("utf-8"))
+    if response_schema is not None:
+        h.update(b"\0schema:" + getattr(response_schema, "__name__", repr(response_schema)).encode("utf-8"))
+    for part in contents:
+        if "text" in part:
+            h.update(b"\0text:" + part["text"].encode("utf-8"))
+        else:
+            h.update(b"\0" + part["mime_type"].encode("utf-8") + b":")
+            h.update(part["data"])
+    return h.hexdigest()
+
+
+def fake_response_text(request_key, json_mode=False):
+    """Deterministic response for a request: schema JSON or a markdown report"""
+    digest = int(hashlib.sha256(request_key.encode("utf-8")).hexdigest()[:8], 16)
+    match = 40 + digest % 55
+    if json_mode:
+        return json.dumps({
+            "match_percentage": match,
+            "ats_score": 50 + digest % 45,
+            "overall_assessment": "Solid backend profile with gaps in cloud infrastructure experience.",
+            "missing_keywords": ["kubernetes", "terraform", "grpc"][: 1 + digest % 3],
+            "strengths": ["Python services at scale", "Clear impact metrics"],
+            "weaknesses": ["Limited leadership examples"],
+            "recommendations": ["Quantify on-call and reliability work", "Add cloud certifications"],
+        })
+    return (
+        f"## Resume Match Report\n\n**Match Percentage:** {match}%\n\n"
+        "### Strengths\n- Relevant backend experience\n- Measurable achievements\n\n"
+        "### Gaps\n- Missing some infrastructure keywords\n\n"
+        "### Recommendations\n- Mirror the job description's terminology\n- Lead bullets with outcomes\n"
+    )
+
+
+class Usage:
+    """Token counts shaped like Gemini's usage_metadata"""
+
+    def __init__(self, prompt_token_count=0, candidates_token_count=0):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+        self.total_token_count = prompt_token_count + candidates_token_count
+
+
+class LLMResponse:
+    """Minimal stand-in for a Gemini response (or stream chunk)"""
+
+    def __init__(self, text, usage_metadata=None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+class StreamedResponse:
+    """Iterable of response chunks that, like Gemini's, carries usage_metadata"""
+
+    def __init__(self, text, usage_metadata=None, chunks=STUB_STREAM_CHUNKS, delay=0.0):
+        step = max(1, -(-len(text) // chunks))
+        self._pieces = [text[i:i + step] for i in range(0, len(text), step)]
+        self._delay = delay
+        self.usage_metadata = usage_metadata
+
+    def __iter__(self):
+        for piece in self._pieces:
+            if self._delay:
+                time.sleep(self._delay)
+            yield LLMResponse(piece)
+
+
+class GeminiBackend:
+    """Google Gemini via one model client reused for every call"""
+
+    name = BACKEND_GEMINI
+    supports_context_cache = True
+
+    def __init__(self, model_name=MODEL_NAME):
+        import google.generativeai as genai
+
+        self.model_id = model_name
+        self.model = genai.GenerativeModel(model_name)
+        self._cached_models = {}
+        self._lock = threading.Lock()
+
+    def create_context_cache(self, prefix, ttl_seconds):
+        """Upload a shared prompt prefix as Gemini cached content and return its name.
+
+        Raises if the model or prefix does not qualify for explicit caching.
+        """
+        import google.generativeai as genai
+        from google.generativeai import caching
+
+        cached = caching.CachedContent.create(
+            model=self.model_id,
+            contents=[{"role": "user", "parts": prefix}],
+            ttl=datetime.timedelta(seconds=ttl_seconds)
+        )
+        self._remember_model(cached.name, genai.GenerativeModel.from_cached_content(cached))
+        return cached.name
+
+    def _remember_model(self, name, model):
+        with self._lock:
+            self._cached_models[name] = model
+            while len(self._cached_models) > MAX_CACHED_MODELS:
+                self._cached_models.pop(next(iter(self._cached_models)))
+
+    def _model_for(self, context, model_name=None):
+        if context is not None and context.handle:
+            model = self._cached_models.get(context.handle)
+            if model is None:
+                import google.generativeai as genai
+                from google.generativeai import caching
+
+                model = genai.GenerativeModel.from_cached_content(caching.CachedContent.get(context.handle))
+                self._remember_model(context.handle, model)
+            return model
+        if model_name is None or model_name == self.model_id:
+            return self.model
+        model = self._cached_models.get(model_name)
+        if model is None:
+            import google.generativeai as genai
+
+            model = genai.GenerativeModel(model_name)
+            self._remember_model(model_name, model)
+        return model
+
+    def generate(self, contents, response_schema=None, context=None, model=None):
+        return self._model_for(context, model).generate_content(
+            contents, generation_config=generation_config(response_schema)
+        )
+
+    def stream(self, contents, response_schema=None, context=None, model=None):
+        return self._model_for(context, model).generate_content(
+            contents, generation_config=generation_config(response_schema), stream=True
+        )
+
+    async def generate_async(self, contents, response_schema=None, context=None, model=None):
+        return await self._model_for(context, model).generate_content_async(
+            contents, generation_config=generation_config(response_schema)
+        )
+
+    def count_tokens(self, contents):
+        return self.model.count_tokens(contents).total_tokens
+
+
+class StubBackend:
+    """Instant, deterministic offline responses for load tests and CI"""
+
+    name = BACKEND_STUB
+    supports_context_cache = False
+
+    def __init__(self, latency=STUB_LATENCY, model_name=MODEL_NAME):
+        self.latency = latency
+        # Distinct identity so stub output never lands in the real analysis cache
+        self.model_id = f"stub:{model_name}"
+
+    def _respond(self, contents, response_schema):
+        text = fake_response_text(request_digest(contents, self.model_id, response_schema),
+                                  json_mode=response_schema is not None)
+        return text, Usage(estimate_tokens(contents), max(1, len(text) // CHARS_PER_TOKEN))
+
+    def generate(self, contents, response_schema=None, context=None, model=None):
+        text, usage = self._respond(contents, response_schema)
+        if self.latency:
+            time.sleep(self.latency)
+        return LLMResponse(text, usage)
+
+    def stream(self, contents, response_schema=None, context=None, model=None):
+        text, usage = self._respond(contents, response_schema)
+        return StreamedResponse(text, usage, delay=self.latency / STUB_STREAM_CHUNKS)
+
+    async def generate_async(self, contents, response_schema=None, context=None, model=None):
+        text, usage = self._respond(contents, response_schema)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return LLMResponse(text, usage)
+
+    def count_tokens(self, contents):
+        return estimate_tokens(contents)
+
+
+class _RecordingStream:
+    """Pass a live stream through and record it once fully consumed"""
+
+    def __init__(self, inner, on_complete):
+        self._inner = inner
+        self._on_complete = on_complete
+        self.usage_metadata = None
+
+    def __iter__(self):
+        chunks = []
+        for chunk in self._inner:
+            chunks.append(chunk.text or "")
+            yield chunk
+        self.usage_metadata = getattr(self._inner, "usage_metadata", None)
+        self._on_complete("".join(chunks), self.usage_metadata)
+
+
+class RecordReplayBackend:
+    """Serve recorded responses, recording misses from an inner backend when given"""
+
+    name = BACKEND_RECORD
+
+    def __init__(self, inner=None, path=RECORDINGS_PATH, model_name=MODEL_NAME):
+        self.inner = inner
+        self.path = path
+        self.model_id = inner.model_id if inner is not None else model_name
+        if inner is None:
+            self.name = BACKEND_REPLAY
+        self._local = threading.local()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS recordings ("
+            " key TEXT PRIMARY KEY,"
+            " model TEXT NOT NULL,"
+            " response TEXT NOT NULL,"
+            " prompt_tokens INTEGER,"
+            " candidates_tokens INTEGER,"
+            " created_at REAL NOT NULL)"
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _lookup(self, key):
+        row = self._conn().execute(
+            "SELECT response, prompt_tokens, candidates_tokens FROM recordings WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            if self.inner is None:
+                raise ReplayMissError(f"No recorded response for request {key[:12]}")
+            return None
+        return row[0], Usage(row[1] or 0, row[2] or 0)
+
+    def _store(self, key, text, usage, model=None):
+        if not text:
+            return
+        self._conn().execute(
+            "INSERT OR REPLACE INTO recordings (key, model, response, prompt_tokens, candidates_tokens, created_at)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (key, model or self.model_id, text,
+             getattr(usage, "prompt_token_count", None), getattr(usage, "candidates_token_count", None),
+             time.time())
+        )
+
+    def _key(self, contents, response_schema, context, model):
+        # A cached prefix is part of the request, so recordings match the uncached form
+        if context is not None and context.handle:
+            contents = [*context.prefix, *contents]
+        return request_digest(contents, model or self.model_id, response_schema)
+
+    @property
+    def supports_context_cache(self):
+        # Replay-only runs have nowhere to create a remote context
+        return self.inner is not None and getattr(self.inner, "supports_context_cache", False)
+
+    def create_context_cache(self, prefix, ttl_seconds):
+        return self.inner.create_context_cache(prefix, ttl_seconds)
+
+    def generate(self, contents, response_schema=None, context=None, model=None):
+        key = self._key(contents, response_schema, context, model)
+        recorded = self._lookup(key)
+        if recorded is not None:
+            return LLMResponse(*recorded)
+        response = self.inner.generate(contents, response_schema, context=context, model=model)
+        self._store(key, response.text, getattr(response, "usage_metadata", None), model)
+        return response
+
+    def stream(self, contents, response_schema=None, context=None, model=None):
+        key = self._key(contents, response_schema, context, model)
+        recorded = self._lookup(key)
+        if recorded is not None:
+            return StreamedResponse(*recorded)
+        return _RecordingStream(
+            self.inner.stream(contents, response_schema, context=context, model=model),
+            lambda text, usage: self._store(key, text, usage, model)
+        )
+
+    async def generate_async(self, contents, response_schema=None, context=None, model=None):
+        key = self._key(contents, response_schema, context, model)
+        recorded = self._lookup(key)
+        if recorded is not None:
+            return LLMResponse(*recorded)
+        response = await self.inner.generate_async(contents, response_schema, context=context, model=model)
+        self._store(key, response.text, getattr(response, "usage_metadata", None), model)
+        return response
+
+    def count_tokens(self, contents):
+        return self.inner.count_tokens(contents) if self.inner is not None else estimate_tokens(contents)
+
+
+def create_backend(name=None, api_key=None, endpoint=None, model_name=MODEL_NAME):
+    """Build a backend by name (defaults to ATS_LLM_BACKEND)"""
+    name = name or DEFAULT_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown LLM backend: {name} (expected one of {', '.join(BACKENDS)})")
+    if name == BACKEND_STUB:
+        return StubBackend(model_name=model_name)
+    if name == BACKEND_REPLAY:
+        return RecordReplayBackend(model_name=model_name)
+    configure_gemini(api_key, endpoint)
+    gemini = GeminiBackend(model_name)
+    return RecordReplayBackend(gemini) if name == BACKEND_RECORD else gemini
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def set_backend(backend):
+    """Install the process-wide backend used by ats_engine"""
+    global _backend
+    with _backend_lock:
+        _backend = backend
+    return backend
+
+
+def configure_backend(name=None, api_key=None, endpoint=None):
+    """Create the named backend and make it the process-wide one"""
+    return set_backend(create_backend(name, api_key=api_key, endpoint=endpoint))
+
+
+def get_backend():
+    """Process-wide backend, created from ATS_LLM_BACKEND on first use"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend()
+    return _backend
@@ -0,0 +1,211 @@
+"""Near-duplicate resume detection with MinHash signatures and LSH banding.
+
+Candidates often re-apply with a lightly edited copy of the same resume.
+Each analyzed resume's text layer gets a MinHash signature (word 5-gram
+shingles, 128 permutations). The signature is split into 16 bands of 8
+rows, and each band hashes to an indexed SQLite bucket. A lookup touches
+only the resumes that share a bucket in some band, so its cost stays flat
+as the index grows to hundreds of thousands of resumes. Candidates are then
+ranked by their estimated Jaccard similarity.
+
+With 16 x 8 banding, pairs above ~0.8 similarity are found almost always.
+Pairs below ~0.5 are rarely even compared.
+"""
+import difflib
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from functools import lru_cache
+
+from analysis_cache import CACHE_DIR
+
+DEFAULT_PATH = os.getenv("ATS_SIGNATURES_PATH", os.path.join(CACHE_DIR, "signatures.sqlite3"))
+DEFAULT_THRESHOLD = float(os.getenv("ATS_NEAR_DUPLICATE_THRESHOLD", "0.9"))
+
+NUM_PERM = 128
+BANDS = 16
+ROWS_PER_BAND = NUM_PERM // BANDS
+SHINGLE_WORDS = 5
+# Buckets shared by boilerplate-heavy resumes can grow large; cap the work per lookup
+MAX_CANDIDATES = 500
+# Bound parameters per IN (...) query (older SQLite builds allow at most 999)
+SQL_BATCH = 500
+MAX_DIFF_LINES = 200
+
+WORD_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#.]*[a-z0-9+#]|[a-z0-9]")
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+
+@lru_cache(maxsize=None)
+def _permutations():
+    """MinHash permutation coefficients (a, b), built on first use"""
+    import numpy as np
+    # Fixed seed: signatures must be comparable across processes and restarts
+    random = np.random.RandomState(1)
+    return (random.randint(1, MERSENNE_PRIME, size=NUM_PERM, dtype=np.uint64),
+            random.randint(0, MERSENNE_PRIME, size=NUM_PERM, dtype=np.uint64))
+
+
+def shingles(text, size=SHINGLE_WORDS):
+    """Set of overlapping word n-grams (the whole text when shorter than n words)"""
+    words = WORD_PATTERN.findall((text or "").lower())
+    if len(words) < size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def minhash(text):
+    """MinHash signature of the text's shingles (None for text without words)"""
+    grams = shingles(text)
+    if not grams:
+        return None
+    import numpy as np
+    perm_a, perm_b = _permutations()
+    hashes = np.fromiter((zlib.crc32(gram.encode("utf-8")) for gram in grams), dtype=np.uint64, count=len(grams))
+    # Multiplication wraps modulo 2**64 before the prime, as in common MinHash implementations
+    with np.errstate(over="ignore"):
+        permuted = (np.outer(hashes, perm_a) + perm_b) % np.uint64(MERSENNE_PRIME) & np.uint64(MAX_HASH)
+    return permuted.min(axis=0).astype(np.uint32)
+
+
+def estimate_jaccard(signature, other):
+    import numpy as np
+    return float(np.count_nonzero(signature == other)) / len(signature)
+
+
+def band_buckets(signature):
+    """One 64-bit bucket id per LSH band"""
+    return [
+        int.from_bytes(
+            hashlib.blake2b(signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND].tobytes(),
+                            digest_size=8).digest(),
+            "little", signed=True
+        )
+        for band in range(BANDS)
+    ]
+
+
+def diff_lines(old_text, new_text, limit=MAX_DIFF_LINES):
+    """Unified diff between two resume texts, truncated to ``limit`` lines"""
+    lines = list(difflib.unified_diff(
+        (old_text or "").splitlines(), (new_text or "").splitlines(),
+        fromfile="earlier resume", tofile="this resume", lineterm="", n=1
+    ))
+    if len(lines) > limit:
+        lines = lines[:limit] + [f"... {len(lines) - limit} more lines"]
+    return lines
+
+
+class SignatureIndex:
+    """Persistent MinHash/LSH index of analyzed resumes, keyed by resume content hash"""
+
+    def __init__(self, path=DEFAULT_PATH, threshold=DEFAULT_THRESHOLD):
+        self.path = path
+        self.threshold = threshold
+        self._local = threading.local()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS signatures ("
+            " resume_hash TEXT PRIMARY KEY,"
+            " signature BLOB NOT NULL,"
+            " text BLOB,"
+            " created_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS lsh_buckets ("
+            " band INTEGER NOT NULL,"
+            " bucket INTEGER NOT NULL,"
+            " resume_hash TEXT NOT NULL,"
+            " PRIMARY KEY (band, bucket, resume_hash)) WITHOUT ROWID"
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM signatures").fetchone()[0]
+
+    def add(self, resume_hash, text):
+        """Index a resume's text layer; returns False when it has no usable text"""
+        signature = minhash(text)
+        if signature is None:
+            return False
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            existing = conn.execute(
+                "SELECT 1 FROM signatures WHERE resume_hash = ?", (resume_hash,)
+            ).fetchone()
+            if existing is None:
+                conn.execute(
+                    "INSERT INTO signatures (resume_hash, signature, text, created_at) VALUES (?, ?, ?, ?)",
+                    (resume_hash, signature.tobytes(), zlib.compress(text.encode("utf-8")), time.time())
+                )
+                conn.executemany(
+                    "INSERT OR IGNORE INTO lsh_buckets (band, bucket, resume_hash) VALUES (?, ?, ?)",
+                    [(band, bucket, resume_hash) for band, bucket in enumerate(band_buckets(signature))]
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return True
+
+    def query(self, text, threshold=None, exclude=None, limit=5):
+        """Indexed resumes similar to ``text`` as [(resume_hash, similarity)], most similar first.
+
+        ``limit=None`` returns every match above the threshold, for callers
+        that filter the matches (e.g. on a cached result) before picking one.
+        """
+        threshold = self.threshold if threshold is None else threshold
+        signature = minhash(text)
+        if signature is None:
+            return []
+        conn = self._conn()
+        candidates = set()
+        for band, bucket in enumerate(band_buckets(signature)):
+            rows = conn.execute(
+                "SELECT resume_hash FROM lsh_buckets WHERE band = ? AND bucket = ? LIMIT ?",
+                (band, bucket, MAX_CANDIDATES)
+            ).fetchall()
+            candidates.update(row[0] for row in rows)
+            if len(candidates) >= MAX_CANDIDATES:
+                break
+        candidates.discard(exclude)
+        if not candidates:
+            return []
+        candidates = list(candidates)
+        rows = []
+        # The last band can push candidates past MAX_CANDIDATES; batches stay under SQLite's variable limit
+        for start in range(0, len(candidates), SQL_BATCH):
+            batch = candidates[start:start + SQL_BATCH]
+            rows += conn.execute(
+                f"SELECT resume_hash, signature FROM signatures WHERE resume_hash IN ({','.join('?' * len(batch))})",
+                batch
+            ).fetchall()
+        import numpy as np
+        matches = []
+        for resume_hash, blob in rows:
+            similarity = estimate_jaccard(signature, np.frombuffer(blob, dtype=np.uint32))
+            if similarity >= threshold:
+                matches.append((resume_hash, similarity))
+        matches.sort(key=lambda match: match[1], reverse=True)
+        return matches if limit is None else matches[:limit]
+
+    def text(self, resume_hash):
+        """Stored text layer of an indexed resume (for diffs), or None"""
+        row = self._conn().execute("SELECT text FROM signatures WHERE resume_hash = ?", (resume_hash,)).fetchone()
+        return zlib.decompress(row[0]).decode("utf-8") if row is not None and row[0] is not None else None
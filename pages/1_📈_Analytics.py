@@ -0,0 +1,123 @@
+"""Analytics over every recorded analysis: score distributions, missing keywords, latency and bulk export"""
+from datetime import date, datetime, timedelta
+
+import streamlit as st
+
+from analysis_prompts import ANALYSIS_OPTIONS
+from results_dataset import EXPORT_FORMATS, ResultsDataset, result_filter
+
+# Aggregates are recomputed at most this often for the same filters
+AGGREGATE_TTL_SECONDS = 60
+
+st.set_page_config(
+    page_title="📈 ATS Analytics",
+    page_icon="📈",
+    layout="wide",
+    initial_sidebar_state="expanded"
+)
+
+@st.cache_resource(show_spinner=False)
+def get_results_dataset():
+    """Columnar results dataset shared by all sessions"""
+    return ResultsDataset()
+
+@st.cache_data(ttl=AGGREGATE_TTL_SECONDS, show_spinner=False)
+def load_overview(filters):
+    dataset = get_results_dataset()
+    dataset.flush()
+    expression = result_filter(**filters)
+    summary, histogram = dataset.score_distribution(expression)
+    return {
+        "analyses": dataset.count(expression),
+        "summary": summary,
+        "histogram": histogram,
+        "keywords": dataset.top_missing_keywords(expression),
+        "latency": dataset.latency_percentiles(expression),
+    }
+
+# === Filters ===
+with st.sidebar:
+    st.markdown("### 🔎 Filters")
+    today = date.today()
+    days = st.date_input("📅 Days (UTC)", value=(today - timedelta(days=30), today))
+    since, until = (days[0], days[-1]) if isinstance(days, (list, tuple)) and days else (None, None)
+    analysis_types = st.multiselect("Analysis Type", [option['title'] for option in ANALYSIS_OPTIONS])
+    jd_hash = st.text_input("Job Description Hash", placeholder="from the table below").strip() or None
+    min_match = st.slider("Minimum Match %", 0, 100, 0, step=5)
+
+filters = {
+    "since": since.isoformat() if since else None,
+    "until": until.isoformat() if until else None,
+    "analysis_types": tuple(analysis_types),
+    "jd_hash": jd_hash,
+    "min_match": min_match or None,
+}
+
+st.markdown("# 📈 Results Analytics")
+st.markdown("<p style='color: #666;'>Aggregates over every recorded analysis, computed from scores and timings only</p>", unsafe_allow_html=True)
+
+with st.spinner("Aggregating results..."):
+    overview = load_overview(filters)
+
+if not overview["analyses"]:
+    st.info("ℹ️ No analyses match these filters yet. Results are recorded when history saving is on, and by the API and batch screening.")
+    st.stop()
+
+summary = overview["summary"]
+st.metric("Analyses", f"{overview['analyses']:,}")
+
+# === Score Distributions ===
+st.markdown("---")
+st.markdown("### 🎯 Score Distribution per Job Description")
+if summary.num_rows:
+    st.caption("The most screened job descriptions, by hash of their normalized text")
+    st.dataframe(summary, use_container_width=True, hide_index=True)
+    selected_jd = st.selectbox("Histogram for", summary["jd_hash"].cast("string").to_pylist(),
+                               format_func=lambda value: value[:12])
+    histogram = overview["histogram"]
+    rows = [row for row in histogram.to_pylist() if row["jd_hash"] == selected_jd]
+    st.bar_chart({"Match %": [row["match_bin"] for row in rows], "Analyses": [row["analyses"] for row in rows]},
+                 x="Match %", y="Analyses")
+else:
+    st.caption("No scored analyses (only Detailed Analysis reports carry scores).")
+
+# === Missing Keywords ===
+st.markdown("---")
+st.markdown("### 🔍 Most Frequently Missing Keywords")
+keywords = overview["keywords"]
+if keywords.num_rows:
+    st.bar_chart({"Keyword": keywords["keyword"].to_pylist(), "Analyses": keywords["count"].to_pylist()},
+                 x="Keyword", y="Analyses")
+    st.dataframe(keywords, use_container_width=True, hide_index=True)
+else:
+    st.caption("No missing keywords recorded.")
+
+# === Latency ===
+st.markdown("---")
+st.markdown("### ⏱️ Latency Percentiles (seconds, cache hits excluded)")
+if overview["latency"]:
+    st.dataframe(overview["latency"], use_container_width=True, hide_index=True)
+else:
+    st.caption("No uncached analyses recorded.")
+
+# === Bulk Export ===
+st.markdown("---")
+st.markdown("### 💾 Bulk Export")
+col_ex1, col_ex2 = st.columns([1, 3])
+with col_ex1:
+    export_format = st.radio("Format", EXPORT_FORMATS, format_func=str.upper, horizontal=True)
+with col_ex2:
+    st.caption(f"Exports the {overview['analyses']:,} analyses matching the filters. Keyword lists are joined with '; ' in CSV.")
+export_key = (export_format, tuple(sorted(filters.items())))
+if st.button("📦 Prepare Export"):
+    with st.spinner("Writing export..."):
+        st.session_state.results_export = (export_key, get_results_dataset().export(result_filter(**filters), export_format))
+prepared = st.session_state.get("results_export")
+if prepared is not None and prepared[0] == export_key:
+    st.download_button(
+        label=f"📥 Download {export_format.upper()}",
+        data=prepared[1],
+        file_name=f"ats_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{export_format}",
+        mime="text/csv" if export_format == "csv" else "application/octet-stream",
+        use_container_width=True
+    )
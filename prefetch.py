@@ -0,0 +1,212 @@
+"""Speculative work started as soon as a resume is uploaded.
+
+The app submits an upload here on the rerun right after ``st.file_uploader``
+returns, well before the recruiter has pasted the job description and
+clicked Run. Results are parked where the real request looks for them:
+
+- Preprocessing fills the shared ``ArtifactCache`` (parts, text layer and
+  sections, keyed by resume hash). A request that arrives mid-way joins the
+  in-flight work through the cache's single-flight table.
+- The optional Quick Scan goes through ``fetch_analysis``, so its response
+  lands in the analysis cache under the key the Run button uses, and a click
+  during the call shares it.
+
+Speculative work is capped so it cannot starve real requests. It runs in a
+pool of its own (ATS_PREFETCH_WORKERS threads, at most
+ATS_PREFETCH_MAX_PENDING queued; more are dropped) and renders pages
+serially instead of on the shared process pool. A Quick Scan is only sent
+while the circuit breaker is closed and ATS_PREFETCH_HEADROOM of the Gemini
+request bucket is free.
+
+Tasks are shared by every session that wants the same work and remember
+those sessions as owners. A session withdraws its claim when its upload or
+job description changes, and the task is cancelled once no owner is left.
+Cancellation takes effect between stages, so a Gemini call that has started
+is allowed to finish; a real request may be waiting on it.
+"""
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from analysis_cache import make_key
+from analysis_prompts import get_analysis_option
+from ats_engine import EXTRACTION_TEXT, analysis_key_variant, analysis_sections, extraction_variant, fetch_analysis
+from instrumentation import METRICS
+from llm_backends import get_backend
+from rate_limit import GEMINI_BREAKER, GEMINI_LIMITER
+
+# 0 disables prefetching
+DEFAULT_WORKERS = int(os.getenv("ATS_PREFETCH_WORKERS", "2"))
+DEFAULT_MAX_PENDING = int(os.getenv("ATS_PREFETCH_MAX_PENDING", "8"))
+# Share of the Gemini request bucket that must be free for a speculative call
+LLM_HEADROOM = float(os.getenv("ATS_PREFETCH_HEADROOM", "0.5"))
+# Default of the app's "Prefetch Quick Scan" toggle
+PREFETCH_QUICK_SCAN = os.getenv("ATS_PREFETCH_QUICK_SCAN", "0") != "0"
+# Finished tasks remembered, so reruns do not resubmit them
+MAX_FINISHED = 256
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+CANCELLED = "cancelled"
+SKIPPED = "skipped"
+FAILED = "failed"
+
+
+class Cancelled(Exception):
+    """Raised inside a task at its next stage once it has been cancelled"""
+
+
+class Skipped(Exception):
+    """Raised when a speculative Gemini call would compete with real requests"""
+
+
+class _Task:
+    def __init__(self, kind):
+        self.kind = kind
+        self.state = QUEUED
+        self.cancelled = threading.Event()
+        self.owners = set()
+        self.future = None
+        self.error = None
+
+    def check(self):
+        if self.cancelled.is_set():
+            raise Cancelled()
+
+
+class Prefetcher:
+    """Capped, cancellable background pool for speculative work, keyed by resume hash"""
+
+    def __init__(self, artifacts, cache, workers=DEFAULT_WORKERS, max_pending=DEFAULT_MAX_PENDING):
+        self.artifacts = artifacts
+        self.cache = cache
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ats-prefetch") if workers > 0 else None
+        self._lock = threading.Lock()
+        self._tasks = OrderedDict()
+        self.counters = {"submitted": 0, "rejected": 0, DONE: 0, CANCELLED: 0, SKIPPED: 0, FAILED: 0}
+
+    @property
+    def enabled(self):
+        return self._executor is not None
+
+    def _submit(self, key, kind, work, owner=None):
+        """Queue work(task) under key unless it is already queued, running or done; returns the key or None"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            task = self._tasks.get(key)
+            if task is not None and task.state in (QUEUED, RUNNING, DONE):
+                task.owners.add(owner)
+                return key
+            if sum(1 for other in self._tasks.values() if other.state == QUEUED) >= self.max_pending:
+                self.counters["rejected"] += 1
+                METRICS.inc("ats_prefetch_total", {"kind": kind, "outcome": "rejected"})
+                return None
+            task = self._tasks[key] = _Task(kind)
+            task.owners.add(owner)
+            self._tasks.move_to_end(key)
+            self.counters["submitted"] += 1
+            task.future = self._executor.submit(self._run, task, work)
+        return key
+
+    def _run(self, task, work):
+        with self._lock:
+            cancelled = task.cancelled.is_set()
+            if not cancelled:
+                task.state = RUNNING
+        if cancelled:
+            self._finish(task, CANCELLED)
+            return
+        try:
+            work(task)
+        except Cancelled:
+            self._finish(task, CANCELLED)
+        except Skipped:
+            self._finish(task, SKIPPED)
+        except Exception as e:
+            task.error = str(e)
+            self._finish(task, FAILED)
+        else:
+            self._finish(task, DONE)
+
+    def _finish(self, task, state):
+        with self._lock:
+            task.state = state
+            self.counters[state] += 1
+            # Forget the oldest finished tasks; queued and running ones are always kept
+            finished = [key for key, other in self._tasks.items() if other.state not in (QUEUED, RUNNING)]
+            for key in finished[:max(0, len(finished) - MAX_FINISHED)]:
+                del self._tasks[key]
+        METRICS.inc("ats_prefetch_total", {"kind": task.kind, "outcome": state})
+
+    def cancel(self, keys, owner=None):
+        """Withdraw owner's claim on tasks and cancel those no other owner wants.
+
+        Running tasks stop at their next stage.
+        """
+        dropped = []
+        with self._lock:
+            for key in keys:
+                task = self._tasks.get(key)
+                if task is None:
+                    continue
+                task.owners.discard(owner)
+                if task.owners or task.state not in (QUEUED, RUNNING):
+                    continue
+                task.cancelled.set()
+                # A queued task that never starts is finished here instead of in _run
+                if task.future.cancel():
+                    dropped.append(task)
+        for task in dropped:
+            self._finish(task, CANCELLED)
+
+    def preprocess(self, resume_digest, load_bytes, mode=EXTRACTION_TEXT, raster=None, owner=None):
+        """Fill the artifact cache for an upload: parts for these settings, text layer and sections"""
+        def work(task):
+            self.artifacts.parts(resume_digest, load_bytes, mode, raster, parallel=False)
+            task.check()
+            self.artifacts.text(resume_digest, load_bytes)
+            task.check()
+            self.artifacts.sections(resume_digest, load_bytes)
+        return self._submit(f"{resume_digest}:preprocess:{extraction_variant(mode, raster)}", "preprocess", work, owner)
+
+    def quick_scan(self, resume_digest, load_bytes, input_text, mode=EXTRACTION_TEXT, raster=None, owner=None):
+        """Run a Quick Scan before it is asked for, if Gemini has capacity to spare"""
+        option = get_analysis_option("Quick Scan")
+        variant = extraction_variant(mode, raster)
+        sections = analysis_sections(option, mode)
+        cache_key = make_key(resume_digest, input_text, option["prompt"], get_backend().model_id,
+                             analysis_key_variant(variant, option.get("response_schema"), sections))
+
+        def work(task):
+            if self.cache.peek(cache_key) is not None:
+                return
+            parts = self.artifacts.parts(resume_digest, load_bytes, mode, raster, parallel=False)["parts"]
+            segmentation = self.artifacts.sections(resume_digest, load_bytes) if sections else None
+            task.check()
+            if GEMINI_BREAKER.state != "closed" or GEMINI_LIMITER.headroom() < LLM_HEADROOM:
+                raise Skipped()
+            fetch_analysis(
+                self.cache, input_text, parts, option["prompt"], resume_digest, variant=variant,
+                response_schema=option.get("response_schema"), analysis_type=option["title"], sections=sections,
+                segmentation=segmentation, count_lookup=False
+            )
+        return self._submit(f"{resume_digest}:quick_scan:{cache_key}", "quick_scan", work, owner)
+
+    def status(self, key):
+        with self._lock:
+            task = self._tasks.get(key)
+            return None if task is None else task.state
+
+    def stats(self):
+        with self._lock:
+            states = [task.state for task in self._tasks.values()]
+        return {
+            **self.counters,
+            "enabled": self.enabled,
+            "queued": states.count(QUEUED),
+            "running": states.count(RUNNING),
+        }
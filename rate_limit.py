@@ -0,0 +1,469 @@
+"""Process-wide flow control for Gemini calls.
+
+All Streamlit sessions (threads) and batch coroutines in a process share
+one token-bucket limiter (requests and tokens per minute), one circuit
+breaker and one single-flight table, so identical concurrent requests
+share a single upstream call and quota errors back off instead of
+cascading. ``flow_stats()`` exposes queue depth and wait times for sizing
+the quota.
+"""
+import asyncio
+import os
+import random
+import re
+import threading
+import time
+
+from instrumentation import add_stage_time
+
+REQUESTS_PER_MINUTE = int(os.getenv("ATS_GEMINI_RPM", "60"))
+TOKENS_PER_MINUTE = int(os.getenv("ATS_GEMINI_TPM", "1000000"))
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+BREAKER_FAILURES = int(os.getenv("ATS_BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN = float(os.getenv("ATS_BREAKER_COOLDOWN", "30"))
+
+# Gemini bills roughly this many tokens per image part
+IMAGE_TOKENS = 258
+CHARS_PER_TOKEN = 4
+
+RETRY_AFTER_PATTERN = re.compile(r"retry in ([0-9.]+)\s*s", re.IGNORECASE)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without calling Gemini while the circuit breaker is open"""
+
+
+def estimate_tokens(contents):
+    """Rough input token count for request contents, used to charge the bucket"""
+    tokens = 0
+    for part in contents:
+        if "text" in part:
+            tokens += len(part["text"]) // CHARS_PER_TOKEN + 1
+        else:
+            tokens += IMAGE_TOKENS
+    return tokens
+
+
+_transport_errors = None
+
+
+def _transport_error_types():
+    """Connection and timeout errors of the HTTP clients the SDK may use (only those installed)"""
+    global _transport_errors
+    if _transport_errors is None:
+        types = [ConnectionError, TimeoutError]
+        try:
+            import requests
+            types += [requests.exceptions.ConnectionError, requests.exceptions.Timeout]
+        except ImportError:
+            pass
+        try:
+            import httpx
+            types.append(httpx.TransportError)
+        except ImportError:
+            pass
+        _transport_errors = tuple(types)
+    return _transport_errors
+
+
+def is_retryable(error):
+    """Quota, server and transport errors are retried; anything else is not.
+
+    Blocked or empty responses (ValueError), replay misses and programming
+    errors fail at once instead of backing off and tripping the breaker.
+    """
+    if isinstance(error, CircuitOpenError):
+        return False
+    from google.api_core import exceptions as google_exceptions
+    # ServerError covers ServiceUnavailable and DeadlineExceeded (504)
+    if isinstance(error, (google_exceptions.TooManyRequests, google_exceptions.ResourceExhausted,
+                          google_exceptions.ServerError, google_exceptions.RetryError)):
+        return True
+    return isinstance(error, _transport_error_types())
+
+
+def upstream_answered(error):
+    """Whether a non-retryable error is an answer from the API (a 4xx or a blocked response).
+
+    Anything else (replay misses, local bugs) says nothing about upstream
+    health, so it must not close a half-open breaker.
+    """
+    from google.api_core import exceptions as google_exceptions
+    return isinstance(error, (google_exceptions.GoogleAPICallError, ValueError))
+
+
+def is_rate_limited(error):
+    from google.api_core import exceptions as google_exceptions
+    return isinstance(error, (google_exceptions.TooManyRequests, google_exceptions.ResourceExhausted))
+
+
+def retry_after(error):
+    """Server-suggested delay in seconds for a 429, if the error carries one"""
+    for detail in getattr(error, "details", None) or []:
+        delay = getattr(detail, "retry_delay", None)
+        if delay is not None and hasattr(delay, "seconds"):
+            return delay.seconds + getattr(delay, "nanos", 0) / 1e9
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    if headers.get("Retry-After"):
+        try:
+            return float(headers["Retry-After"])
+        except ValueError:
+            pass
+    match = RETRY_AFTER_PATTERN.search(str(error))
+    return float(match.group(1)) if match else None
+
+
+def backoff_delay(attempt, suggested=None):
+    """Exponential backoff with full jitter, never shorter than a server hint"""
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+    if suggested is not None:
+        delay = max(delay, suggested)
+    return min(delay, BACKOFF_MAX)
+
+
+class TokenBucketLimiter:
+    """Requests-per-minute and tokens-per-minute buckets shared by threads and coroutines"""
+
+    def __init__(self, requests_per_minute=REQUESTS_PER_MINUTE, tokens_per_minute=TOKENS_PER_MINUTE):
+        self.request_capacity = float(requests_per_minute)
+        self.token_capacity = float(tokens_per_minute)
+        self._requests = self.request_capacity
+        self._tokens = self.token_capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.waiting = 0
+        self.acquired = 0
+        self.waited = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def _try_acquire(self, tokens):
+        """Take capacity if available; otherwise return seconds until it will be"""
+        tokens = min(tokens, self.token_capacity)
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._updated
+            self._updated = now
+            self._requests = min(self.request_capacity, self._requests + elapsed * self.request_capacity / 60)
+            self._tokens = min(self.token_capacity, self._tokens + elapsed * self.token_capacity / 60)
+            if self._requests >= 1 and self._tokens >= tokens:
+                self._requests -= 1
+                self._tokens -= tokens
+                return 0.0
+            request_wait = max(0.0, 1 - self._requests) * 60 / self.request_capacity
+            token_wait = max(0.0, tokens - self._tokens) * 60 / self.token_capacity
+            return max(request_wait, token_wait)
+
+    def _record(self, waited):
+        with self._lock:
+            self.acquired += 1
+            if waited > 0:
+                self.waited += 1
+                self.total_wait_seconds += waited
+                self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+    def acquire(self, tokens=0):
+        """Block the calling thread until the request fits in both buckets"""
+        start = time.monotonic()
+        wait = self._try_acquire(tokens)
+        queued = bool(wait)
+        if wait:
+            with self._lock:
+                self.waiting += 1
+            try:
+                while wait:
+                    time.sleep(min(wait, 1.0))
+                    wait = self._try_acquire(tokens)
+            finally:
+                with self._lock:
+                    self.waiting -= 1
+        waited = time.monotonic() - start if queued else 0.0
+        self._record(waited)
+        return waited
+
+    async def acquire_async(self, tokens=0):
+        """Async variant of acquire for batch coroutines"""
+        start = time.monotonic()
+        wait = self._try_acquire(tokens)
+        queued = bool(wait)
+        if wait:
+            with self._lock:
+                self.waiting += 1
+            try:
+                while wait:
+                    await asyncio.sleep(min(wait, 1.0))
+                    wait = self._try_acquire(tokens)
+            finally:
+                with self._lock:
+                    self.waiting -= 1
+        waited = time.monotonic() - start if queued else 0.0
+        self._record(waited)
+        return waited
+
+    def headroom(self):
+        """Share of the request bucket free right now; 0 while any caller is waiting"""
+        with self._lock:
+            if self.waiting:
+                return 0.0
+            elapsed = time.monotonic() - self._updated
+            requests = min(self.request_capacity, self._requests + elapsed * self.request_capacity / 60)
+            return requests / self.request_capacity
+
+    def refund(self, tokens):
+        """Give back tokens when the actual usage was lower than estimated"""
+        with self._lock:
+            self._tokens = min(self.token_capacity, self._tokens + tokens)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queue_depth": self.waiting,
+                "requests_available": round(self._requests, 2),
+                "tokens_available": int(self._tokens),
+                "acquired": self.acquired,
+                "waited": self.waited,
+                "avg_wait_seconds": round(self.total_wait_seconds / self.acquired, 3) if self.acquired else 0.0,
+                "max_wait_seconds": round(self.max_wait_seconds, 3),
+                "requests_per_minute": int(self.request_capacity),
+                "tokens_per_minute": int(self.token_capacity),
+            }
+
+
+class CircuitBreaker:
+    """Fail fast after repeated upstream failures, probing again after a cooldown"""
+
+    def __init__(self, failure_threshold=BREAKER_FAILURES, cooldown=BREAKER_COOLDOWN):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._probes = 0
+        self._lock = threading.Lock()
+        self.trips = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.cooldown:
+                return "half-open"
+            return "open"
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call is allowed right now.
+
+        Returns a probe token when this call is the half-open probe, else
+        None. Pass it to release_probe() when the call ends.
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return None
+            remaining = self.cooldown - (time.monotonic() - self._opened_at)
+            if remaining > 0 or self._probing:
+                raise CircuitOpenError(
+                    f"Gemini is failing repeatedly; pausing requests for {max(remaining, 0):.0f}s"
+                )
+            # Half-open: let exactly one probe through
+            self._probing = True
+            self._probes += 1
+            return self._probes
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def release_probe(self, token):
+        """End this call's probe if it finished without an outcome (cancelled or interrupted)"""
+        with self._lock:
+            if token is not None and token == self._probes:
+                self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._probing:
+                    self.trips += 1
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def stats(self):
+        state = self.state
+        with self._lock:
+            return {"state": state, "consecutive_failures": self._failures, "trips": self.trips}
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesce identical concurrent requests into one upstream call"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._async_calls = {}
+        self.coalesced = 0
+
+    def begin(self, key):
+        """Return (is_leader, call). Followers wait on call; leaders must finish()"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                return False, call
+            call = self._calls[key] = _Call()
+            return True, call
+
+    def finish(self, key, result=None, error=None):
+        with self._lock:
+            call = self._calls.pop(key)
+        call.result = result
+        call.error = error
+        call.event.set()
+
+    @staticmethod
+    def wait(call):
+        call.event.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def do(self, key, fn):
+        """Run fn() once per key among concurrent callers in this process"""
+        leader, call = self.begin(key)
+        if not leader:
+            return self.wait(call)
+        try:
+            result = fn()
+        except BaseException as e:
+            # Interrupts (Streamlit reruns, KeyboardInterrupt) must release followers too
+            self.finish(key, error=e if isinstance(e, Exception) else RuntimeError("Shared request was interrupted"))
+            raise
+        self.finish(key, result=result)
+        return result
+
+    async def do_async(self, key, coro_fn):
+        """Async variant of do(); only coroutines on the same event loop share a call"""
+        loop = asyncio.get_running_loop()
+        # Futures belong to the loop that created them, so flights are keyed by loop too
+        flight = (loop, key)
+        with self._lock:
+            future = self._async_calls.get(flight)
+            leader = future is None
+            if leader:
+                future = self._async_calls[flight] = loop.create_future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return await asyncio.shield(future)
+        try:
+            result = await coro_fn()
+        except BaseException as e:
+            # A cancelled leader must not leave followers awaiting forever
+            future.set_exception(e if isinstance(e, Exception) else RuntimeError("Shared request was cancelled"))
+            # Mark retrieved so an unawaited follower-less future does not warn
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._async_calls.pop(flight, None)
+
+    def stats(self):
+        with self._lock:
+            return {"in_flight": len(self._calls) + len(self._async_calls), "coalesced": self.coalesced}
+
+
+GEMINI_LIMITER = TokenBucketLimiter()
+GEMINI_BREAKER = CircuitBreaker()
+GEMINI_FLIGHTS = SingleFlight()
+RETRY_STATS = {"retries": 0, "rate_limited": 0}
+
+
+def flow_stats():
+    """Snapshot of limiter, breaker and coalescing state for Debug Mode"""
+    return {
+        "limiter": GEMINI_LIMITER.stats(),
+        "circuit_breaker": GEMINI_BREAKER.stats(),
+        "single_flight": GEMINI_FLIGHTS.stats(),
+        **RETRY_STATS,
+    }
+
+
+def record_upstream_failure(error):
+    """Count a failed upstream attempt towards the breaker and retry stats"""
+    GEMINI_BREAKER.record_failure()
+    RETRY_STATS["retries"] += 1
+    if is_rate_limited(error):
+        RETRY_STATS["rate_limited"] += 1
+
+
+def call_with_retries(fn, tokens, max_retries=3):
+    """Run fn() under the shared limiter and breaker, retrying with backoff"""
+    for attempt in range(max_retries):
+        probe = GEMINI_BREAKER.before_call()
+        try:
+            add_stage_time("gemini_queue", GEMINI_LIMITER.acquire(tokens))
+            result = fn()
+        except Exception as e:
+            if not is_retryable(e):
+                if upstream_answered(e):
+                    # The API answered, so upstream is healthy even if the request was bad
+                    GEMINI_BREAKER.record_success()
+                else:
+                    GEMINI_BREAKER.release_probe(probe)
+                raise
+            record_upstream_failure(e)
+            if attempt == max_retries - 1:
+                raise
+            delay = backoff_delay(attempt, retry_after(e))
+            add_stage_time("gemini_backoff", delay)
+            time.sleep(delay)
+        except BaseException:
+            GEMINI_BREAKER.release_probe(probe)
+            raise
+        else:
+            GEMINI_BREAKER.record_success()
+            return result
+
+
+async def call_with_retries_async(coro_fn, tokens, max_retries=3):
+    """Async variant of call_with_retries"""
+    for attempt in range(max_retries):
+        probe = GEMINI_BREAKER.before_call()
+        try:
+            add_stage_time("gemini_queue", await GEMINI_LIMITER.acquire_async(tokens))
+            result = await coro_fn()
+        except Exception as e:
+            if not is_retryable(e):
+                if upstream_answered(e):
+                    # The API answered, so upstream is healthy even if the request was bad
+                    GEMINI_BREAKER.record_success()
+                else:
+                    GEMINI_BREAKER.release_probe(probe)
+                raise
+            record_upstream_failure(e)
+            if attempt == max_retries - 1:
+                raise
+            delay = backoff_delay(attempt, retry_after(e))
+            add_stage_time("gemini_backoff", delay)
+            await asyncio.sleep(delay)
+        except BaseException:
+            GEMINI_BREAKER.release_probe(probe)
+            raise
+        else:
+            GEMINI_BREAKER.record_success()
+            return result
@@ -0,0 +1,211 @@
+"""Token budgeting and model routing decided before each Gemini call.
+
+``plan_request`` estimates the input tokens of a request and trims it to
+ATS_INPUT_TOKEN_BUDGET:
+
+- A long job description keeps its most keyword-dense lines.
+- Resume parts are kept in page order until the budget runs out, with the
+  last text part cut short.
+
+It then picks a model tier from the analysis type, the request size and
+the latency each model has shown recently against ATS_LATENCY_SLO.
+
+Estimates are multiplied by a per-model calibration factor learned from
+Gemini's reported prompt token counts, so budgets stay honest when the
+chars-per-token or per-image heuristics drift. Trimming uses the largest
+factor among the tier models, since routing is only decided afterwards. Estimated and actual
+counts also go into the request trace and Prometheus metrics.
+"""
+import os
+import re
+import threading
+
+from jd_context import get_jd_profile
+from llm_backends import MODEL_NAME
+from rate_limit import CHARS_PER_TOKEN, estimate_tokens
+
+DEFAULT_INPUT_BUDGET = int(os.getenv("ATS_INPUT_TOKEN_BUDGET", "16000"))
+# Share of the budget the job description may use before it is trimmed
+JD_BUDGET_SHARE = 0.3
+LATENCY_SLO_SECONDS = float(os.getenv("ATS_LATENCY_SLO", "30"))
+ROUTING_ENABLED = os.getenv("ATS_MODEL_ROUTING", "1") != "0"
+
+TIER_FAST = "fast"
+TIER_STANDARD = "standard"
+# Fastest first
+TIERS = (TIER_FAST, TIER_STANDARD)
+TIER_MODELS = {
+    TIER_FAST: os.getenv("ATS_MODEL_FAST", "models/gemini-flash-lite-latest"),
+    # The backend's default model, which cached prompt prefixes are created for
+    TIER_STANDARD: MODEL_NAME,
+}
+ANALYSIS_TIERS = {
+    "Quick Scan": TIER_FAST,
+    "Detailed Analysis": TIER_STANDARD,
+    "Improvement Pro": TIER_STANDARD,
+}
+# Requests this large go to at least the standard tier
+LARGE_REQUEST_TOKENS = 8000
+
+# Weight of the newest observation in the moving averages
+EWMA_ALPHA = 0.2
+JD_PRIORITY_PATTERN = re.compile(
+    r"\b(?:require[sd]?|must|minimum|qualifications?|experience|years?|degree|proficien\w*|skills?)\b",
+    re.IGNORECASE
+)
+TRUNCATION_MARKER = "\n[... resume truncated to fit the token budget ...]"
+# A truncated page shorter than this is dropped instead
+MIN_TRUNCATED_CHARS = 200
+
+
+class ModelStats:
+    """Moving averages per model: token estimate calibration and latency per 1k tokens"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._token_ratio = {}
+        self._seconds_per_ktoken = {}
+
+    def token_ratio(self, model):
+        with self._lock:
+            return self._token_ratio.get(model, 1.0)
+
+    def observe_tokens(self, model, estimated, actual):
+        if not estimated or not actual:
+            return
+        with self._lock:
+            previous = self._token_ratio.get(model)
+            ratio = actual / estimated
+            self._token_ratio[model] = ratio if previous is None else previous + EWMA_ALPHA * (ratio - previous)
+
+    def observe_latency(self, model, tokens, seconds):
+        if not tokens:
+            return
+        with self._lock:
+            previous = self._seconds_per_ktoken.get(model)
+            rate = seconds / (tokens / 1000)
+            self._seconds_per_ktoken[model] = rate if previous is None else previous + EWMA_ALPHA * (rate - previous)
+
+    def predicted_seconds(self, model, tokens):
+        """Expected latency for a request of this size, or None before any observation"""
+        with self._lock:
+            rate = self._seconds_per_ktoken.get(model)
+        return None if rate is None else rate * tokens / 1000
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "token_ratio": {model: round(v, 3) for model, v in self._token_ratio.items()},
+                "seconds_per_1k_tokens": {model: round(v, 3) for model, v in self._seconds_per_ktoken.items()},
+            }
+
+
+MODEL_STATS = ModelStats()
+
+
+def trim_job_description(jd_text, max_tokens):
+    """Keep the JD lines that carry the most requirements and keywords, in their original order"""
+    if estimate_tokens([{"text": jd_text}]) <= max_tokens:
+        return jd_text, False
+    keywords = get_jd_profile(jd_text)["keywords"]
+    lines = [line for line in jd_text.splitlines() if line.strip()]
+
+    def score(line):
+        words = line.lower().split()
+        hits = sum(1 for word in words if word.strip(".,;:()") in keywords)
+        return (hits + 2 * len(JD_PRIORITY_PATTERN.findall(line))) / (len(words) + 1)
+
+    budget_chars = max_tokens * CHARS_PER_TOKEN
+    keep = set()
+    used = 0
+    for index in sorted(range(len(lines)), key=lambda i: score(lines[i]), reverse=True):
+        if used + len(lines[index]) + 1 > budget_chars:
+            continue
+        keep.add(index)
+        used += len(lines[index]) + 1
+    return "\n".join(lines[i] for i in sorted(keep)), True
+
+
+def trim_resume_parts(pdf_content, max_tokens):
+    """Resume parts in page order until the budget is used; the last text part is cut short"""
+    if estimate_tokens(pdf_content) <= max_tokens:
+        return pdf_content, False
+    trimmed = []
+    remaining = max_tokens
+    for part in pdf_content:
+        cost = estimate_tokens([part])
+        if cost <= remaining:
+            trimmed.append(part)
+            remaining -= cost
+            continue
+        # estimate_tokens charges one token per part on top of its characters
+        keep_chars = (remaining - 1) * CHARS_PER_TOKEN - len(TRUNCATION_MARKER)
+        if "text" in part and keep_chars >= MIN_TRUNCATED_CHARS:
+            trimmed.append({"text": part["text"][:keep_chars] + TRUNCATION_MARKER})
+        break
+    # Never send an empty resume; the first part goes even if it alone is over budget
+    return trimmed or pdf_content[:1], True
+
+
+def route_model(analysis_type, tokens, slo_seconds=LATENCY_SLO_SECONDS):
+    """Pick (tier, model, reason) for a request of this type and size"""
+    if not ROUTING_ENABLED:
+        return TIER_STANDARD, TIER_MODELS[TIER_STANDARD], "routing disabled"
+    tier = ANALYSIS_TIERS.get(analysis_type, TIER_STANDARD)
+    reason = f"{analysis_type or 'default'} analysis"
+    if tier == TIER_FAST and tokens > LARGE_REQUEST_TOKENS:
+        tier = TIER_STANDARD
+        reason = f"large request ({tokens} tokens)"
+    # Step down to faster tiers while the chosen one is predicted to miss the SLO
+    while tier != TIERS[0]:
+        predicted = MODEL_STATS.predicted_seconds(TIER_MODELS[tier], tokens)
+        if predicted is None or predicted <= slo_seconds:
+            break
+        reason = f"{tier} predicted {predicted:.1f}s > {slo_seconds:g}s SLO"
+        tier = TIERS[TIERS.index(tier) - 1]
+    return tier, TIER_MODELS[tier], reason
+
+
+def plan_request(input_text, pdf_content, prompt, analysis_type=None, budget=DEFAULT_INPUT_BUDGET):
+    """Trim a request to the input token budget and choose its model.
+
+    Returns a dict with the (possibly trimmed) ``input_text`` and
+    ``pdf_content``, the routed ``model`` and the token estimates.
+    """
+    # Budgets are in real tokens, so the heuristic is scaled by a learned ratio. The model is
+    # only known after trimming (large Quick Scans escalate, slow tiers step down), so the
+    # highest ratio of any tier model is used and the budget holds whichever one answers.
+    ratio = max(MODEL_STATS.token_ratio(model) for model in set(TIER_MODELS.values()))
+    raw_budget = int(budget / ratio)
+    prompt_tokens = estimate_tokens([{"text": prompt}])
+    original_tokens = estimate_tokens([{"text": input_text}, {"text": prompt}, *pdf_content])
+
+    trimmed = []
+    jd_text, jd_trimmed = trim_job_description(input_text, int(raw_budget * JD_BUDGET_SHARE))
+    if jd_trimmed:
+        trimmed.append("job_description")
+    jd_tokens = estimate_tokens([{"text": jd_text}])
+    parts, parts_trimmed = trim_resume_parts(pdf_content, max(0, raw_budget - jd_tokens - prompt_tokens))
+    if parts_trimmed:
+        trimmed.append("resume")
+
+    estimated = jd_tokens + prompt_tokens + estimate_tokens(parts)
+    tier, model, reason = route_model(analysis_type, int(estimated * ratio))
+    return {
+        "input_text": jd_text,
+        "pdf_content": parts,
+        "model": model,
+        "tier": tier,
+        "route_reason": reason,
+        "budget": budget,
+        "original_tokens": original_tokens,
+        # Raw heuristic (what the limiter charges) and the calibrated prediction of Gemini's count
+        "estimated_tokens": estimated,
+        "predicted_tokens": int(estimated * MODEL_STATS.token_ratio(model)),
+        "trimmed": trimmed,
+    }
+
+
+def plan_summary(plan):
+    """The plan without its payload, for traces and debug output"""
+    return {key: value for key, value in plan.items() if key not in ("input_text", "pdf_content")}
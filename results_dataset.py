@@ -0,0 +1,426 @@
+"""Columnar dataset of analysis results for analytics and bulk export.
+
+Every finished analysis appends one small row of scores, keywords,
+timings and hashes (never the response text) to a Parquet dataset,
+partitioned by day. Rows are first appended to a JSON-lines spool. Once
+the spool reaches ATS_RESULTS_FLUSH_KB, or a reader asks for fresh data,
+it is atomically renamed and written out as a new Parquet file, so
+several processes (app, API server, batch runs) can share one dataset.
+
+Aggregates scan only the columns they need, batch by batch, with Arrow
+compute kernels, so they stay cheap with millions of rows. Run
+``python results_dataset.py compact`` now and then to merge the small
+files produced by frequent flushes. Each merge first records the files
+it replaces in a manifest, so a compaction that dies before removing
+them is ignored by readers and finished by the next run.
+"""
+import argparse
+import glob
+import io
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from functools import lru_cache
+
+from analysis_cache import CACHE_DIR
+from history_store import jd_hash
+
+DEFAULT_PATH = os.getenv("ATS_RESULTS_PATH", os.path.join(CACHE_DIR, "results"))
+FLUSH_BYTES = int(os.getenv("ATS_RESULTS_FLUSH_KB", "256")) * 1024
+# A spool claimed by a flush that never finished (crashed process) is picked up after this long
+STALE_SPOOL_SECONDS = 300
+
+# Low-cardinality columns stay dictionary-encoded in memory when scanned
+DICTIONARY_COLUMNS = ["source", "analysis_type", "model", "jd_hash"]
+LIST_COLUMNS = ("missing_keywords", "strengths")
+EXPORT_FORMATS = ("csv", "parquet")
+LATENCY_QUANTILES = (0.5, 0.9, 0.99)
+# Leading "_" keeps compaction manifests out of dataset scans
+MANIFEST_PREFIX = "_compacted-"
+
+
+@lru_cache(maxsize=None)
+def _schema():
+    # pyarrow is imported on first use: the app and API server only append rows until a flush
+    import pyarrow as pa
+    return pa.schema([
+        ("created_at", pa.timestamp("ms", tz="UTC")),
+        ("source", pa.string()),
+        ("analysis_type", pa.string()),
+        ("model", pa.string()),
+        ("resume_hash", pa.string()),
+        ("jd_hash", pa.string()),
+        ("resume_name", pa.string()),
+        ("match_percentage", pa.int16()),
+        ("ats_score", pa.int16()),
+        ("keyword_score", pa.int16()),
+        ("missing_keywords", pa.list_(pa.string())),
+        ("strengths", pa.list_(pa.string())),
+        ("cached", pa.bool_()),
+        ("near_duplicate", pa.bool_()),
+        ("ttft_seconds", pa.float32()),
+        ("total_seconds", pa.float32()),
+        ("queue_seconds", pa.float32()),
+        ("estimated_tokens", pa.int32()),
+    ])
+
+
+@lru_cache(maxsize=None)
+def _partitioning():
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    return ds.partitioning(pa.schema([("day", pa.string())]), flavor="hive")
+
+
+def _score(value):
+    try:
+        return max(0, min(100, int(value))) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _strings(values):
+    return [str(value).strip() for value in values if str(value).strip()] if isinstance(values, list) else None
+
+
+def result_row(analysis_type, structured=None, timing=None, resume_hash=None, input_text=None, source="app",
+               resume_name=None, keyword_score=None):
+    """Dataset row for one finished analysis"""
+    structured = structured or {}
+    timing = timing or {}
+    created_at = time.time()
+    return {
+        "created_at": int(created_at * 1000),
+        "day": datetime.fromtimestamp(created_at, timezone.utc).strftime("%Y-%m-%d"),
+        "source": source,
+        "analysis_type": analysis_type,
+        "model": timing.get("model"),
+        "resume_hash": resume_hash,
+        "jd_hash": jd_hash(input_text) if input_text is not None else None,
+        "resume_name": resume_name,
+        "match_percentage": _score(structured.get("match_percentage")),
+        "ats_score": _score(structured.get("ats_score")),
+        "keyword_score": _score(keyword_score),
+        "missing_keywords": _strings(structured.get("missing_keywords")),
+        "strengths": _strings(structured.get("strengths")),
+        "cached": bool(timing.get("cached")) if "cached" in timing else None,
+        "near_duplicate": "near_duplicate_of" in timing,
+        "ttft_seconds": timing.get("ttft_seconds"),
+        "total_seconds": timing.get("total_seconds"),
+        "queue_seconds": timing.get("queue_seconds"),
+        "estimated_tokens": timing.get("estimated_tokens"),
+    }
+
+
+def _renamed(table, names):
+    """Rename aggregate columns by name (group_by output column order differs between pyarrow versions)"""
+    return table.rename_columns([names.get(name, name) for name in table.column_names])
+
+
+def result_filter(since=None, until=None, analysis_types=None, jd_hash=None, min_match=None, source=None):
+    """Dataset filter expression; ``since``/``until`` are inclusive YYYY-MM-DD days (pruning whole partitions)"""
+    import pyarrow.compute as pc
+    expression = None
+    clauses = []
+    if since:
+        clauses.append(pc.field("day") >= str(since))
+    if until:
+        clauses.append(pc.field("day") <= str(until))
+    if analysis_types:
+        clauses.append(pc.field("analysis_type").isin(list(analysis_types)))
+    if jd_hash:
+        clauses.append(pc.field("jd_hash") == jd_hash)
+    if min_match:
+        clauses.append(pc.field("match_percentage") >= min_match)
+    if source:
+        clauses.append(pc.field("source") == source)
+    for clause in clauses:
+        expression = clause if expression is None else expression & clause
+    return expression
+
+
+class ResultsDataset:
+    """Append-only Parquet dataset of analysis results with vectorized aggregates"""
+
+    def __init__(self, path=DEFAULT_PATH, flush_bytes=FLUSH_BYTES):
+        self.path = path
+        self.spool_path = f"{path}.pending.jsonl"
+        self.flush_bytes = flush_bytes
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def append(self, row):
+        """Add a row from result_row(); it reaches Parquet at the next flush"""
+        line = json.dumps(row, ensure_ascii=False) + "\n"
+        with self._lock:
+            # One write call per row keeps lines whole when several processes append
+            with open(self.spool_path, "a", encoding="utf-8") as f:
+                f.write(line)
+                size = f.tell()
+        if size >= self.flush_bytes:
+            self.flush()
+
+    def flush(self):
+        """Write spooled rows to a new Parquet file per day; returns the number of rows written"""
+        with self._lock:
+            claimed = f"{self.spool_path}.{os.getpid()}.{uuid.uuid4().hex}.flushing"
+            try:
+                os.replace(self.spool_path, claimed)
+                # The rename keeps the last append's mtime; mark the claim so it is not taken for stale
+                os.utime(claimed)
+                spools = [claimed]
+            except FileNotFoundError:
+                spools = []
+            cutoff = time.time() - STALE_SPOOL_SECONDS
+            spools += [path for path in glob.glob(f"{glob.escape(self.spool_path)}.*.flushing")
+                       if path != claimed and os.path.getmtime(path) < cutoff]
+            written = 0
+            for spool in spools:
+                written += self._write_spool(spool)
+            return written
+
+    def _write_spool(self, spool):
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        rows = []
+        try:
+            with open(spool, encoding="utf-8") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            # Another process recovered this stale spool first
+            return 0
+        for line in lines:
+            try:
+                rows.append(json.loads(line))
+            except ValueError:
+                # A torn last line from a killed writer; the rest of the spool is still good
+                continue
+        if rows:
+            table = pa.Table.from_pylist(rows, schema=_schema().append(pa.field("day", pa.string())))
+            ds.write_dataset(
+                table, self.path, format="parquet", partitioning=_partitioning(),
+                basename_template=f"part-{int(time.time())}-{uuid.uuid4().hex[:8]}-{{i}}.parquet",
+                existing_data_behavior="overwrite_or_ignore"
+            )
+        os.remove(spool)
+        return len(rows)
+
+    def _manifests(self):
+        return sorted(glob.glob(os.path.join(glob.escape(self.path), "day=*", f"{MANIFEST_PREFIX}*.json")))
+
+    def _superseded(self):
+        """Files already merged by a compaction that has not removed them yet"""
+        superseded = set()
+        for manifest in self._manifests():
+            partition = os.path.dirname(manifest)
+            try:
+                with open(manifest, encoding="utf-8") as f:
+                    entry = json.load(f)
+            except FileNotFoundError:
+                continue
+            # Before the merged file is in place the originals are still the data
+            if os.path.exists(os.path.join(partition, entry["merged"])):
+                superseded.update(os.path.join(partition, name) for name in entry["replaces"])
+        return superseded
+
+    def dataset(self):
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        source = self.path
+        superseded = self._superseded()
+        if superseded:
+            source = [path for path in glob.glob(os.path.join(glob.escape(self.path), "day=*", "*.parquet"))
+                      if path not in superseded]
+        return ds.dataset(
+            source, schema=_schema().append(pa.field("day", pa.string())), partitioning=_partitioning(),
+            partition_base_dir=self.path,
+            format=ds.ParquetFileFormat(read_options={"dictionary_columns": DICTIONARY_COLUMNS})
+        )
+
+    def count(self, expression=None):
+        return self.dataset().count_rows(filter=expression)
+
+    def score_distribution(self, expression=None, top_jds=20, bin_width=10):
+        """Per-JD score summary (most screened JDs first) and match_percentage histograms.
+
+        Returns (summary, histogram) Arrow tables.
+        """
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        scored = pc.field("match_percentage").is_valid()
+        table = self.dataset().to_table(
+            columns=["jd_hash", "resume_hash", "match_percentage", "ats_score"],
+            filter=scored if expression is None else expression & scored
+        )
+        summary = table.group_by("jd_hash").aggregate([
+            ("match_percentage", "count"),
+            ("resume_hash", "count_distinct"),
+            ("match_percentage", "mean"),
+            ("match_percentage", "approximate_median"),
+            ("match_percentage", "min"),
+            ("match_percentage", "max"),
+            ("ats_score", "mean"),
+        ])
+        summary = _renamed(summary, {
+            "match_percentage_count": "analyses",
+            "resume_hash_count_distinct": "candidates",
+            "match_percentage_mean": "mean_match",
+            "match_percentage_approximate_median": "median_match",
+            "match_percentage_min": "min_match",
+            "match_percentage_max": "max_match",
+            "ats_score_mean": "mean_ats",
+        }).sort_by([("analyses", "descending")]).slice(0, top_jds)
+        top = table.filter(pc.is_in(table["jd_hash"], value_set=summary["jd_hash"].cast(pa.string())))
+        # Integer division: 0-9 -> 0, 10-19 -> 10, ...; 100 gets its own bin
+        bins = pc.multiply(pc.divide(top["match_percentage"], bin_width), bin_width)
+        histogram = pa.table({"jd_hash": top["jd_hash"], "match_bin": bins}).group_by(["jd_hash", "match_bin"]).aggregate(
+            [("match_bin", "count")]
+        )
+        histogram = _renamed(histogram, {"match_bin_count": "analyses"}).sort_by(
+            [("jd_hash", "ascending"), ("match_bin", "ascending")]
+        )
+        return summary, histogram
+
+    def top_missing_keywords(self, expression=None, limit=25):
+        """Most frequently missing keywords (case-folded) with their share of scored analyses"""
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        counts = []
+        analyses = 0
+        for batch in self.dataset().to_batches(columns=["missing_keywords"], filter=expression):
+            keywords = batch.column(0)
+            analyses += len(keywords) - keywords.null_count
+            flat = pc.utf8_lower(pc.list_flatten(keywords))
+            if len(flat):
+                value_counts = pc.value_counts(flat)
+                counts.append(pa.table({"keyword": value_counts.field("values"), "count": value_counts.field("counts")}))
+        if not counts:
+            return pa.table({"keyword": pa.array([], pa.string()), "count": pa.array([], pa.int64()),
+                             "share": pa.array([], pa.float64())})
+        totals = _renamed(pa.concat_tables(counts).group_by("keyword").aggregate([("count", "sum")]), {"count_sum": "count"})
+        totals = totals.select(["keyword", "count"]).sort_by([("count", "descending")]).slice(0, limit)
+        return totals.append_column("share", pc.divide(totals["count"].cast(pa.float64()), max(analyses, 1)))
+
+    def latency_percentiles(self, expression=None):
+        """p50/p90/p99 of TTFT and total time per analysis type and model, excluding cache hits"""
+        import pyarrow.compute as pc
+        uncached = (pc.field("cached") == False) & pc.field("total_seconds").is_valid()  # noqa: E712
+        table = self.dataset().to_table(
+            columns=["analysis_type", "model", "ttft_seconds", "total_seconds"],
+            filter=uncached if expression is None else expression & uncached
+        )
+        options = pc.TDigestOptions(q=list(LATENCY_QUANTILES))
+        grouped = table.group_by(["analysis_type", "model"]).aggregate([
+            ("total_seconds", "count"),
+            ("ttft_seconds", "tdigest", options),
+            ("total_seconds", "tdigest", options),
+        ])
+        rows = []
+        for row in grouped.to_pylist():
+            entry = {"analysis_type": row["analysis_type"], "model": row["model"], "requests": row["total_seconds_count"]}
+            for metric in ("ttft_seconds", "total_seconds"):
+                # A group without any value (e.g. no streamed responses, so no TTFT) digests to nulls
+                for q, value in zip(LATENCY_QUANTILES, row[f"{metric}_tdigest"] or []):
+                    entry[f"{metric.split('_')[0]}_p{int(q * 100)}"] = round(value, 3) if value is not None else None
+            rows.append(entry)
+        return sorted(rows, key=lambda entry: -entry["requests"])
+
+    def export(self, expression=None, fmt="csv"):
+        """Filtered rows as CSV or Parquet bytes, written batch by batch"""
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.csv as pa_csv
+        import pyarrow.parquet as pq
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format: {fmt} (expected one of {', '.join(EXPORT_FORMATS)})")
+        sink = io.BytesIO()
+        scanner = self.dataset().scanner(columns=_schema().names, filter=expression)
+        if fmt == "parquet":
+            with pq.ParquetWriter(sink, _schema(), compression="zstd") as writer:
+                for batch in scanner.to_batches():
+                    writer.write_batch(batch.cast(_schema()) if batch.schema != _schema() else batch)
+            return sink.getvalue()
+        writer = None
+        for batch in scanner.to_batches():
+            # CSV has no list type, so keyword lists are joined like batch_screen's CSV output
+            columns = [pc.binary_join(batch.column(name), "; ") if name in LIST_COLUMNS else batch.column(name)
+                       for name in _schema().names]
+            flat = pa.RecordBatch.from_arrays(columns, names=_schema().names)
+            if writer is None:
+                writer = pa_csv.CSVWriter(sink, flat.schema)
+            writer.write_batch(flat)
+        if writer is None:
+            return ",".join(_schema().names).encode("utf-8") + b"\n"
+        writer.close()
+        return sink.getvalue()
+
+    def _finish_compaction(self, manifest):
+        """Remove the files a manifest's merged file replaces (if it got into place), then the manifest"""
+        partition = os.path.dirname(manifest)
+        with open(manifest, encoding="utf-8") as f:
+            entry = json.load(f)
+        if os.path.exists(os.path.join(partition, entry["merged"])):
+            for name in entry["replaces"]:
+                try:
+                    os.remove(os.path.join(partition, name))
+                except FileNotFoundError:
+                    pass
+        os.remove(manifest)
+
+    def compact(self, min_files=2):
+        """Merge each day's Parquet files into one; returns the number of files removed.
+
+        The manifest goes down before the merged file is renamed into place,
+        so a crash at any point leaves each row readable exactly once.
+        """
+        import pyarrow.parquet as pq
+        removed = 0
+        with self._lock:
+            for manifest in self._manifests():
+                self._finish_compaction(manifest)
+            for partition in sorted(glob.glob(os.path.join(glob.escape(self.path), "day=*"))):
+                files = sorted(glob.glob(os.path.join(glob.escape(partition), "*.parquet")))
+                if len(files) < min_files:
+                    continue
+                name = f"part-{int(time.time())}-{uuid.uuid4().hex[:8]}-merged.parquet"
+                merged = os.path.join(partition, name)
+                # Hidden until renamed, so scans never read a half-written file
+                tmp_path = os.path.join(partition, f".{name}.tmp")
+                with pq.ParquetWriter(tmp_path, _schema(), compression="zstd") as writer:
+                    for path in files:
+                        writer.write_table(pq.read_table(path, schema=_schema()))
+                manifest = os.path.join(partition, f"{MANIFEST_PREFIX}{name}.json")
+                with open(manifest + ".tmp", "w", encoding="utf-8") as f:
+                    json.dump({"merged": name, "replaces": [os.path.basename(path) for path in files]}, f)
+                os.replace(manifest + ".tmp", manifest)
+                os.replace(tmp_path, merged)
+                self._finish_compaction(manifest)
+                removed += len(files) - 1
+        return removed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the analysis results dataset")
+    parser.add_argument("command", choices=["flush", "compact", "stats"])
+    parser.add_argument("--path", default=DEFAULT_PATH, help="Dataset directory")
+    args = parser.parse_args(argv)
+
+    dataset = ResultsDataset(args.path)
+    if args.command == "flush":
+        print(f"💾 Wrote {dataset.flush()} spooled rows to {args.path}")
+    elif args.command == "compact":
+        dataset.flush()
+        print(f"🗜️ Merged away {dataset.compact()} small files in {args.path}")
+    else:
+        dataset.flush()
+        files = glob.glob(os.path.join(glob.escape(args.path), "day=*", "*.parquet"))
+        print(f"📊 {dataset.count()} analyses in {len(files)} files under {args.path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,318 @@
+"""On-disk inverted index over a resume corpus for top-k retrieval per job description.
+
+Usage:
+    python resume_index.py add resumes/ --index resume_index
+    python resume_index.py query --jd job.txt --index resume_index -k 50
+
+Postings (term -> doc ids, term frequencies and token positions) are stored
+as packed NumPy arrays in SQLite, one row per term per segment. Each add
+writes new segments, so the index grows incrementally; ``compact`` merges
+them. Queries rank documents with BM25 over the JD keywords, using
+positions for multi-word phrases, so only the shortlist has to go through
+Gemini.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from ats_engine import extract_resume_text, iter_resume_sources, read_resume_source, resume_hash
+from keyword_scorer import BM25_B, BM25_K1, STOPWORDS, jd_keywords, tokenize
+
+DEFAULT_INDEX_DIR = os.getenv("ATS_INDEX_DIR", "resume_index")
+SEGMENT_SIZE = 2000
+DEFAULT_TOP_K = 20
+
+
+def analyze_resume(pdf_bytes):
+    """Process-pool worker: resume hash, token count and term -> positions"""
+    tokens = tokenize(extract_resume_text(pdf_bytes))
+    positions = defaultdict(list)
+    for pos, token in enumerate(tokens):
+        if token not in STOPWORDS and len(token) > 1:
+            positions[token].append(pos)
+    return resume_hash(pdf_bytes), len(tokens), dict(positions)
+
+
+def _pack(array):
+    return np.asarray(array, dtype=np.int32).tobytes()
+
+
+def _unpack(blob):
+    return np.frombuffer(blob, dtype=np.int32)
+
+
+class ResumeIndex:
+    """Segmented inverted index stored in a single SQLite file"""
+
+    def __init__(self, index_dir=DEFAULT_INDEX_DIR):
+        os.makedirs(index_dir, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(index_dir, "index.sqlite3"), isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS docs ("
+            " doc_id INTEGER PRIMARY KEY,"
+            " resume_hash TEXT UNIQUE NOT NULL,"
+            " source TEXT NOT NULL,"
+            " name TEXT NOT NULL,"
+            " length INTEGER NOT NULL,"
+            " added_at REAL NOT NULL)"
+        )
+        # Positions are the last column so reading doc ids / tfs for ranking
+        # never touches the (much larger) position data
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS postings ("
+            " term TEXT NOT NULL,"
+            " segment INTEGER NOT NULL,"
+            " doc_ids BLOB NOT NULL,"
+            " tfs BLOB NOT NULL,"
+            " pos_offsets BLOB NOT NULL,"
+            " positions BLOB NOT NULL,"
+            " PRIMARY KEY (term, segment))"
+        )
+        self._lengths = None
+        self._lengths_version = None
+
+    # === Building ===
+
+    def add_directory(self, path, workers=None, on_progress=None):
+        """Index every PDF in a directory or zip, skipping already indexed resumes"""
+        source = os.path.abspath(path)
+        known = {row[0] for row in self.conn.execute("SELECT resume_hash FROM docs")}
+        added = 0
+        batch = []
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            names = []
+            futures = []
+            for name, pdf_bytes in iter_resume_sources(path):
+                names.append(name)
+                futures.append(executor.submit(analyze_resume, pdf_bytes))
+                if len(futures) >= SEGMENT_SIZE:
+                    added += self._collect(source, names, futures, known, batch)
+                    names, futures = [], []
+                    if on_progress:
+                        on_progress(added)
+            added += self._collect(source, names, futures, known, batch)
+        if batch:
+            self._write_segment(batch)
+        if on_progress:
+            on_progress(added)
+        return added
+
+    def _collect(self, source, names, futures, known, batch):
+        added = 0
+        for name, future in zip(names, futures):
+            try:
+                digest, length, positions = future.result()
+            except Exception as e:
+                print(f"❌ Skipping {name}: {e}", file=sys.stderr)
+                continue
+            if digest in known:
+                continue
+            known.add(digest)
+            batch.append((digest, source, name, length, positions))
+            added += 1
+        if len(batch) >= SEGMENT_SIZE:
+            self._write_segment(batch)
+            batch.clear()
+        return added
+
+    def _write_segment(self, docs):
+        """Assign doc ids and write one posting segment for a batch of documents"""
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            segment = self.conn.execute("SELECT COALESCE(MAX(segment), -1) + 1 FROM postings").fetchone()[0]
+            term_postings = defaultdict(list)
+            for digest, source, name, length, positions in docs:
+                cursor = self.conn.execute(
+                    "INSERT INTO docs (resume_hash, source, name, length, added_at) VALUES (?, ?, ?, ?, ?)",
+                    (digest, source, name, length, now)
+                )
+                for term, term_positions in positions.items():
+                    term_postings[term].append((cursor.lastrowid, term_positions))
+            self.conn.executemany(
+                "INSERT INTO postings (term, segment, doc_ids, tfs, pos_offsets, positions) VALUES (?, ?, ?, ?, ?, ?)",
+                (self._encode(term, segment, postings) for term, postings in term_postings.items())
+            )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        self._lengths = None
+
+    @staticmethod
+    def _encode(term, segment, postings):
+        doc_ids = [doc_id for doc_id, _ in postings]
+        tfs = [len(positions) for _, positions in postings]
+        offsets = np.concatenate(([0], np.cumsum(tfs)))
+        flat = [pos for _, positions in postings for pos in positions]
+        return term, segment, _pack(doc_ids), _pack(tfs), _pack(offsets), _pack(flat)
+
+    def compact(self):
+        """Merge all segments into one posting list per term"""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            terms = [row[0] for row in self.conn.execute(
+                "SELECT term FROM postings GROUP BY term HAVING COUNT(*) > 1"
+            )]
+            for term in terms:
+                # Segments hold increasing doc ids, so merging is concatenation
+                segments = list(self._segments(term, with_positions=True))
+                tfs = np.concatenate([s[1] for s in segments])
+                self.conn.execute("DELETE FROM postings WHERE term = ?", (term,))
+                self.conn.execute(
+                    "INSERT INTO postings (term, segment, doc_ids, tfs, pos_offsets, positions) VALUES (?, ?, ?, ?, ?, ?)",
+                    (term, 0, _pack(np.concatenate([s[0] for s in segments])), _pack(tfs),
+                     _pack(np.concatenate(([0], np.cumsum(tfs)))), _pack(np.concatenate([s[3] for s in segments])))
+                )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("VACUUM")
+
+    # === Querying ===
+
+    def _segments(self, term, with_positions=False):
+        columns = "doc_ids, tfs, pos_offsets, positions" if with_positions else "doc_ids, tfs"
+        for row in self.conn.execute(f"SELECT {columns} FROM postings WHERE term = ? ORDER BY segment", (term,)):
+            yield tuple(_unpack(blob) for blob in row)
+
+    def _postings(self, term):
+        """All (doc_ids, tfs) for a term across segments"""
+        segments = list(self._segments(term))
+        if not segments:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+        return np.concatenate([s[0] for s in segments]), np.concatenate([s[1] for s in segments])
+
+    def _position_keys(self, term):
+        """Every occurrence of a term encoded as (doc_id << 32) | position"""
+        keys = []
+        for doc_ids, tfs, _, positions in self._segments(term, with_positions=True):
+            docs = np.repeat(doc_ids.astype(np.int64), tfs)
+            keys.append((docs << 32) | positions.astype(np.int64))
+        return np.concatenate(keys) if keys else np.empty(0, dtype=np.int64)
+
+    def _phrase_postings(self, phrase):
+        """Doc ids and phrase frequencies for a multi-word phrase, using positions"""
+        words = phrase.split()
+        starts = self._position_keys(words[0])
+        for shift, word in enumerate(words[1:], 1):
+            starts = np.intersect1d(starts, self._position_keys(word) - shift, assume_unique=True)
+        return np.unique(starts >> 32, return_counts=True)
+
+    def _doc_lengths(self):
+        """Document lengths indexed by doc id, reloaded when another writer has added documents"""
+        version = self.conn.execute("SELECT COALESCE(MAX(doc_id), 0), COUNT(*) FROM docs").fetchone()
+        if self._lengths is None or version != self._lengths_version:
+            lengths = np.zeros(version[0] + 1, dtype=np.float64)
+            for doc_id, length in self.conn.execute("SELECT doc_id, length FROM docs"):
+                lengths[doc_id] = length
+            self._lengths = lengths
+            self._lengths_version = version
+        return self._lengths
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def doc_freq(self, terms):
+        """Document frequency per term, for IDF in the local keyword scorer"""
+        return {term: len(self._postings(term)[0]) for term in terms if " " not in term}
+
+    def query(self, jd_text, k=DEFAULT_TOP_K):
+        """Rank indexed resumes against a job description with BM25, returning the top k"""
+        keywords = jd_keywords(jd_text)
+        lengths = self._doc_lengths()
+        n_docs = len(self)
+        if not keywords or n_docs == 0:
+            return []
+
+        avg_len = lengths.sum() / n_docs
+        length_norm = BM25_K1 * (1.0 - BM25_B + BM25_B * lengths / max(avg_len, 1.0))
+        scores = np.zeros(len(lengths), dtype=np.float64)
+        for term, jd_tf in keywords.items():
+            doc_ids, tfs = self._phrase_postings(term) if " " in term else self._postings(term)
+            if not len(doc_ids):
+                continue
+            df = len(doc_ids)
+            idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+            tfs = tfs.astype(np.float64)
+            weight = (1.0 + np.log(jd_tf)) * idf
+            scores[doc_ids] += weight * tfs * (BM25_K1 + 1.0) / (tfs + length_norm[doc_ids])
+
+        k = min(k, int((scores > 0).sum()))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        rows = {
+            row[0]: row for row in self.conn.execute(
+                f"SELECT doc_id, resume_hash, source, name FROM docs WHERE doc_id IN ({','.join('?' * len(top))})",
+                [int(doc_id) for doc_id in top]
+            )
+        }
+        return [
+            {"doc_id": int(doc_id), "resume_hash": rows[doc_id][1], "source": rows[doc_id][2],
+             "name": rows[doc_id][3], "score": round(float(scores[doc_id]), 4)}
+            for doc_id in top if doc_id in rows
+        ]
+
+    def iter_sources(self, hits):
+        """Yield (name, pdf_bytes) for query hits so they can be screened"""
+        for hit in hits:
+            yield hit["name"], read_resume_source(hit["source"], hit["name"])
+
+    def close(self):
+        self.conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build and query an inverted index over PDF resumes")
+    parser.add_argument("--index", default=DEFAULT_INDEX_DIR, help="Index directory")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    add_parser = subparsers.add_parser("add", help="Index a directory or zip of PDF resumes")
+    add_parser.add_argument("resumes", help="Directory or .zip archive containing PDF resumes")
+    add_parser.add_argument("--workers", type=int, default=None, help="Text extraction processes")
+
+    query_parser = subparsers.add_parser("query", help="Rank indexed resumes against a job description")
+    query_parser.add_argument("--jd", required=True, help="Path to a text file with the job description")
+    query_parser.add_argument("-k", "--top-k", type=int, default=DEFAULT_TOP_K, help="Number of candidates")
+
+    subparsers.add_parser("compact", help="Merge index segments")
+    args = parser.parse_args(argv)
+
+    index = ResumeIndex(args.index)
+    try:
+        if args.command == "add":
+            start = time.perf_counter()
+            added = index.add_directory(
+                args.resumes, workers=args.workers,
+                on_progress=lambda n: print(f"📄 Indexed {n} resumes", flush=True)
+            )
+            print(f"✅ Added {added} resumes in {time.perf_counter() - start:.1f}s ({len(index)} total)")
+        elif args.command == "query":
+            with open(args.jd, encoding="utf-8") as f:
+                jd_text = f.read()
+            start = time.perf_counter()
+            hits = index.query(jd_text, k=args.top_k)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            for rank, hit in enumerate(hits, 1):
+                print(f"{rank:>3}. {hit['score']:>8.3f}  {hit['name']}")
+            print(f"\n🔍 {len(hits)} candidates from {len(index)} resumes in {elapsed_ms:.0f} ms")
+        elif args.command == "compact":
+            index.compact()
+            print("✅ Index compacted")
+    finally:
+        index.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+"""Section-aware resume segmentation from PyMuPDF block and font information.
+
+``segment_resume`` reads every text line with its font size and weight
+and finds the section headings: short lines that name a known section
+and stand out from body text (bold, larger, all caps or alone in their
+block). Lines styled exactly like the recognized headings also start a
+section even when the name is unknown (e.g. "VOLUNTEERING"). Text above
+the first heading is the contact header, plus a summary if it runs
+longer than the contact lines.
+
+Analysis options list the sections they need. ``select_sections`` then
+swaps the per-page text parts for just those sections, which keeps
+contact blocks, references and hobbies out of the request. Scanned
+pages have no text to segment, so they are always sent as images.
+"""
+import re
+import statistics
+
+# Bump when the heuristics change so cached segmentations are rebuilt
+SEGMENTER_VERSION = 2
+
+CONTACT = "contact"
+SUMMARY = "summary"
+EXPERIENCE = "experience"
+PROJECTS = "projects"
+SKILLS = "skills"
+EDUCATION = "education"
+CERTIFICATIONS = "certifications"
+REFERENCES = "references"
+INTERESTS = "interests"
+OTHER = "other"
+SECTIONS = (CONTACT, SUMMARY, EXPERIENCE, PROJECTS, SKILLS, EDUCATION, CERTIFICATIONS, REFERENCES, INTERESTS, OTHER)
+
+HEADING_PATTERNS = {
+    SUMMARY: r"(professional |career |executive )?(summary|profile|objective|overview)|about( me)?",
+    EXPERIENCE: r"((professional|work|relevant|industry) )?experience|employment( history)?|(work|career) history",
+    PROJECTS: r"((personal|selected|key|academic) )?projects",
+    SKILLS: r"((technical|key|core|professional) )?(skills|competencies)( (and|&) (tools|technologies))?"
+            r"|technologies|tech stack|tools",
+    EDUCATION: r"education( (and|&) training)?|academic (background|qualifications)|qualifications",
+    CERTIFICATIONS: r"certifications?|licen[cs]es( (and|&) certifications)?|certificates|courses|training",
+    REFERENCES: r"references|referees",
+    INTERESTS: r"((personal )?interests|hobbies)( (and|&) (interests|hobbies))?|activities",
+    CONTACT: r"contact( (details|information))?|personal (details|information)",
+    OTHER: r"awards?( (and|&) honou?rs)?|honou?rs|publications|languages|volunteer(ing)?( experience)?|achievements",
+}
+HEADING_REGEXES = {label: re.compile(rf"(?:{pattern})") for label, pattern in HEADING_PATTERNS.items()}
+MAX_HEADING_CHARS = 40
+MAX_HEADING_WORDS = 5
+# Relative font size above body text that marks a heading
+HEADING_SIZE_RATIO = 1.15
+BOLD_FLAG = 16
+CONTACT_PATTERN = re.compile(r"@|https?://|www\.|linkedin|github|\+?\d[\d\s().-]{7,}\d")
+# Fewer recognized headings than this and the segmentation is not trusted
+MIN_HEADINGS = 2
+
+TITLES = {
+    CONTACT: "Contact",
+    SUMMARY: "Summary",
+    EXPERIENCE: "Experience",
+    PROJECTS: "Projects",
+    SKILLS: "Skills",
+    EDUCATION: "Education",
+    CERTIFICATIONS: "Certifications",
+    REFERENCES: "References",
+    INTERESTS: "Interests",
+    OTHER: "Other",
+}
+# Everything the local keyword scorer should see (no contact details, references or hobbies)
+SCORING_SECTIONS = (SUMMARY, EXPERIENCE, PROJECTS, SKILLS, EDUCATION, CERTIFICATIONS, OTHER)
+
+
+def normalize_heading(text):
+    """Lowercase heading text without bullets, numbering, colons or letter spacing"""
+    words = text.strip().split()
+    # "E X P E R I E N C E" is a common way to style headings
+    if len(words) > 3 and all(len(word) == 1 for word in words):
+        words = ["".join(words)]
+    text = " ".join(words).lower()
+    text = re.sub(r"^[\W\d_]+|[\W_]+$", "", text)
+    return re.sub(r"\s+", " ", text)
+
+
+def heading_label(text):
+    """Section label for a heading text, or None"""
+    if len(text) > MAX_HEADING_CHARS * 2:
+        return None
+    normalized = normalize_heading(text)
+    if len(normalized) > MAX_HEADING_CHARS or len(normalized.split()) > MAX_HEADING_WORDS:
+        return None
+    for label, regex in HEADING_REGEXES.items():
+        if regex.fullmatch(normalized):
+            return label
+    return None
+
+
+def _page_lines(page, page_num):
+    """Text lines of a page with font size, weight and position in their block"""
+    lines = []
+    for block in page.get_text("dict", sort=True)["blocks"]:
+        if block.get("type", 0) != 0:
+            continue
+        block_lines = block.get("lines", [])
+        for index, line in enumerate(block_lines):
+            spans = [span for span in line["spans"] if span["text"].strip()]
+            if not spans:
+                continue
+            text = " ".join(span["text"].strip() for span in spans)
+            lines.append({
+                "text": text,
+                "page": page_num,
+                "size": round(max(span["size"] for span in spans), 1),
+                "bold": all(span["flags"] & BOLD_FLAG or "bold" in span["font"].lower() for span in spans),
+                "caps": text.isupper(),
+                "alone": len(block_lines) == 1 or index == 0,
+            })
+    return lines
+
+
+def _style(line):
+    return line["size"], line["bold"], line["caps"]
+
+
+def _split_header(lines):
+    """Text above the first heading: contact lines, then a summary if there is more"""
+    last_contact = max((i for i, line in enumerate(lines) if CONTACT_PATTERN.search(line["text"])), default=None)
+    # The name and contact details sit on the first few lines
+    cut = (last_contact + 1) if last_contact is not None else min(len(lines), 2)
+    sections = []
+    if lines[:cut]:
+        sections.append((CONTACT, None, lines[:cut]))
+    if lines[cut:]:
+        sections.append((SUMMARY, None, lines[cut:]))
+    return sections
+
+
+def segment_lines(lines):
+    """Group text lines (from _page_lines) into labelled sections"""
+    if not lines:
+        return {"version": SEGMENTER_VERSION, "sections": [], "headings": 0}
+    body_size = statistics.median(line["size"] for line in lines)
+
+    def stands_out(line):
+        return line["bold"] or line["caps"] or line["size"] >= body_size * HEADING_SIZE_RATIO or line["alone"]
+
+    headings = {}
+    for i, line in enumerate(lines):
+        label = heading_label(line["text"])
+        if label is not None and stands_out(line):
+            headings[i] = label
+    # Unknown headings are recognized by sharing the styling of known ones. Bold
+    # alone is not distinctive enough: job titles and employers are often bold.
+    styles = {_style(lines[i]) for i in headings if lines[i]["caps"] or lines[i]["size"] >= body_size * HEADING_SIZE_RATIO}
+    for i, line in enumerate(lines):
+        if i not in headings and _style(line) in styles and len(line["text"]) <= MAX_HEADING_CHARS \
+                and len(line["text"].split()) <= MAX_HEADING_WORDS and not line["text"].rstrip().endswith((".", ",")):
+            headings[i] = OTHER
+
+    starts = sorted(headings)
+    grouped = _split_header(lines[:starts[0]] if starts else lines) if (not starts or starts[0] > 0) else []
+    for start, end in zip(starts, starts[1:] + [len(lines)]):
+        grouped.append((headings[start], lines[start]["text"], lines[start + 1:end]))
+
+    sections = []
+    for label, heading, section_lines in grouped:
+        text = "\n".join(line["text"] for line in section_lines)
+        if not text and heading is None:
+            continue
+        sections.append({
+            "label": label,
+            "heading": heading,
+            "text": text,
+            "pages": sorted({line["page"] for line in section_lines}),
+        })
+    return {"version": SEGMENTER_VERSION, "sections": sections, "headings": len(headings)}
+
+
+def segment_resume(pdf_bytes):
+    """Labelled sections of a resume's text layer (cache per resume hash).
+
+    Every page is segmented, since text extraction sends every text page
+    and ``select_sections`` replaces all of them.
+    """
+    import fitz  # PyMuPDF is imported on first use, as in ats_engine
+
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    try:
+        lines = []
+        for page_num in range(len(doc)):
+            lines.extend(_page_lines(doc.load_page(page_num), page_num))
+    finally:
+        doc.close()
+    return segment_lines(lines)
+
+
+def is_usable(segmentation):
+    return segmentation is not None and segmentation["headings"] >= MIN_HEADINGS
+
+
+def sections_variant(variant, sections):
+    """Cache-key suffix for requests that send only some sections"""
+    if not sections:
+        return variant
+    return f"{variant}:sections{SEGMENTER_VERSION}={'+'.join(sections)}"
+
+
+def select_sections(pdf_parts, segmentation, sections):
+    """Resume parts with the per-page text replaced by the wanted sections only.
+
+    Image parts (scanned pages) are kept. Without ``sections`` or a usable
+    segmentation the parts are returned unchanged.
+    """
+    if not sections or not is_usable(segmentation):
+        return pdf_parts
+    wanted = [section for section in segmentation["sections"] if section["label"] in sections and section["text"]]
+    if not wanted:
+        return pdf_parts
+    omitted = sorted({section["label"] for section in segmentation["sections"]} - set(sections))
+    parts = [part for part in pdf_parts if "text" not in part]
+    parts += [
+        {"text": f"--- Resume section: {section['heading'] or TITLES[section['label']]} ---\n{section['text']}"}
+        for section in wanted
+    ]
+    if omitted:
+        parts.append({"text": "[Sections left out as not relevant to this analysis: "
+                              + ", ".join(TITLES[label] for label in omitted) + "]"})
+    return parts
+
+
+def scoring_text(segmentation, fallback=""):
+    """Resume text for the local keyword scorer, without contact details, references or hobbies"""
+    if not is_usable(segmentation):
+        return fallback
+    return "\n\n".join(section["text"] for section in segmentation["sections"]
+                       if section["label"] in SCORING_SECTIONS and section["text"])
@@ -0,0 +1,214 @@
+"""Typed schema, validation and incremental parsing for Detailed Analysis JSON.
+
+Detailed Analysis asks Gemini for schema-constrained JSON (``DetailedAnalysis``
+is passed as the response schema). Responses are validated and coerced
+against the same model, parsed field by field while streaming so the
+dashboard can render early, and repaired when the JSON is malformed.
+``PARSE_STATS`` counts parses, repairs and failures.
+"""
+import json
+import re
+import threading
+from typing import List, TypedDict
+
+
+class DetailedAnalysis(TypedDict):
+    match_percentage: int
+    ats_score: int
+    overall_assessment: str
+    missing_keywords: List[str]
+    strengths: List[str]
+    weaknesses: List[str]
+    recommendations: List[str]
+
+
+SCORE_FIELDS = ("match_percentage", "ats_score")
+LIST_FIELDS = ("missing_keywords", "strengths", "weaknesses", "recommendations")
+
+PARSE_STATS = {"parsed": 0, "repaired": 0, "repair_attempts": 0, "failed": 0, "validation_errors": 0}
+_stats_lock = threading.Lock()
+
+CODE_FENCE_PATTERN = re.compile(r"^```(?:json)?\s*|\s*```$", re.IGNORECASE)
+TRAILING_COMMA_PATTERN = re.compile(r",\s*([}\]])")
+NUMBER_PATTERN = re.compile(r"-?\d+(?:\.\d+)?")
+
+
+def _count(name, amount=1):
+    with _stats_lock:
+        PARSE_STATS[name] += amount
+
+
+def schema_variant(variant, response_schema):
+    """Cache-key variant that distinguishes schema-constrained requests"""
+    return f"{variant}:json-schema" if response_schema is not None else variant
+
+
+def validate_detailed_analysis(data):
+    """Coerce a parsed object to the DetailedAnalysis model.
+
+    Returns (clean, errors). Scores become ints clamped to 0-100 (so "85%"
+    still works), list fields become lists of strings, and unknown keys are
+    dropped. Missing fields are left out rather than invented.
+    """
+    clean, errors = {}, []
+    if not isinstance(data, dict):
+        return None, ["response is not a JSON object"]
+    for field in SCORE_FIELDS:
+        if field not in data:
+            continue
+        value = data[field]
+        if isinstance(value, str):
+            match = NUMBER_PATTERN.search(value)
+            value = float(match.group()) if match else None
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            clean[field] = max(0, min(100, int(round(value))))
+        else:
+            errors.append(f"{field} is not a number")
+    if "overall_assessment" in data:
+        clean["overall_assessment"] = str(data["overall_assessment"])
+    for field in LIST_FIELDS:
+        if field not in data:
+            continue
+        value = data[field]
+        if isinstance(value, str):
+            value = [item.strip() for item in value.split(",") if item.strip()]
+        if isinstance(value, list):
+            clean[field] = [str(item) for item in value if item not in (None, "")]
+        else:
+            errors.append(f"{field} is not a list")
+    if errors:
+        _count("validation_errors", len(errors))
+    return clean, errors
+
+
+def _close_unbalanced(text):
+    """Close strings, arrays and objects left open by a truncated response"""
+    stack = []
+    in_string = escape = False
+    for ch in text:
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]" and stack:
+            stack.pop()
+    if in_string:
+        text += '"'
+    text = TRAILING_COMMA_PATTERN.sub(r"\1", text.rstrip().rstrip(","))
+    return text + "".join(reversed(stack))
+
+
+def _repair_candidates(text):
+    stripped = CODE_FENCE_PATTERN.sub("", text.strip())
+    yield stripped
+    start = stripped.find("{")
+    if start != -1:
+        end = stripped.rfind("}")
+        body = stripped[start:end + 1] if end > start else stripped[start:]
+        yield body
+        yield TRAILING_COMMA_PATTERN.sub(r"\1", body)
+        yield _close_unbalanced(stripped[start:])
+
+
+def parse_structured_response(response_text):
+    """Parse and validate a Detailed Analysis response, repairing malformed JSON.
+
+    Returns the validated dict or None if nothing usable could be recovered.
+    """
+    if not response_text:
+        return None
+    try:
+        data = json.loads(response_text)
+    except ValueError:
+        data = None
+        for candidate in _repair_candidates(response_text):
+            _count("repair_attempts")
+            try:
+                data = json.loads(candidate)
+            except ValueError:
+                continue
+            _count("repaired")
+            break
+    if data is None:
+        _count("failed")
+        return None
+    clean, _ = validate_detailed_analysis(data)
+    if not clean:
+        _count("failed")
+        return None
+    _count("parsed")
+    return clean
+
+
+class IncrementalJSONParser:
+    """Parse a streamed top-level JSON object one field at a time.
+
+    ``feed(chunk)`` returns the fields completed by that chunk, so callers
+    can render ``match_percentage`` long before the response is finished.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.fields = {}
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._key_start = None
+        self._key = None
+        self._value_start = None
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        completed = {}
+        buffer = self.buffer
+        for i in range(self._pos, len(buffer)):
+            ch = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._key is None and self._key_start is not None:
+                        self._key = json.loads(buffer[self._key_start:i + 1])
+                        self._key_start = None
+                continue
+            if ch == '"':
+                self._in_string = True
+                if self._depth == 1 and self._key is None and self._value_start is None:
+                    self._key_start = i
+            elif ch in "{[":
+                self._depth += 1
+            elif ch == ":" and self._depth == 1 and self._key is not None and self._value_start is None:
+                self._value_start = i + 1
+            elif (ch == "," and self._depth == 1) or (ch == "}" and self._depth == 1):
+                self._complete_field(buffer[self._value_start:i] if self._value_start is not None else None,
+                                     completed)
+                if ch == "}":
+                    self._depth -= 1
+            elif ch in "}]":
+                self._depth -= 1
+        self._pos = len(buffer)
+        return completed
+
+    def _complete_field(self, raw_value, completed):
+        key, self._key, self._value_start = self._key, None, None
+        if key is None or raw_value is None:
+            return
+        try:
+            value = json.loads(raw_value)
+        except ValueError:
+            return
+        clean, _ = validate_detailed_analysis({key: value})
+        if key in clean:
+            self.fields[key] = clean[key]
+            completed[key] = clean[key]
@@ -0,0 +1,46 @@
+"""Shared test setup: import the flat modules from the repo root and keep every cache out of it"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Modules read these at import time, so they are set before any test module imports them
+os.environ.setdefault("ATS_CACHE_DIR", tempfile.mkdtemp(prefix="ats-tests-"))
+os.environ.setdefault("ATS_LLM_BACKEND", "stub")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+RESUME_PAGES = [
+    "Jane Doe\njane@example.com | +1 555 123 4567\nSUMMARY\nBackend engineer with 6 years building Python services.",
+    "EXPERIENCE\nSenior Engineer, Acme Corp\nBuilt Kafka pipelines in Python on AWS.",
+    "SKILLS\nPython, SQL, AWS, Docker, Kubernetes, Terraform, PostgreSQL",
+    "EDUCATION\nBSc Computer Science, University of Somewhere, 2016",
+    "PROJECTS\nOpen source contributor to a Python web framework.",
+]
+
+
+@pytest.fixture
+def make_pdf():
+    """Build a text-layer PDF with one page per string"""
+    fitz = pytest.importorskip("fitz")
+
+    def build(pages=RESUME_PAGES):
+        doc = fitz.open()
+        for text in pages:
+            y = 72
+            page = doc.new_page()
+            for line in text.split("\n"):
+                page.insert_text((72, y), line, fontsize=11)
+                y += 16
+        return doc.tobytes()
+    return build
+
+
+@pytest.fixture
+def stub_backend():
+    """Install the deterministic offline backend for the test"""
+    from llm_backends import StubBackend, get_backend, set_backend
+    previous = get_backend()
+    backend = set_backend(StubBackend())
+    yield backend
+    set_backend(previous)
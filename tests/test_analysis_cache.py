@@ -0,0 +1,93 @@
+import time
+
+import pytest
+
+from analysis_cache import AnalysisCache, make_key, normalize_text
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return AnalysisCache(str(tmp_path / "analysis.sqlite3"))
+
+
+def test_key_ignores_whitespace_but_not_content():
+    key = make_key("resume", "Python  developer\n", "prompt", "model")
+    assert key == make_key("resume", " Python developer", "prompt ", "model")
+    assert key != make_key("resume", "Python developer", "prompt", "model", variant="text")
+    assert key != make_key("resume", "Go developer", "prompt", "model")
+    assert normalize_text(None) == ""
+
+
+def test_get_counts_hits_and_misses(cache):
+    assert cache.get("k") is None
+    cache.set("k", "response")
+    assert cache.get("k") == "response"
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+    assert stats["hit_rate"] == 0.5
+
+
+def test_peek_does_not_count(cache):
+    cache.set("k", "response")
+    assert cache.peek("k") == "response"
+    assert cache.peek("missing") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (0, 0)
+    cache.record_lookup(True, "k")
+    cache.record_lookup(False)
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+
+def test_expired_entries_are_dropped(tmp_path):
+    cache = AnalysisCache(str(tmp_path / "analysis.sqlite3"), ttl_seconds=1)
+    cache.set("k", "response")
+    cache._conn().execute("UPDATE entries SET created_at = ?", (time.time() - 5,))
+    assert cache.peek("k") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    cache = AnalysisCache(str(tmp_path / "analysis.sqlite3"), max_entries=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache._conn().execute("UPDATE entries SET last_access = last_access - 10 WHERE key = 'b'")
+    cache.get("a")
+    cache.set("c", "3")
+    assert cache.peek("b") is None
+    assert cache.peek("a") == "1" and cache.peek("c") == "3"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_are_shared_between_instances(tmp_path):
+    path = str(tmp_path / "analysis.sqlite3")
+    AnalysisCache(path).set("k", "response")
+    assert AnalysisCache(path).get("k") == "response"
+
+
+def test_clear(cache):
+    cache.set("k", "response")
+    cache.get("k")
+    cache.clear()
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["hits"] == 0
+
+
+def test_running_totals_follow_every_write(tmp_path):
+    cache = AnalysisCache(str(tmp_path / "analysis.sqlite3"), max_bytes=25)
+    cache.set("a", "x" * 10)
+    cache.set("a", "x" * 5)
+    cache.set("b", "y" * 10)
+    assert AnalysisCache._totals(cache._conn()) == (2, 15)
+    cache.set("c", "z" * 20)
+    assert cache.peek("a") is None and cache.peek("b") is None
+    assert AnalysisCache._totals(cache._conn()) == (1, 20)
+    assert cache.stats()["evictions"] == 2
+
+
+def test_totals_are_seeded_for_an_existing_database(tmp_path):
+    path = str(tmp_path / "analysis.sqlite3")
+    cache = AnalysisCache(path)
+    cache.set("k", "response")
+    cache._conn().execute("DELETE FROM counters")
+    assert AnalysisCache(path).stats()["entries"] == 1
@@ -0,0 +1,84 @@
+import asyncio
+import base64
+import json
+import threading
+
+import pytest
+
+from api_client import ApiClient, ApiError
+from api_server import AnalysisServer, HttpError, parse_submission
+from job_queue import JobQueue
+
+
+def submission(**overrides):
+    payload = {"job_description": "Python AWS", "analysis_type": "Quick Scan",
+               "resume_base64": base64.b64encode(b"%PDF-1.7 ...").decode("ascii")}
+    payload.update(overrides)
+    return json.dumps(payload).encode("utf-8")
+
+
+@pytest.fixture
+def api_url(tmp_path, stub_backend):
+    """Run an AnalysisServer on its own event loop thread and return its base URL"""
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    server = AnalysisServer(JobQueue(str(tmp_path / "jobs.sqlite3")), workers=1)
+    listener = asyncio.run_coroutine_threadsafe(server.start(port=0), loop).result(30)
+    yield f"http://127.0.0.1:{listener.sockets[0].getsockname()[1]}"
+    listener.close()
+    asyncio.run_coroutine_threadsafe(server.stop(), loop).result(30)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(30)
+
+
+def test_parse_submission():
+    resume_bytes, jd_text, analysis_type, options = parse_submission(submission())
+    assert resume_bytes.startswith(b"%PDF") and jd_text == "Python AWS" and analysis_type == "Quick Scan"
+    assert options == {"extraction": "text", "reuse_near_duplicates": True}
+    _, _, _, options = parse_submission(submission(extraction="image", raster={"dpi": 72}))
+    assert options["raster"]["dpi"] == 72
+
+
+@pytest.mark.parametrize("body", [
+    b"not json",
+    b"[]",
+    submission(job_description=" "),
+    submission(analysis_type="Horoscope"),
+    submission(resume_base64="***"),
+    submission(resume_base64=base64.b64encode(b"plain text").decode("ascii")),
+    submission(extraction="ocr"),
+    submission(raster=[96]),
+])
+def test_parse_submission_rejects_bad_bodies(body):
+    with pytest.raises(HttpError) as excinfo:
+        parse_submission(body)
+    assert excinfo.value.status == 400
+
+
+def test_submit_and_stream_a_job(api_url, make_pdf):
+    client = ApiClient(api_url)
+    pdf = make_pdf()
+    chunks = []
+    response, timing = client.run_analysis(pdf, "Python backend engineer", "Quick Scan",
+                                           idempotency_key="run-1", on_chunk=chunks.append)
+    assert response and timing["model"]
+    assert "".join(chunks) == response
+    again = client.submit(pdf, "Python backend engineer", "Quick Scan", idempotency_key="run-1")
+    assert again["status"] == "done" and again["response"] == response
+    assert "jd_text" not in again and "resume_bytes" not in again
+
+
+def test_health_and_errors(api_url):
+    client = ApiClient(api_url)
+    health = client._request("GET", "/healthz")
+    assert health["status"] == "ok" and health["workers"] == 1
+    with pytest.raises(ApiError) as excinfo:
+        client.get("0" * 32)
+    assert excinfo.value.status == 404
+    with pytest.raises(ApiError) as excinfo:
+        client._request("GET", "/v1/jobs")
+    assert excinfo.value.status == 405
+    with pytest.raises(ApiError) as excinfo:
+        client._request("POST", "/v1/jobs", {"job_description": ""})
+    assert excinfo.value.status == 400
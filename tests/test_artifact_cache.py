@@ -0,0 +1,117 @@
+import sqlite3
+import threading
+import time
+
+from artifact_cache import ArtifactCache, artifact_size, decode_artifact
+from resume_sections import SEGMENTER_VERSION
+
+
+def test_memory_lru_evicts_to_spill_file(tmp_path):
+    cache = ArtifactCache(memory_bytes=1000, spill_path=str(tmp_path / "artifacts.sqlite3"))
+    cache.put("a", "x" * 500)
+    cache.put("b", "y" * 500)
+    assert cache.stats()["entries"] == 1
+    assert cache.counters["evictions"] == 1
+    assert cache.get("a") == "x" * 500
+    assert cache.counters["disk_hits"] == 1
+    assert cache.get("missing") is None
+    assert cache.counters["misses"] == 1
+
+
+def test_disk_trim_does_not_lose_a_promoted_entry(tmp_path):
+    path = str(tmp_path / "artifacts.sqlite3")
+    cache = ArtifactCache(memory_bytes=1000, spill_path=path)
+    cache.put("a", "x" * 500)
+    cache.put("b", "y" * 500)
+    assert cache.get("a") == "x" * 500
+    # Another process trims the disk tier while "a" sits in memory
+    ArtifactCache(spill_path=path, disk_bytes=1)._spill([("c", "z", 1, False)])
+    cache.put("d", "w" * 500)
+    assert cache.get("a") == "x" * 500
+    assert cache.counters["disk_hits"] == 2
+
+
+def test_spill_file_holds_json_not_pickles(tmp_path):
+    path = str(tmp_path / "artifacts.sqlite3")
+    cache = ArtifactCache(memory_bytes=1000, spill_path=path)
+    artifact = {"parts": [{"text": "Kafka"}, {"mime_type": "image/jpeg", "data": b"\xff\xd8\x00"}]}
+    cache.put("parts", artifact)
+    cache.put("other", "y" * 700)
+    blob = sqlite3.connect(path).execute("SELECT value FROM artifacts WHERE key = 'parts'").fetchone()[0]
+    assert decode_artifact(blob) == artifact
+    assert cache.get("parts") == artifact
+
+
+def test_unreadable_spill_rows_are_misses(tmp_path):
+    path = str(tmp_path / "artifacts.sqlite3")
+    cache = ArtifactCache(memory_bytes=1000, spill_path=path)
+    conn = sqlite3.connect(path)
+    conn.execute("INSERT INTO artifacts VALUES ('old', ?, 10, 0)", (b"\x80\x05K\x01.",))
+    conn.commit()
+    assert cache.get("old") is None
+    assert conn.execute("SELECT COUNT(*) FROM artifacts").fetchone()[0] == 0
+
+
+def test_without_spill_evicted_entries_are_gone():
+    cache = ArtifactCache(memory_bytes=1000, spill_path=None)
+    cache.put("a", "x" * 500)
+    cache.put("b", "y" * 500)
+    assert cache.get("a") is None
+    assert cache.get("b") == "y" * 500
+
+
+def test_get_or_create_runs_create_once_under_concurrency():
+    cache = ArtifactCache(spill_path=None)
+    calls = []
+
+    def create():
+        calls.append(1)
+        time.sleep(0.05)
+        return "artifact"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_create("k", create))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert results == ["artifact"] * 4
+    assert calls == [1]
+
+
+def test_interrupted_create_does_not_block_later_callers():
+    cache = ArtifactCache(spill_path=None)
+
+    def interrupted():
+        raise KeyboardInterrupt()
+
+    try:
+        cache.get_or_create("k", interrupted)
+    except KeyboardInterrupt:
+        pass
+    assert cache.get_or_create("k", lambda: "artifact") == "artifact"
+
+
+def test_resume_artifacts_read_the_upload_only_on_a_miss(make_pdf):
+    pdf = make_pdf()
+    reads = []
+
+    def load_bytes():
+        reads.append(1)
+        return pdf
+
+    cache = ArtifactCache(spill_path=None)
+    parts = cache.parts("digest", load_bytes)
+    assert parts["metadata"]["text_parts"] == len(parts["parts"])
+    assert "Kafka" in cache.text("digest", load_bytes)
+    segmentation = cache.sections("digest", load_bytes)
+    assert cache.parts("digest", load_bytes) is parts
+    assert cache.sections("digest", load_bytes) is segmentation
+    assert len(reads) == 3
+    assert cache.get(f"digest:sections:v{SEGMENTER_VERSION}") is segmentation
+
+
+def test_artifact_size_counts_text_payload():
+    assert artifact_size("abc") > 3
+    sections = {"sections": [{"text": "x" * 100}]}
+    assert artifact_size(sections) > 100
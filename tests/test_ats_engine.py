@@ -0,0 +1,190 @@
+import zipfile
+
+import pytest
+from google.api_core import exceptions as google_exceptions
+
+import ats_engine
+import jd_context
+import rate_limit
+from analysis_cache import AnalysisCache
+from ats_engine import (
+    EXTRACTION_IMAGE,
+    extraction_variant,
+    fetch_analysis,
+    iter_resume_sources,
+    pdf_bytes_to_parts,
+    read_resume_source,
+    resume_hash,
+    stream_analysis,
+)
+from jd_context import PromptContext
+from llm_backends import StreamedResponse, StubBackend
+from rate_limit import CircuitBreaker, SingleFlight
+
+PROMPT = "Evaluate the resume against the job description."
+
+
+class ScriptedBackend(StubBackend):
+    """Stub that raises the scripted errors from stream() before answering"""
+
+    def __init__(self, errors=(), reject_context=False):
+        super().__init__()
+        self.errors = list(errors)
+        self.reject_context = reject_context
+        self.streams = 0
+
+    def stream(self, contents, response_schema=None, context=None, model=None):
+        self.streams += 1
+        if self.reject_context and context is not None:
+            raise google_exceptions.NotFound("Cached content not found")
+        if self.errors:
+            raise self.errors.pop(0)
+        return StreamedResponse("hello world, this is a streamed answer", chunks=4)
+
+
+@pytest.fixture
+def flow(monkeypatch):
+    """Fresh breaker and single-flight table, and no backoff sleeps"""
+    breaker = CircuitBreaker(failure_threshold=3, cooldown=60)
+    flights = SingleFlight()
+    for module in (ats_engine, rate_limit):
+        monkeypatch.setattr(module, "GEMINI_BREAKER", breaker)
+        monkeypatch.setattr(module, "GEMINI_FLIGHTS", flights)
+        monkeypatch.setattr(module, "backoff_delay", lambda attempt, suggested=None: 0)
+    return breaker, flights
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return AnalysisCache(str(tmp_path / "analysis.sqlite3"))
+
+
+def test_text_mode_sends_text_pages_and_rasterizes_scanned_ones(make_pdf):
+    parts = pdf_bytes_to_parts(make_pdf(["Python engineer with many years of backend service experience", ""]))
+    assert parts[0]["text"].startswith("--- Resume page 1 ---")
+    assert parts[1]["mime_type"] == "image/jpeg"
+    images = pdf_bytes_to_parts(make_pdf(), mode=EXTRACTION_IMAGE)
+    assert len(images) == ats_engine.MAX_PAGES and all("data" in part for part in images)
+    with pytest.raises(ValueError):
+        pdf_bytes_to_parts(make_pdf(), mode="ocr")
+
+
+def test_extraction_variant():
+    assert extraction_variant("text") == "text"
+    assert extraction_variant("image") == "image:96dpi:rgb:q85:1600px"
+
+
+def test_resume_sources_from_folder_and_zip(tmp_path):
+    folder = tmp_path / "resumes"
+    folder.mkdir()
+    (folder / "a.pdf").write_bytes(b"%PDF-a")
+    (folder / "notes.txt").write_text("skip me")
+    archive = tmp_path / "resumes.zip"
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("b.pdf", b"%PDF-b")
+    assert list(iter_resume_sources(str(folder))) == [("a.pdf", b"%PDF-a")]
+    assert list(iter_resume_sources(str(archive))) == [("b.pdf", b"%PDF-b")]
+    assert read_resume_source(str(archive), "b.pdf") == b"%PDF-b"
+    with pytest.raises(ValueError):
+        list(iter_resume_sources(str(folder / "a.pdf")))
+    assert resume_hash(b"%PDF-a") != resume_hash(b"%PDF-b")
+
+
+def test_fetch_analysis_caches_and_counts_each_request_once(stub_backend, flow, cache):
+    parts = [{"text": "Jane Doe, Python and AWS"}]
+    response, timing = fetch_analysis(cache, "Python developer", parts, PROMPT, "resume-1")
+    assert response and timing["cached"] is False and timing["model"]
+    again, timing = fetch_analysis(cache, "Python  developer", parts, PROMPT, "resume-1")
+    assert again == response and timing["cached"] is True
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+
+def test_fetch_analysis_reuses_a_near_duplicate(stub_backend, flow, cache):
+    parts = [{"text": "Jane Doe, Python and AWS"}]
+    response, _ = fetch_analysis(cache, "Python developer", parts, PROMPT, "original")
+    reused, timing = fetch_analysis(cache, "Python developer", parts, PROMPT, "edited",
+                                    near_duplicates=[("unknown", 0.97), ("original", 0.93)])
+    assert reused == response
+    assert timing["near_duplicate_of"] == "original" and timing["similarity"] == 0.93
+
+
+def test_fetch_analysis_streams_chunks(stub_backend, flow, cache):
+    chunks = []
+    response, timing = fetch_analysis(cache, "Python developer", [{"text": "Jane"}], PROMPT, "resume",
+                                      on_chunk=chunks.append)
+    assert len(chunks) > 1 and "".join(chunks) == response
+    assert timing["ttft_seconds"] <= timing["total_seconds"]
+
+
+class ContextCachingStub(StubBackend):
+    supports_context_cache = True
+
+    def __init__(self):
+        super().__init__()
+        self.created = 0
+
+    def create_context_cache(self, prefix, ttl_seconds):
+        self.created += 1
+        return f"cachedContents/{self.created}"
+
+
+def test_remote_contexts_are_opt_in(monkeypatch, flow, cache):
+    backend = ContextCachingStub()
+    for module in (ats_engine, jd_context):
+        monkeypatch.setattr(module, "get_backend", lambda: backend)
+    monkeypatch.setattr(jd_context, "CONTEXT_CACHE_MIN_TOKENS", 1)
+    parts = [{"text": "Jane Doe, Go and Kubernetes"}]
+    fetch_analysis(cache, "Platform engineer, Go", parts, PROMPT, "resume-a")
+    assert backend.created == 0
+    _, timing = fetch_analysis(cache, "Platform engineer, Go", parts, PROMPT, "resume-b", context_cache=True)
+    assert backend.created == 1 and timing["model"] == ats_engine.MODEL_NAME
+
+
+def test_stream_retries_before_the_first_chunk(monkeypatch, flow):
+    backend = ScriptedBackend(errors=[google_exceptions.ServiceUnavailable("busy")])
+    monkeypatch.setattr(ats_engine, "get_backend", lambda: backend)
+    text = "".join(stream_analysis("JD", [{"text": "resume"}], PROMPT, max_retries=2))
+    assert text == "hello world, this is a streamed answer"
+    assert backend.streams == 2
+
+
+def test_stream_gives_up_after_max_retries(monkeypatch, flow):
+    backend = ScriptedBackend(errors=[google_exceptions.ServiceUnavailable("busy")] * 3)
+    monkeypatch.setattr(ats_engine, "get_backend", lambda: backend)
+    with pytest.raises(google_exceptions.ServiceUnavailable):
+        list(stream_analysis("JD", [{"text": "resume"}], PROMPT, max_retries=2, request_key="k"))
+    assert flow[1].stats()["in_flight"] == 0
+
+
+def test_rejected_context_is_resent_in_full_even_on_the_last_attempt(monkeypatch, flow):
+    backend = ScriptedBackend(reject_context=True)
+    monkeypatch.setattr(ats_engine, "get_backend", lambda: backend)
+    context = PromptContext("JD", PROMPT)
+    context.handle = "cachedContents/expired"
+    text = "".join(stream_analysis("JD", [{"text": "resume"}], PROMPT, max_retries=1, context=context))
+    assert text == "hello world, this is a streamed answer"
+    assert backend.streams == 2 and context.handle is None
+
+
+def test_unrelated_errors_keep_the_cached_context(monkeypatch, flow):
+    for error in (ValueError("Response was blocked"), google_exceptions.InvalidArgument("Request too large")):
+        monkeypatch.setattr(ats_engine, "get_backend", lambda: ScriptedBackend(errors=[error]))
+        context = PromptContext("JD", PROMPT)
+        context.handle = "cachedContents/live"
+        with pytest.raises(type(error)):
+            list(stream_analysis("JD", [{"text": "resume"}], PROMPT, context=context))
+        assert context.handle == "cachedContents/live"
+
+
+def test_closing_a_stream_releases_the_flight_and_the_probe(monkeypatch, flow):
+    breaker, flights = flow
+    breaker.cooldown = 0
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    monkeypatch.setattr(ats_engine, "get_backend", lambda: ScriptedBackend())
+    stream = stream_analysis("JD", [{"text": "resume"}], PROMPT, request_key="k")
+    next(stream)
+    stream.close()
+    assert flights.stats()["in_flight"] == 0
+    assert breaker.before_call() is not None
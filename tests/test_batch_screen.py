@@ -0,0 +1,71 @@
+import asyncio
+import csv
+import json
+
+import pytest
+
+from analysis_cache import AnalysisCache
+from batch_screen import ResultWriter, screen_resumes
+from results_dataset import ResultsDataset
+from structured_output import PARSE_STATS
+
+JD = "Backend engineer: Python, Kafka and AWS. 5+ years. Bachelor's degree."
+
+
+def screen(sources, **kwargs):
+    results = []
+    stats = asyncio.run(screen_resumes(sources, JD, analysis_types=["Quick Scan"], workers=1,
+                                       on_result=results.append, **kwargs))
+    return stats, sorted(results, key=lambda result: result["file"])
+
+
+def test_screens_each_resume_and_reports_broken_ones(stub_backend, make_pdf, tmp_path):
+    cache = AnalysisCache(str(tmp_path / "analysis.sqlite3"))
+    sources = [("jane.pdf", make_pdf()), ("broken.pdf", b"%PDF-1.7 truncated")]
+    stats, results = screen(sources, cache=cache)
+    assert (stats["resumes"], stats["results"], stats["errors"]) == (2, 2, 1)
+    broken, jane = results
+    assert broken["status"] == "error" and "PDF processing failed" in broken["error"]
+    assert jane["status"] == "ok" and jane["cached"] is False
+    assert jane["response"] and jane["keyword_score"] is not None
+
+    _, results = screen(sources[:1], cache=cache)
+    assert results[0]["cached"] is True and results[0]["response"] == jane["response"]
+
+
+def test_free_text_analyses_are_not_parsed(stub_backend, make_pdf):
+    before = dict(PARSE_STATS)
+    _, results = screen([("jane.pdf", make_pdf())])
+    assert results[0]["status"] == "ok" and results[0]["match_percentage"] is None
+    assert PARSE_STATS == before
+
+
+def test_low_keyword_scores_are_filtered_before_gemini(stub_backend, make_pdf):
+    stats, results = screen([("chef.pdf", make_pdf(["Chef de cuisine at a busy bistro, pastry and sauces"] * 2))],
+                            min_keyword_score=50)
+    assert stats["filtered"] == 1
+    assert results[0]["status"] == "filtered" and "response" not in results[0]
+
+
+def test_results_reach_the_cache_and_dataset(stub_backend, make_pdf, tmp_path):
+    pytest.importorskip("pyarrow")
+    cache = AnalysisCache(str(tmp_path / "analysis.sqlite3"))
+    dataset = ResultsDataset(str(tmp_path / "results"))
+    screen([("jane.pdf", make_pdf()), ("john.pdf", make_pdf(["John Roe, Python and Kafka"] * 2))],
+           cache=cache, results_dataset=dataset)
+    assert cache.stats()["entries"] == 2
+    assert dataset.flush() == 2
+
+
+@pytest.mark.parametrize("name", ["results.jsonl", "results.csv"])
+def test_result_writer(tmp_path, name):
+    path = str(tmp_path / name)
+    writer = ResultWriter(path)
+    writer.write({"file": "jane.pdf", "status": "ok", "missing_keywords": ["Go", "Rust"], "extra": 1})
+    writer.close()
+    with open(path, encoding="utf-8") as f:
+        if name.endswith(".csv"):
+            row = next(csv.DictReader(f))
+            assert row["missing_keywords"] == "Go; Rust" and "extra" not in row
+        else:
+            assert json.loads(f.readline())["missing_keywords"] == ["Go", "Rust"]
@@ -0,0 +1,32 @@
+import json
+
+import pytest
+
+pytest.importorskip("fitz")
+
+import benchmark  # noqa: E402
+
+
+def test_percentiles():
+    assert benchmark.percentiles([]) is None
+    stats = benchmark.percentiles([0.001, 0.002, 0.003])
+    assert stats["p50"] == 2.0 and stats["max"] == 3.0
+
+
+def test_corpus_has_a_scanned_twin_per_text_resume():
+    corpus = benchmark.build_corpus([1, 2], samples=1, seed=7)
+    assert [item["scenario"] for item in corpus] == ["text-1p", "scanned-1p", "text-2p", "scanned-2p"]
+    assert all(item["pdf_bytes"].startswith(b"%PDF") for item in corpus)
+
+
+def test_stub_run_writes_a_report(tmp_path, stub_backend, capsys):
+    out = tmp_path / "report.json"
+    assert benchmark.main(["--backend", "stub", "--pages", "1", "--samples", "1", "--latency", "0",
+                           "--analysis", "Quick Scan", "--stream", "--out", str(out)]) == 0
+    report = json.loads(out.read_text())
+    assert report["overall"]["count"] == 2 and report["overall"]["errors"] == 0
+    assert set(report["scenarios"]) == {"text-1p", "scanned-1p"}
+    assert report["scenarios"]["text-1p"]["ttft_ms"] is not None
+
+    benchmark.compare_reports(report, report)
+    assert "Compared with" in capsys.readouterr().out
@@ -0,0 +1,59 @@
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from gemini_stub_server import StubSettings, request_tokens, start_stub_server
+from llm_backends import fake_response_text
+
+BODY = {"contents": [{"role": "user", "parts": [{"text": "a" * 40}, {"inline_data": {"data": "..."}}]}],
+        "generationConfig": {"responseMimeType": "application/json"}}
+
+
+@pytest.fixture
+def endpoint():
+    server, url = start_stub_server(settings=StubSettings(latency=0, jitter=0, seed=1))
+    yield url
+    server.shutdown()
+    server.server_close()
+
+
+def post(url, body=BODY):
+    request = urllib.request.Request(url, data=json.dumps(body).encode("utf-8"), method="POST",
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.loads(response.read())
+
+
+def test_fake_response_is_deterministic():
+    assert fake_response_text("key") == fake_response_text("key")
+    structured = json.loads(fake_response_text("key", json_mode=True))
+    assert 40 <= structured["match_percentage"] <= 94
+
+
+def test_request_tokens_match_the_limiter_heuristic():
+    assert request_tokens(BODY) == 11 + 258
+
+
+def test_generate_stream_and_count(endpoint):
+    base = f"{endpoint}/v1beta/models/gemini-test"
+    answer = post(f"{base}:generateContent")
+    text = answer["candidates"][0]["content"]["parts"][0]["text"]
+    assert json.loads(text)["match_percentage"]
+    assert answer["usageMetadata"]["promptTokenCount"] == request_tokens(BODY)
+    chunks = post(f"{base}:streamGenerateContent")
+    assert "".join(chunk["candidates"][0]["content"]["parts"][0]["text"] for chunk in chunks) == text
+    assert chunks[-1]["candidates"][0]["finishReason"] == "STOP"
+    assert post(f"{base}:countTokens") == {"totalTokens": request_tokens(BODY)}
+
+
+def test_injected_rate_limits():
+    server, url = start_stub_server(settings=StubSettings(latency=0, rate_limit_rate=1.0))
+    try:
+        with pytest.raises(urllib.error.HTTPError) as excinfo:
+            post(f"{url}/v1beta/models/gemini-test:generateContent")
+        assert excinfo.value.code == 429
+    finally:
+        server.shutdown()
+        server.server_close()
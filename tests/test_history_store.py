@@ -0,0 +1,47 @@
+import pytest
+
+from history_store import HistoryStore, jd_hash
+
+
+@pytest.fixture
+def store(tmp_path):
+    return HistoryStore(str(tmp_path / "history.sqlite3"))
+
+
+def test_entries_round_trip(store):
+    entry_id = store.add("Detailed Analysis", "Strong Kubernetes experience.", resume_hash="r", input_text="JD",
+                         resume_name="jane.pdf", structured={"match_percentage": 80},
+                         timing={"cached": False, "total_seconds": 3.2})
+    entry = store.get(entry_id)
+    assert entry["structured"] == {"match_percentage": 80}
+    assert entry["match_percentage"] == 80 and entry["cached"] == 0
+    assert entry["jd_hash"] == jd_hash("  JD ")
+    assert store.get(entry_id + 1) is None
+
+
+def test_pages_are_newest_first_with_previews(store):
+    for i in range(12):
+        store.add("Quick Scan", f"response {i} " + "x" * 1000)
+    first = store.page(1, per_page=10)
+    assert [entry["preview"][:11] for entry in first[:2]] == ["response 11", "response 10"]
+    assert len(first[0]["preview"]) == 500 and first[0]["response_length"] > 1000
+    assert len(store.page(2, per_page=10)) == 2
+    assert store.count() == 12
+
+
+def test_search_and_filter(store):
+    store.add("Quick Scan", "Knows Kubernetes and Terraform", resume_name="ops.pdf")
+    store.add("Detailed Analysis", "Strong Python background", resume_name="dev.pdf")
+    assert store.count(search="kubernetes") == 1
+    assert store.count(search="dev.pdf") == 1
+    assert store.count(search='"unbalanced') == 0
+    assert store.count(analysis_type="Quick Scan") == 1
+    assert store.count(search="python", analysis_type="Quick Scan") == 0
+
+
+def test_delete(store):
+    entry_id = store.add("Quick Scan", "Knows Kubernetes")
+    assert store.has_entries()
+    store.delete(entry_id)
+    assert not store.has_entries()
+    assert store.count(search="kubernetes") == 0
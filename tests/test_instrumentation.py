@@ -0,0 +1,112 @@
+import json
+import socket
+import time
+import urllib.request
+
+import instrumentation
+from instrumentation import (
+    MetricsRegistry,
+    add_stage_time,
+    current_trace,
+    finish_trace,
+    record_cache,
+    flush_metrics_file,
+    record_usage,
+    stage,
+    start_metrics_server,
+    start_trace,
+)
+
+
+class FakeUsage:
+    prompt_token_count = 120
+    candidates_token_count = 30
+    total_token_count = 150
+
+
+class FakeResponse:
+    usage_metadata = FakeUsage()
+
+
+def test_trace_collects_stages_tokens_and_cache_outcome():
+    trace = start_trace("Quick Scan", extraction="text")
+    assert current_trace() is trace
+    with stage("pdf_to_parts"):
+        pass
+    add_stage_time("gemini_queue", 0.5)
+    add_stage_time("gemini_queue", 0.25)
+    record_usage(FakeResponse(), estimated=100)
+    record_cache(False)
+    record = finish_trace(trace)
+    assert current_trace() is None
+    assert record["extraction"] == "text"
+    assert record["stages"]["gemini_queue"] == 0.75 and "pdf_to_parts" in record["stages"]
+    assert record["tokens"] == {"prompt": 120, "candidates": 30, "total": 150, "estimated": 100}
+    assert record["cache_hit"] is False and record["error"] is None
+
+
+def test_finished_trace_is_published(monkeypatch):
+    registry = MetricsRegistry()
+    monkeypatch.setattr(instrumentation, "METRICS", registry)
+    trace = start_trace("Detailed Analysis")
+    record = finish_trace(trace, ValueError("boom"))
+    assert record["error"] == "boom"
+    assert 'ats_requests_total{analysis_type="Detailed Analysis",outcome="error"} 1' in registry.render()
+
+
+def test_metrics_file_writes_are_batched(monkeypatch):
+    writes = []
+
+    def write_metrics_file():
+        writes.append(1)
+        monkeypatch.setattr(instrumentation, "_metrics_written", time.monotonic())
+    monkeypatch.setattr(instrumentation, "write_metrics_file", write_metrics_file)
+    monkeypatch.setattr(instrumentation, "_metrics_written", None)
+    monkeypatch.setattr(instrumentation, "_metrics_timer", None)
+    monkeypatch.setattr(instrumentation, "METRICS_FILE_SECONDS", 60)
+    for _ in range(3):
+        finish_trace(start_trace("Quick Scan"))
+    assert len(writes) == 1
+    flush_metrics_file()
+    assert len(writes) == 2
+    flush_metrics_file()
+    assert len(writes) == 2
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_metrics_server_binds_to_localhost(monkeypatch):
+    monkeypatch.setattr(instrumentation, "_server", None)
+    server = start_metrics_server(port=_free_port())
+    try:
+        assert server.server_address[0] == "127.0.0.1"
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics", timeout=10) as response:
+            assert response.status == 200
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_helpers_are_no_ops_without_a_trace():
+    assert current_trace() is None
+    with stage("anything"):
+        add_stage_time("anything", 1.0)
+        record_cache(True)
+    assert current_trace() is None
+
+
+def test_registry_renders_counters_and_histograms():
+    registry = MetricsRegistry()
+    registry.inc("ats_things_total", {"kind": "a"})
+    registry.inc("ats_things_total", {"kind": "a"}, 2)
+    registry.observe("ats_seconds", 0.3)
+    text = registry.render()
+    assert 'ats_things_total{kind="a"} 3' in text
+    assert 'ats_seconds_bucket{le="0.5"} 1' in text
+    assert 'ats_seconds_bucket{le="0.25"} 0' in text
+    assert "ats_seconds_count 1" in text
+    json.dumps(text)
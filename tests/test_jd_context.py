@@ -0,0 +1,76 @@
+import jd_context
+from jd_context import (
+    education_levels,
+    get_jd_profile,
+    get_prompt_context,
+    invalidate_context,
+    normalize_skills,
+    score_with_profile,
+    years_from_dates,
+    years_mentioned,
+)
+
+JD = """Backend engineer. Requirements: 3-5 years with Golang and k8s, Postgres.
+Bachelor's degree in computer science; Master's preferred. Golang services on k8s."""
+
+
+class CachingBackend:
+    name = "caching"
+    model_id = "test"
+    supports_context_cache = True
+
+    def __init__(self):
+        self.created = 0
+
+    def create_context_cache(self, prefix, ttl_seconds):
+        self.created += 1
+        return f"cachedContents/{self.created}"
+
+
+def test_skill_aliases_are_normalized():
+    assert normalize_skills("K8s, golang and postgres; not golangci") == "kubernetes, go and postgresql; not golangci"
+
+
+def test_years_and_education():
+    assert years_mentioned("3-5 years of Python, 2+ yrs of Go") == 3
+    assert years_mentioned("no numbers") is None
+    assert years_from_dates("Acme 2012 - 2016, Initech 2016 to 2020") == 8
+    assert education_levels("BSc and an MBA") == ["bachelors", "masters"]
+
+
+def test_jd_profile_is_computed_once_per_normalized_text():
+    profile = get_jd_profile(JD)
+    assert get_jd_profile("  " + JD.replace("\n", " ")) is profile
+    assert profile["required_years"] == 3
+    assert profile["education"] == "bachelors"
+    assert {"go", "kubernetes"} <= set(profile["skills"][:3])
+
+
+def test_score_with_profile_checks_years_and_education():
+    profile = get_jd_profile(JD)
+    strong = score_with_profile(profile, "Go and Kubernetes with PostgreSQL since 2015 - present. MSc in CS.")
+    weak = score_with_profile(profile, "One year of Go, 2023 - 2024.")
+    assert strong["meets_years"] and strong["meets_education"]
+    assert strong["education_found"] == "masters"
+    assert weak["meets_years"] is False and weak["meets_education"] is False
+    assert strong["match_percentage"] > weak["match_percentage"]
+
+
+def test_prompt_context_is_shared_and_recreated_after_rejection(monkeypatch):
+    backend = CachingBackend()
+    monkeypatch.setattr(jd_context, "get_backend", lambda: backend)
+    monkeypatch.setattr(jd_context, "CONTEXT_CACHE_MIN_TOKENS", 1)
+    context = get_prompt_context("A job description", "A prompt")
+    assert context.handle == "cachedContents/1"
+    assert get_prompt_context(" A job  description", "A prompt") is context
+    invalidate_context(context)
+    assert context.handle is None
+    assert get_prompt_context("A job description", "A prompt").handle == "cachedContents/2"
+
+
+def test_small_prefixes_are_not_cached_remotely(monkeypatch):
+    backend = CachingBackend()
+    monkeypatch.setattr(jd_context, "get_backend", lambda: backend)
+    context = get_prompt_context("Tiny JD", "Tiny prompt")
+    assert context.handle is None and "minimum" in context.remote_error
+    assert backend.created == 0
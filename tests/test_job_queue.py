@@ -0,0 +1,80 @@
+import pytest
+
+from job_queue import DONE, FAILED, QUEUED, RUNNING, IdempotencyConflictError, JobQueue, QueueFullError
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "jobs.sqlite3"), max_queued=2, max_attempts=2)
+
+
+def test_jobs_run_in_submission_order(queue):
+    first, created = queue.submit(b"resume-1", "Python developer", "Quick Scan")
+    second, _ = queue.submit(b"resume-2", "Python developer", "Quick Scan")
+    assert created and first["status"] == QUEUED
+    claimed = queue.claim()
+    assert claimed["id"] == first["id"]
+    assert claimed["status"] == RUNNING and claimed["attempts"] == 1
+    assert claimed["resume_bytes"] == b"resume-1" and claimed["jd_text"] == "Python developer"
+    assert queue.claim()["id"] == second["id"]
+    assert queue.claim() is None
+
+
+def test_complete_and_fail_store_outcomes(queue):
+    job, _ = queue.submit(b"resume", "JD", "Quick Scan")
+    queue.claim()
+    queue.complete(job["id"], "response", {"match_percentage": 80}, {"total_seconds": 1.5})
+    done = queue.get(job["id"])
+    assert done["status"] == DONE
+    assert done["structured"] == {"match_percentage": 80} and done["timing"] == {"total_seconds": 1.5}
+    other, _ = queue.submit(b"resume", "Another JD", "Quick Scan")
+    queue.fail(other["id"], "boom")
+    assert queue.get(other["id"])["error"] == "boom"
+    assert queue.get("0" * 32) is None
+
+
+def test_idempotent_submission(queue):
+    job, created = queue.submit(b"resume", "JD", "Quick Scan", idempotency_key="abc")
+    again, created_again = queue.submit(b"resume", " JD ", "Quick Scan", idempotency_key="abc")
+    assert created and not created_again
+    assert again["id"] == job["id"]
+    with pytest.raises(IdempotencyConflictError):
+        queue.submit(b"resume", "Different JD", "Quick Scan", idempotency_key="abc")
+
+
+def test_failed_job_is_requeued_under_the_same_key(queue):
+    job, _ = queue.submit(b"resume", "JD", "Quick Scan", idempotency_key="abc")
+    queue.claim()
+    queue.fail(job["id"], "boom")
+    retried, created = queue.submit(b"resume", "JD", "Quick Scan", idempotency_key="abc")
+    assert created and retried["id"] == job["id"]
+    assert retried["status"] == QUEUED and retried["error"] is None
+
+
+def test_full_queue_is_rejected(queue):
+    queue.submit(b"resume-1", "JD", "Quick Scan")
+    queue.submit(b"resume-2", "JD", "Quick Scan")
+    with pytest.raises(QueueFullError) as info:
+        queue.submit(b"resume-3", "JD", "Quick Scan")
+    assert info.value.depth == 2
+    assert 1 <= info.value.retry_after <= 60
+    assert queue.depth() == {QUEUED: 2, RUNNING: 0}
+
+
+def test_recover_requeues_interrupted_jobs_until_out_of_attempts(queue):
+    job, _ = queue.submit(b"resume", "JD", "Quick Scan")
+    queue.claim()
+    assert queue.recover() == 1
+    assert queue.get(job["id"])["status"] == QUEUED
+    queue.claim()
+    assert queue.recover() == 0
+    assert queue.get(job["id"])["status"] == FAILED
+
+
+def test_purge_removes_old_finished_jobs_and_their_resumes(queue):
+    job, _ = queue.submit(b"resume", "JD", "Quick Scan")
+    queue.claim()
+    queue.complete(job["id"], "response")
+    assert queue.purge(older_than_seconds=-1) == 1
+    assert queue.get(job["id"]) is None
+    assert queue._conn().execute("SELECT COUNT(*) FROM resumes").fetchone()[0] == 0
@@ -0,0 +1,57 @@
+from keyword_scorer import extract_terms, is_keyword, jd_keywords, score_resume, tokenize
+
+JD = """Senior Backend Engineer
+Requirements: 5+ years of hands-on, proven experience with Python and PostgreSQL.
+3+ yrs with Kubernetes and AWS. Machine learning experience is a plus; machine learning
+pipelines in Python. C++ or C# welcome. Node.js a bonus."""
+
+
+def test_tokenize_keeps_tech_terms():
+    assert tokenize("C++, C#, Node.js and CI/CD.") == ["c++", "c#", "node.js", "and", "ci", "cd"]
+
+
+def test_letterless_tokens_and_experience_words_are_not_keywords():
+    keywords = jd_keywords(JD)
+    assert "5+" not in keywords and "3+" not in keywords
+    for word in ("yrs", "proven", "hands", "years", "experience"):
+        assert word not in keywords
+    assert not is_keyword("2.5")
+    assert is_keyword("k8s")
+
+
+def test_one_letter_skills_are_keywords():
+    keywords = jd_keywords("Statistics in R and systems programming in C. The team's tools, version x.")
+    assert {"r", "c"} <= set(keywords)
+    assert "s" not in keywords and "x" not in keywords
+    assert "r" in score_resume("", "Built models in R", keywords=keywords)["matched_keywords"]
+
+
+def test_repeated_bigrams_become_keywords():
+    keywords = jd_keywords(JD)
+    assert keywords["python"] == 2
+    assert keywords["machine learning"] == 2
+    assert "python postgresql" not in keywords
+    unigrams, bigrams, length = extract_terms("the Python and SQL")
+    assert set(unigrams) == {"python", "sql"}
+    assert length == 4
+
+
+def test_score_resume_ranks_missing_keywords_by_weight():
+    full = score_resume(JD, JD)
+    partial = score_resume(JD, "Python developer with AWS")
+    assert full["match_percentage"] == 100 and full["missing_keywords"] == []
+    assert 0 < partial["match_percentage"] < full["match_percentage"]
+    # Repeated JD terms weigh more, so they lead the missing list
+    assert set(partial["missing_keywords"][:3]) == {"machine", "learning", "machine learning"}
+    assert "python" in partial["matched_keywords"]
+
+
+def test_idf_from_corpus_lowers_common_terms():
+    resume = "Python developer"
+    plain = score_resume("python rust", resume)
+    weighted = score_resume("python rust", resume, doc_freq={"python": 90, "rust": 1}, n_docs=100)
+    assert weighted["match_percentage"] < plain["match_percentage"]
+
+
+def test_empty_job_description():
+    assert score_resume("", "Python")["match_percentage"] is None
@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+from llm_backends import (
+    BACKEND_REPLAY,
+    RecordReplayBackend,
+    ReplayMissError,
+    StubBackend,
+    create_backend,
+    request_digest,
+)
+from structured_output import parse_structured_response
+
+CONTENTS = [{"text": "Python developer"}, {"text": "Evaluate the resume."}, {"text": "Jane Doe, Python"}]
+
+
+class CountingBackend(StubBackend):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def _respond(self, contents, response_schema):
+        self.calls += 1
+        return super()._respond(contents, response_schema)
+
+
+def test_request_digest_covers_model_schema_and_images():
+    digest = request_digest(CONTENTS, "model")
+    assert digest == request_digest(list(CONTENTS), "model")
+    assert digest != request_digest(CONTENTS, "other-model")
+    assert digest != request_digest(CONTENTS, "model", response_schema=dict)
+    image = [{"mime_type": "image/jpeg", "data": b"\xff\xd8"}]
+    assert request_digest(image, "model") != request_digest([{"mime_type": "image/jpeg", "data": b"\xff\xd9"}], "model")
+
+
+def test_stub_is_deterministic_and_streams_the_same_text():
+    backend = StubBackend()
+    response = backend.generate(CONTENTS)
+    assert response.text == backend.generate(CONTENTS).text
+    assert response.usage_metadata.total_token_count > 0
+    stream = backend.stream(CONTENTS)
+    chunks = [chunk.text for chunk in stream]
+    assert len(chunks) > 1 and "".join(chunks) == response.text
+    assert stream.usage_metadata is not None
+    assert asyncio.run(backend.generate_async(CONTENTS)).text == response.text
+
+
+def test_stub_json_mode_matches_the_schema():
+    text = StubBackend().generate(CONTENTS, response_schema=dict).text
+    assert 40 <= parse_structured_response(text)["match_percentage"] <= 94
+
+
+def test_record_then_replay(tmp_path):
+    path = str(tmp_path / "recordings.sqlite3")
+    inner = CountingBackend()
+    recorder = RecordReplayBackend(inner, path=path)
+    first = recorder.generate(CONTENTS).text
+    assert recorder.generate(CONTENTS).text == first
+    streamed = "".join(chunk.text for chunk in recorder.stream(CONTENTS + [{"text": "streamed"}]))
+    assert inner.calls == 2
+
+    replay = RecordReplayBackend(path=path, model_name=inner.model_id)
+    assert replay.name == BACKEND_REPLAY
+    assert replay.generate(CONTENTS).text == first
+    assert "".join(chunk.text for chunk in replay.stream(CONTENTS + [{"text": "streamed"}])) == streamed
+    with pytest.raises(ReplayMissError):
+        replay.generate([{"text": "never recorded"}])
+
+
+def test_context_cache_support_follows_the_inner_backend(tmp_path):
+    path = str(tmp_path / "recordings.sqlite3")
+    assert not StubBackend().supports_context_cache
+    assert not RecordReplayBackend(StubBackend(), path=path).supports_context_cache
+    assert not RecordReplayBackend(path=path).supports_context_cache
+
+
+def test_create_backend_rejects_unknown_names():
+    assert isinstance(create_backend("stub"), StubBackend)
+    with pytest.raises(ValueError):
+        create_backend("mystery")
@@ -0,0 +1,90 @@
+import pytest
+
+import near_duplicates
+from analysis_cache import AnalysisCache, make_key
+from ats_engine import find_cached_analysis
+from near_duplicates import SignatureIndex, band_buckets, diff_lines, estimate_jaccard, minhash, shingles
+
+RESUME = (
+    "Jane Doe backend engineer with six years of experience building Python services, "
+    "Kafka pipelines and PostgreSQL schemas on AWS. Led a team of four engineers, migrated "
+    "a monolith to Kubernetes and cut deployment time from hours to minutes. "
+)
+OTHER = (
+    "John Roe graphic designer focused on brand identity, print layouts and illustration "
+    "for consumer products, with a portfolio of packaging and editorial work. "
+)
+
+
+@pytest.fixture
+def index(tmp_path):
+    return SignatureIndex(str(tmp_path / "signatures.sqlite3"), threshold=0.8)
+
+
+def test_shingles():
+    assert shingles("one two three", size=5) == {"one two three"}
+    assert shingles("a b c d e f", size=5) == {"a b c d e", "b c d e f"}
+    assert shingles("") == set()
+
+
+def test_minhash_is_deterministic_and_estimates_similarity():
+    signature = minhash(RESUME * 3)
+    assert signature.dtype == "uint32" and len(signature) == near_duplicates.NUM_PERM
+    assert (minhash(RESUME * 3) == signature).all()
+    assert estimate_jaccard(signature, minhash(RESUME * 3 + "Also knows Go.")) > 0.8
+    assert estimate_jaccard(signature, minhash(OTHER * 3)) < 0.2
+    assert minhash("  ") is None
+
+
+def test_band_buckets_match_for_identical_signatures():
+    buckets = band_buckets(minhash(RESUME))
+    assert len(buckets) == near_duplicates.BANDS
+    assert buckets == band_buckets(minhash(RESUME))
+
+
+def test_index_finds_light_edits_only(index):
+    assert index.add("original", RESUME * 3)
+    assert index.add("unrelated", OTHER * 3)
+    assert not index.add("empty", "")
+    assert len(index) == 2
+    matches = index.query(RESUME * 3 + "Also knows Go.")
+    assert [resume_hash for resume_hash, _ in matches] == ["original"]
+    assert matches[0][1] > 0.8
+    assert index.query(RESUME * 3, exclude="original") == []
+
+
+def test_index_stores_text_for_diffs(index):
+    index.add("original", RESUME)
+    assert index.text("original") == RESUME
+    assert index.text("missing") is None
+    assert index.add("original", RESUME)
+    assert len(index) == 1
+
+
+def test_candidate_lookup_is_batched(index, monkeypatch):
+    monkeypatch.setattr(near_duplicates, "SQL_BATCH", 3)
+    for i in range(10):
+        index.add(f"copy-{i}", RESUME * 3 + f" Reference {i}.")
+    assert len(index.query(RESUME * 3, limit=20)) == 10
+
+
+def test_an_older_duplicate_with_a_result_is_not_cut_off(index, tmp_path, stub_backend):
+    edits = [" ".join(f"extra{word}" for word in range(i)) for i in range(1, 8)]
+    for i, edit in enumerate(edits):
+        index.add(f"edit-{i}", RESUME * 3 + edit)
+    matches = index.query(RESUME * 3, limit=None)
+    assert len(matches) == 7 and len(index.query(RESUME * 3)) == 5
+    oldest = matches[-1][0]
+    cache = AnalysisCache(str(tmp_path / "analysis.sqlite3"))
+    cache.set(make_key(oldest, "JD", "prompt", stub_backend.model_id, ""), "reusable")
+    cached, duplicate = find_cached_analysis(cache, "JD", "prompt", "new", near_duplicates=matches)
+    assert cached == "reusable" and duplicate[0] == oldest
+
+
+def test_diff_lines_truncates():
+    old = "\n".join(f"line {i}" for i in range(10))
+    new = "\n".join(f"line {i}!" for i in range(10))
+    lines = diff_lines(old, new, limit=5)
+    assert len(lines) == 6
+    assert lines[-1].startswith("...")
+    assert diff_lines("same", "same") == []
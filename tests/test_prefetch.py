@@ -0,0 +1,101 @@
+import threading
+
+import pytest
+
+import prefetch
+from analysis_cache import AnalysisCache
+from artifact_cache import ArtifactCache
+from prefetch import CANCELLED, DONE, SKIPPED, Prefetcher
+from rate_limit import CircuitBreaker
+
+
+@pytest.fixture
+def prefetcher(tmp_path):
+    return Prefetcher(ArtifactCache(spill_path=None), AnalysisCache(str(tmp_path / "analysis.sqlite3")),
+                      workers=1, max_pending=1)
+
+
+def wait(prefetcher, key):
+    prefetcher._tasks[key].future.result(timeout=30)
+    return prefetcher.status(key)
+
+
+def blocker(prefetcher, release):
+    """Occupy the only worker until release is set"""
+    started = threading.Event()
+
+    def load_bytes():
+        started.set()
+        release.wait(30)
+        raise RuntimeError("released")
+    key = prefetcher.preprocess("blocker", load_bytes)
+    assert started.wait(30)
+    return key
+
+
+def test_preprocess_fills_the_artifact_cache(prefetcher, make_pdf):
+    pdf = make_pdf()
+    loads = []
+
+    def load_bytes():
+        loads.append(1)
+        return pdf
+    key = prefetcher.preprocess("resume", load_bytes, owner="session-a")
+    assert wait(prefetcher, key) == DONE
+    assert prefetcher.preprocess("resume", load_bytes, owner="session-b") == key
+    loaded = len(loads)
+    assert "Kafka" in prefetcher.artifacts.text("resume", load_bytes)
+    assert len(loads) == loaded
+    assert prefetcher.stats()["submitted"] == 1
+
+
+def test_cancel_waits_for_the_last_owner(prefetcher):
+    release = threading.Event()
+    blocking = blocker(prefetcher, release)
+    try:
+        key = prefetcher.preprocess("queued", lambda: b"", owner="session-a")
+        prefetcher.preprocess("queued", lambda: b"", owner="session-b")
+        prefetcher.cancel([key], owner="session-a")
+        assert prefetcher.status(key) == "queued"
+        prefetcher.cancel([key], owner="session-b")
+        assert prefetcher.status(key) == CANCELLED
+    finally:
+        release.set()
+    wait(prefetcher, blocking)
+    assert prefetcher.stats()[CANCELLED] == 1
+
+
+def test_queue_is_capped(prefetcher):
+    release = threading.Event()
+    blocking = blocker(prefetcher, release)
+    try:
+        assert prefetcher.preprocess("first", lambda: b"") is not None
+        assert prefetcher.preprocess("second", lambda: b"") is None
+        assert prefetcher.stats()["rejected"] == 1
+    finally:
+        release.set()
+    wait(prefetcher, blocking)
+
+
+def test_quick_scan_fills_the_analysis_cache(prefetcher, make_pdf, stub_backend):
+    pdf = make_pdf()
+    key = prefetcher.quick_scan("resume", lambda: pdf, "Python backend engineer")
+    assert wait(prefetcher, key) == DONE
+    assert prefetcher.cache.stats()["entries"] == 1
+
+
+def test_quick_scan_is_skipped_unless_the_breaker_is_closed(prefetcher, make_pdf, stub_backend, monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=60)
+    breaker.record_failure()
+    monkeypatch.setattr(prefetch, "GEMINI_BREAKER", breaker)
+    pdf = make_pdf()
+    key = prefetcher.quick_scan("resume", lambda: pdf, "Python backend engineer")
+    assert wait(prefetcher, key) == SKIPPED
+    assert prefetcher.cache.stats()["entries"] == 0
+
+
+def test_zero_workers_disables_prefetching(tmp_path):
+    prefetcher = Prefetcher(ArtifactCache(spill_path=None), AnalysisCache(str(tmp_path / "a.sqlite3")), workers=0)
+    assert not prefetcher.enabled
+    assert prefetcher.preprocess("resume", lambda: b"") is None
+    assert prefetcher.stats()["submitted"] == 0
@@ -0,0 +1,291 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from google.api_core import exceptions as google_exceptions
+
+import rate_limit
+from rate_limit import (
+    CircuitBreaker,
+    CircuitOpenError,
+    SingleFlight,
+    TokenBucketLimiter,
+    backoff_delay,
+    call_with_retries,
+    estimate_tokens,
+    is_retryable,
+    retry_after,
+)
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    """Fresh shared breaker and limiter, and no real sleeping between retries"""
+    fresh = CircuitBreaker(failure_threshold=3, cooldown=60)
+    monkeypatch.setattr(rate_limit, "GEMINI_BREAKER", fresh)
+    monkeypatch.setattr(rate_limit, "GEMINI_LIMITER", TokenBucketLimiter(6000, 10 ** 9))
+    monkeypatch.setattr(rate_limit.time, "sleep", lambda seconds: None)
+    return fresh
+
+
+def test_estimate_tokens_counts_text_and_images():
+    assert estimate_tokens([{"text": "a" * 40}]) == 11
+    assert estimate_tokens([{"mime_type": "image/jpeg", "data": b"..."}]) == rate_limit.IMAGE_TOKENS
+
+
+def test_limiter_grants_burst_then_waits():
+    limiter = TokenBucketLimiter(requests_per_minute=2, tokens_per_minute=1000)
+    assert limiter._try_acquire(10) == 0.0
+    assert limiter._try_acquire(10) == 0.0
+    assert limiter._try_acquire(10) == pytest.approx(30, abs=0.5)
+    assert limiter.headroom() < 0.1
+
+
+def test_limiter_waits_for_tokens_and_refunds():
+    limiter = TokenBucketLimiter(requests_per_minute=600, tokens_per_minute=600)
+    assert limiter._try_acquire(600) == 0.0
+    assert limiter._try_acquire(60) == pytest.approx(6, abs=0.1)
+    limiter.refund(100)
+    assert limiter._try_acquire(60) == 0.0
+
+
+def test_limiter_acquire_blocks_until_refill():
+    limiter = TokenBucketLimiter(requests_per_minute=600, tokens_per_minute=10 ** 6)
+    limiter._requests = 0.9
+    waited = limiter.acquire()
+    assert 0.005 < waited < 1.0
+    assert limiter.stats()["waited"] == 1
+
+
+def test_is_retryable_allow_lists_upstream_and_transport_errors():
+    assert is_retryable(google_exceptions.TooManyRequests("slow down"))
+    assert is_retryable(google_exceptions.ServiceUnavailable("down"))
+    assert is_retryable(google_exceptions.DeadlineExceeded("timeout"))
+    assert is_retryable(ConnectionResetError())
+    assert not is_retryable(google_exceptions.BadRequest("bad"))
+    assert not is_retryable(ValueError("blocked response"))
+    assert not is_retryable(CircuitOpenError("open"))
+    assert not is_retryable(TypeError())
+
+
+def test_retry_after_and_backoff():
+    assert retry_after(RuntimeError("Quota exceeded, please retry in 7.5s")) == 7.5
+    assert retry_after(RuntimeError("nope")) is None
+    for attempt in range(8):
+        assert 0 <= backoff_delay(attempt) <= rate_limit.BACKOFF_MAX
+    assert backoff_delay(0, suggested=5) >= 5
+
+
+def test_breaker_opens_then_lets_one_probe_through():
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=0.05)
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    time.sleep(0.06)
+    assert breaker.state == "half-open"
+    assert breaker.before_call() is not None
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.before_call() is None
+
+
+def test_failed_probe_reopens_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.trips == 2
+
+
+def test_interrupted_probe_is_released():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    token = breaker.before_call()
+    breaker.release_probe(token)
+    assert breaker.before_call() == token + 1
+
+
+def test_stale_probe_token_does_not_release_a_newer_probe():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    first = breaker.before_call()
+    breaker.release_probe(first)
+    breaker.before_call()
+    breaker.release_probe(first)
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_call_with_retries_retries_transient_errors(breaker):
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise google_exceptions.ServiceUnavailable("try again")
+        return "ok"
+
+    assert call_with_retries(flaky, tokens=10, max_retries=3) == "ok"
+    assert len(calls) == 3
+    assert breaker.state == "closed"
+
+
+def test_call_with_retries_does_not_retry_bad_requests(breaker):
+    calls = []
+
+    def bad():
+        calls.append(1)
+        raise ValueError("blocked")
+
+    with pytest.raises(ValueError):
+        call_with_retries(bad, tokens=10)
+    assert len(calls) == 1
+    assert breaker.stats()["consecutive_failures"] == 0
+
+
+def test_call_with_retries_releases_an_interrupted_probe(breaker):
+    breaker.cooldown = 0
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+    def interrupted():
+        raise KeyboardInterrupt()
+
+    with pytest.raises(KeyboardInterrupt):
+        call_with_retries(interrupted, tokens=10)
+    assert call_with_retries(lambda: "ok", tokens=10) == "ok"
+
+
+def test_local_errors_do_not_close_a_half_open_breaker(breaker):
+    breaker.cooldown = 0
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+    def local_bug():
+        raise LookupError("no recording")
+
+    with pytest.raises(LookupError):
+        call_with_retries(local_bug, tokens=10)
+    assert breaker.state == "half-open"
+    with pytest.raises(google_exceptions.InvalidArgument):
+        call_with_retries(lambda: (_ for _ in ()).throw(google_exceptions.InvalidArgument("bad")), tokens=10)
+    assert breaker.state == "closed"
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    flights = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "shared"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flights.do("k", slow)))
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=lambda: results.append(flights.do("k", slow)))
+    follower.start()
+    while flights.coalesced == 0:
+        time.sleep(0.001)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+    assert results == ["shared", "shared"]
+    assert calls == [1]
+    assert flights.stats() == {"in_flight": 0, "coalesced": 1}
+
+
+def test_single_flight_shares_errors():
+    flights = SingleFlight()
+    with pytest.raises(RuntimeError, match="boom"):
+        flights.do("k", lambda: (_ for _ in ()).throw(RuntimeError("boom")))
+    assert flights.do("k", lambda: 1) == 1
+
+
+def test_single_flight_releases_key_when_interrupted():
+    flights = SingleFlight()
+
+    def interrupted():
+        raise KeyboardInterrupt()
+
+    with pytest.raises(KeyboardInterrupt):
+        flights.do("k", interrupted)
+    assert flights.stats()["in_flight"] == 0
+    assert flights.do("k", lambda: "again") == "again"
+
+
+def test_single_flight_async_cancelled_leader_releases_followers():
+    flights = SingleFlight()
+
+    async def main():
+        started = asyncio.Event()
+
+        async def slow():
+            started.set()
+            await asyncio.sleep(10)
+
+        leader = asyncio.ensure_future(flights.do_async("k", slow))
+        await started.wait()
+        follower = asyncio.ensure_future(flights.do_async("k", slow))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(RuntimeError, match="cancelled"):
+            await asyncio.wait_for(follower, 1)
+        assert flights.stats()["in_flight"] == 0
+
+    asyncio.run(main())
+
+
+def test_single_flight_async_shares_result():
+    flights = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return len(calls)
+
+    async def main():
+        return await asyncio.gather(flights.do_async("k", work), flights.do_async("k", work))
+
+    assert asyncio.run(main()) == [1, 1]
+
+
+def test_single_flight_async_keeps_event_loops_apart():
+    flights = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        started.set()
+        while not release.is_set():
+            await asyncio.sleep(0.001)
+        return "done"
+
+    leader = threading.Thread(target=lambda: asyncio.run(flights.do_async("k", work)))
+    leader.start()
+    assert started.wait(5)
+    other_loop = threading.Thread(target=lambda: calls.append(asyncio.run(flights.do_async("k", work))))
+    other_loop.start()
+    release.set()
+    leader.join(5)
+    other_loop.join(5)
+    assert calls == [1, 1, "done"]
+    assert flights.stats() == {"in_flight": 0, "coalesced": 0}
@@ -0,0 +1,80 @@
+import pytest
+
+import request_planner
+from request_planner import (
+    LARGE_REQUEST_TOKENS,
+    TIER_FAST,
+    TIER_MODELS,
+    TIER_STANDARD,
+    TRUNCATION_MARKER,
+    ModelStats,
+    plan_request,
+    route_model,
+    trim_job_description,
+    trim_resume_parts,
+)
+
+
+@pytest.fixture
+def stats(monkeypatch):
+    fresh = ModelStats()
+    monkeypatch.setattr(request_planner, "MODEL_STATS", fresh)
+    monkeypatch.setattr(request_planner, "ROUTING_ENABLED", True)
+    return fresh
+
+
+def test_model_stats_moving_averages():
+    stats = ModelStats()
+    assert stats.token_ratio("m") == 1.0
+    assert stats.predicted_seconds("m", 1000) is None
+    stats.observe_tokens("m", estimated=100, actual=150)
+    stats.observe_tokens("m", estimated=100, actual=100)
+    assert stats.token_ratio("m") == pytest.approx(1.4)
+    stats.observe_latency("m", tokens=2000, seconds=4)
+    assert stats.predicted_seconds("m", 1000) == pytest.approx(2)
+    assert stats.snapshot()["token_ratio"] == {"m": 1.4}
+
+
+def test_routing_by_type_size_and_latency(stats):
+    assert route_model("Quick Scan", 100)[:2] == (TIER_FAST, TIER_MODELS[TIER_FAST])
+    assert route_model("Detailed Analysis", 100)[0] == TIER_STANDARD
+    assert route_model("Quick Scan", LARGE_REQUEST_TOKENS + 1)[0] == TIER_STANDARD
+    stats.observe_latency(TIER_MODELS[TIER_STANDARD], tokens=1000, seconds=60)
+    tier, _, reason = route_model("Detailed Analysis", 1000, slo_seconds=30)
+    assert tier == TIER_FAST and "SLO" in reason
+
+
+def test_resume_parts_are_trimmed_in_page_order():
+    parts = [{"text": "a" * 4000}, {"mime_type": "image/jpeg", "data": b"x"}, {"text": "b" * 4000}]
+    assert trim_resume_parts(parts, 10_000) == (parts, False)
+    trimmed, changed = trim_resume_parts(parts, 1500)
+    assert changed
+    assert trimmed[0] == parts[0] and trimmed[1] == parts[1]
+    assert trimmed[2]["text"].endswith(TRUNCATION_MARKER)
+    assert trim_resume_parts(parts, 10)[0] == parts[:1]
+
+
+def test_job_description_keeps_requirement_lines():
+    jd = "\n".join(["We have a ping pong table and free snacks every day."] * 20
+                   + ["Requirements: 5+ years of Python and PostgreSQL experience required."])
+    trimmed, changed = trim_job_description(jd, 40)
+    assert changed
+    assert "Requirements: 5+ years of Python" in trimmed
+    assert trim_job_description("Short JD", 100) == ("Short JD", False)
+
+
+def test_plan_request_fits_the_budget(stats):
+    parts = [{"text": "Python " * 4000}]
+    plan = plan_request("Python developer", parts, "Evaluate the resume.", "Quick Scan", budget=2000)
+    assert plan["trimmed"] == ["resume"]
+    assert plan["estimated_tokens"] <= 2000
+    assert plan["original_tokens"] > plan["estimated_tokens"]
+    assert plan["model"] == TIER_MODELS[TIER_FAST]
+
+
+def test_budget_uses_the_most_conservative_tier_calibration(stats):
+    parts = [{"text": "Python " * 4000}]
+    baseline = plan_request("JD", parts, "prompt", "Quick Scan", budget=2000)["estimated_tokens"]
+    stats.observe_tokens(TIER_MODELS[TIER_STANDARD], estimated=100, actual=200)
+    scaled = plan_request("JD", parts, "prompt", "Quick Scan", budget=2000)["estimated_tokens"]
+    assert scaled == pytest.approx(baseline / 2, rel=0.05)
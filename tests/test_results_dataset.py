@@ -0,0 +1,128 @@
+import io
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+
+from results_dataset import ResultsDataset, result_filter, result_row  # noqa: E402
+
+
+def row(analysis_type="Detailed Analysis", match=70, missing=("Kubernetes",), cached=False, total=2.0, jd="Python"):
+    return result_row(
+        analysis_type,
+        {"match_percentage": match, "ats_score": 60, "missing_keywords": list(missing), "strengths": ["Python"]},
+        {"cached": cached, "ttft_seconds": 0.5, "total_seconds": total, "model": "models/test"},
+        resume_hash="resume", input_text=jd,
+    )
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    return ResultsDataset(str(tmp_path / "results"))
+
+
+def test_result_row_clamps_and_cleans():
+    result = result_row("Quick Scan", {"match_percentage": "140", "missing_keywords": [" SQL ", ""]},
+                        {"near_duplicate_of": "other"})
+    assert result["match_percentage"] == 100
+    assert result["missing_keywords"] == ["SQL"]
+    assert result["near_duplicate"] is True
+    assert result["cached"] is None
+    assert len(result["day"]) == 10
+
+
+def test_rows_reach_parquet_on_flush(dataset):
+    dataset.append(row())
+    dataset.append(row(match=90))
+    assert dataset.flush() == 2
+    assert dataset.flush() == 0
+    assert dataset.count() == 2
+
+
+def test_spool_flushes_itself_when_large(tmp_path):
+    dataset = ResultsDataset(str(tmp_path / "results"), flush_bytes=1)
+    dataset.append(row())
+    assert dataset.count() == 1
+
+
+def test_torn_spool_line_is_skipped(dataset):
+    dataset.append(row())
+    with open(dataset.spool_path, "a", encoding="utf-8") as f:
+        f.write('{"analysis_type": "Quick')
+    assert dataset.flush() == 1
+
+
+def test_filters(dataset):
+    dataset.append(row(match=40))
+    dataset.append(row("Quick Scan", match=80))
+    dataset.flush()
+    today = row()["day"]
+    assert dataset.count(result_filter(min_match=50)) == 1
+    assert dataset.count(result_filter(analysis_types=["Quick Scan"])) == 1
+    assert dataset.count(result_filter(since=today, until=today)) == 2
+    assert dataset.count(result_filter(since="2999-01-01")) == 0
+    assert result_filter() is None
+
+
+def test_aggregates(dataset):
+    dataset.append(row(match=40, missing=("Kubernetes", "Go")))
+    dataset.append(row(match=80, missing=("kubernetes",)))
+    dataset.append(row(match=60, cached=True, total=0.01))
+    dataset.flush()
+    summary, histogram = dataset.score_distribution()
+    assert summary.to_pylist()[0]["analyses"] == 3
+    assert summary.to_pylist()[0]["median_match"] == pytest.approx(60, abs=1)
+    assert sorted(histogram.column("match_bin").to_pylist()) == [40, 60, 80]
+    missing = dataset.top_missing_keywords().to_pylist()
+    assert missing[0] == {"keyword": "kubernetes", "count": 3, "share": 1.0}
+    latency = dataset.latency_percentiles()
+    assert latency[0]["requests"] == 2
+    assert latency[0]["total_p50"] == pytest.approx(2.0)
+
+
+def test_empty_dataset(dataset):
+    assert dataset.count() == 0
+    assert dataset.top_missing_keywords().num_rows == 0
+    assert dataset.export().startswith(b"created_at,")
+
+
+def test_export_csv_and_parquet(dataset):
+    import pyarrow.parquet as pq
+    dataset.append(row(missing=("Go", "Rust")))
+    dataset.flush()
+    csv = dataset.export().decode("utf-8")
+    assert "Go; Rust" in csv
+    table = pq.read_table(io.BytesIO(dataset.export(fmt="parquet")))
+    assert table.num_rows == 1 and "day" not in table.column_names
+    with pytest.raises(ValueError):
+        dataset.export(fmt="xlsx")
+
+
+def test_compact_merges_small_files(dataset):
+    for match in (10, 20, 30):
+        dataset.append(row(match=match))
+        dataset.flush()
+    assert dataset.compact() == 2
+    assert dataset.count() == 3
+
+
+def test_interrupted_compaction_counts_rows_once(dataset, monkeypatch):
+    for match in (10, 20, 30):
+        dataset.append(row(match=match))
+        dataset.flush()
+    # Crash after the merged file is renamed into place, before the originals are removed
+    monkeypatch.setattr(ResultsDataset, "_finish_compaction", lambda self, manifest: None)
+    assert dataset.compact() == 2
+    monkeypatch.undo()
+    assert dataset.count() == 3
+    assert dataset.compact() == 0
+    assert dataset.count() == 3
+    assert not dataset._manifests()
+
+
+def test_latency_percentiles_without_ttft(dataset):
+    dataset.append(result_row("Quick Scan", {"match_percentage": 50}, {"cached": False, "total_seconds": 1.0}))
+    dataset.flush()
+    latency = dataset.latency_percentiles()
+    assert latency[0]["ttft_p50"] is None
+    assert latency[0]["total_p50"] == pytest.approx(1.0)
@@ -0,0 +1,70 @@
+import pytest
+
+from resume_index import ResumeIndex, analyze_resume
+
+
+@pytest.fixture
+def resumes(tmp_path, make_pdf):
+    folder = tmp_path / "resumes"
+    folder.mkdir()
+    (folder / "python.pdf").write_bytes(make_pdf([
+        "Python engineer building machine learning pipelines in Python with PostgreSQL and AWS services."
+    ]))
+    (folder / "designer.pdf").write_bytes(make_pdf([
+        "Graphic designer working on brand identity, illustration and print layouts for magazines."
+    ]))
+    (folder / "java.pdf").write_bytes(make_pdf([
+        "Java engineer maintaining Spring services with PostgreSQL; some machine shop experience."
+    ]))
+    return folder
+
+
+def test_analyze_resume_records_positions(make_pdf):
+    digest, length, positions = analyze_resume(make_pdf(["Python and more Python for the data team here today"]))
+    assert len(digest) == 64
+    assert length == 10
+    assert positions["python"] == [0, 3]
+    assert "and" not in positions
+
+
+def test_query_ranks_by_bm25(tmp_path, resumes):
+    index = ResumeIndex(str(tmp_path / "index"))
+    try:
+        assert index.add_directory(str(resumes), workers=1) == 3
+        assert index.add_directory(str(resumes), workers=1) == 0
+        assert len(index) == 3
+        hits = index.query("Python machine learning engineer. Machine learning with Python and PostgreSQL.")
+        assert [hit["name"] for hit in hits][:2] == ["python.pdf", "java.pdf"]
+        assert hits[0]["score"] > hits[1]["score"]
+        assert index.query("Haskell") == []
+        assert index.doc_freq(["postgresql", "haskell"]) == {"postgresql": 2, "haskell": 0}
+        name, pdf_bytes = next(index.iter_sources(hits))
+        assert name == "python.pdf" and pdf_bytes.startswith(b"%PDF")
+    finally:
+        index.close()
+
+
+def test_phrase_queries_need_adjacent_terms(tmp_path, resumes):
+    index = ResumeIndex(str(tmp_path / "index"))
+    try:
+        index.add_directory(str(resumes), workers=1)
+        doc_ids, _ = index._phrase_postings("machine learning")
+        assert len(doc_ids) == 1
+    finally:
+        index.close()
+
+
+def test_query_sees_documents_added_by_another_writer(tmp_path, resumes, make_pdf):
+    path = str(tmp_path / "index")
+    reader, writer = ResumeIndex(path), ResumeIndex(path)
+    try:
+        writer.add_directory(str(resumes), workers=1)
+        assert reader.query("Python engineer")
+        more = tmp_path / "more"
+        more.mkdir()
+        (more / "rust.pdf").write_bytes(make_pdf(["Rust engineer writing Python bindings for storage engines."]))
+        writer.add_directory(str(more), workers=1)
+        assert "rust.pdf" in [hit["name"] for hit in reader.query("Rust engineer")]
+    finally:
+        reader.close()
+        writer.close()
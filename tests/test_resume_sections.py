@@ -0,0 +1,83 @@
+from resume_sections import (
+    CONTACT,
+    EDUCATION,
+    EXPERIENCE,
+    OTHER,
+    PROJECTS,
+    SKILLS,
+    SUMMARY,
+    heading_label,
+    is_usable,
+    scoring_text,
+    sections_variant,
+    segment_lines,
+    segment_resume,
+    select_sections,
+)
+
+
+def line(text, page=0, size=10.0, bold=False, alone=False):
+    return {"text": text, "page": page, "size": size, "bold": bold, "caps": text.isupper(), "alone": alone}
+
+
+LINES = [
+    line("Jane Doe", size=16, alone=True),
+    line("jane@example.com | github.com/jane"),
+    line("Backend engineer who likes distributed systems."),
+    line("WORK EXPERIENCE", size=12, bold=True, alone=True),
+    line("Senior Engineer, Acme Corp", bold=True),
+    line("Built Kafka pipelines."),
+    line("PUBLICATIONS", size=12, bold=True, alone=True),
+    line("A paper on queues."),
+    line("Skills:", page=1, size=12, bold=True, alone=True),
+    line("Python, SQL", page=1),
+]
+
+
+def test_heading_labels():
+    assert heading_label("WORK EXPERIENCE") == EXPERIENCE
+    assert heading_label("E X P E R I E N C E") == EXPERIENCE
+    assert heading_label("2. Technical Skills:") == SKILLS
+    assert heading_label("Built Kafka pipelines in Python on AWS for the payments team") is None
+
+
+def test_segment_lines_groups_sections():
+    segmentation = segment_lines(LINES)
+    labels = [section["label"] for section in segmentation["sections"]]
+    assert labels == [CONTACT, SUMMARY, EXPERIENCE, OTHER, SKILLS]
+    experience = segmentation["sections"][2]
+    assert experience["heading"] == "WORK EXPERIENCE"
+    assert experience["text"] == "Senior Engineer, Acme Corp\nBuilt Kafka pipelines."
+    assert segmentation["sections"][-1]["pages"] == [1]
+    assert is_usable(segmentation)
+    assert segment_lines([])["sections"] == []
+
+
+def test_select_sections_replaces_text_parts_and_keeps_images():
+    segmentation = segment_lines(LINES)
+    image = {"mime_type": "image/jpeg", "data": b"x"}
+    parts = [{"text": "--- Resume page 1 ---\n..."}, image]
+    selected = select_sections(parts, segmentation, (EXPERIENCE, SKILLS))
+    assert selected[0] is image
+    assert selected[1]["text"].startswith("--- Resume section: WORK EXPERIENCE ---")
+    assert selected[-1]["text"].startswith("[Sections left out")
+    assert select_sections(parts, segmentation, None) is parts
+    assert select_sections(parts, {"sections": [], "headings": 0}, (SKILLS,)) is parts
+
+
+def test_scoring_text_drops_contact_details():
+    text = scoring_text(segment_lines(LINES))
+    assert "Kafka" in text and "jane@example.com" not in text
+    assert scoring_text(None, fallback="raw") == "raw"
+
+
+def test_sections_variant():
+    assert sections_variant("text", None) == "text"
+    assert sections_variant("text", (SKILLS, EDUCATION)).startswith("text:sections")
+
+
+def test_every_page_is_segmented(make_pdf):
+    segmentation = segment_resume(make_pdf())
+    labels = [section["label"] for section in segmentation["sections"]]
+    assert labels[-2:] == [EDUCATION, PROJECTS]
+    assert segmentation["sections"][-1]["pages"] == [4]
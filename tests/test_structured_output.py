@@ -0,0 +1,74 @@
+import json
+
+from structured_output import (
+    IncrementalJSONParser,
+    parse_structured_response,
+    schema_variant,
+    validate_detailed_analysis,
+)
+
+ANALYSIS = {
+    "match_percentage": 82,
+    "ats_score": 74,
+    "missing_keywords": ["Kubernetes", "Terraform"],
+    "strengths": ["Python"],
+    "overall_assessment": "Strong backend profile.",
+}
+
+
+def test_valid_json_is_parsed():
+    assert parse_structured_response(json.dumps(ANALYSIS)) == ANALYSIS
+
+
+def test_code_fenced_json_with_trailing_comma_is_repaired():
+    text = '```json\n{"match_percentage": 70, "strengths": ["SQL",],}\n```'
+    assert parse_structured_response(text) == {"match_percentage": 70, "strengths": ["SQL"]}
+
+
+def test_truncated_json_is_closed():
+    text = '{"match_percentage": 65, "missing_keywords": ["Go", "Rus'
+    assert parse_structured_response(text) == {"match_percentage": 65, "missing_keywords": ["Go", "Rus"]}
+
+
+def test_unusable_responses_return_none():
+    assert parse_structured_response("") is None
+    assert parse_structured_response("Sorry, I cannot help with that.") is None
+    assert parse_structured_response('{"unrelated": true}') is None
+
+
+def test_validation_coerces_scores_and_lists():
+    clean, errors = validate_detailed_analysis({
+        "match_percentage": "85%", "ats_score": 140.4, "strengths": "Python, SQL", "extra": 1
+    })
+    assert clean == {"match_percentage": 85, "ats_score": 100, "strengths": ["Python", "SQL"]}
+    assert errors == []
+
+
+def test_validation_reports_wrong_types():
+    clean, errors = validate_detailed_analysis({"match_percentage": True, "weaknesses": 3})
+    assert clean == {}
+    assert errors == ["match_percentage is not a number", "weaknesses is not a list"]
+    assert validate_detailed_analysis([1, 2]) == (None, ["response is not a JSON object"])
+
+
+def test_incremental_parser_emits_fields_as_they_complete():
+    text = json.dumps(ANALYSIS)
+    parser = IncrementalJSONParser()
+    seen = []
+    for start in range(0, len(text), 7):
+        completed = parser.feed(text[start:start + 7])
+        seen.extend(completed)
+    assert seen == list(ANALYSIS)
+    assert parser.fields == ANALYSIS
+
+
+def test_incremental_parser_ignores_commas_inside_nested_values():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"strengths": ["a, b", "c"') == {}
+    assert parser.feed('], "match_percentage": 5') == {"strengths": ["a, b", "c"]}
+    assert parser.feed("}") == {"match_percentage": 5}
+
+
+def test_schema_variant():
+    assert schema_variant("text", None) == "text"
+    assert schema_variant("text", {"type": "object"}) == "text:json-schema"